@@ -1,11 +1,82 @@
 from openai import OpenAI
 import os
 import base64
+import gzip
+import hashlib
+import httpx
 import requests
+from urllib3.util.retry import Retry
 import json
+import threading
+import time
+from collections import OrderedDict
 from .ai_base import AIServiceBase
 from utils.logger import get_logger
 
+# 已上传文件缓存：(文件内容sha256, 文件名) -> (上传时间, multimedia条目)
+# 同一文件被多个任务上传时复用服务端文件信息；服务端文件的保留时长未知，超过有效期的条目重新上传
+_UPLOAD_CACHE_MAXSIZE = 256
+_UPLOAD_CACHE_TTL = 3600
+_upload_cache = OrderedDict()
+_upload_cache_lock = threading.Lock()
+
+# 进程内共享的HTTP连接池：所有 DeepseekAIService 实例复用同一组 TCP 连接，
+# 并发的章节请求不必各自建立连接；连接数上限高于单个进程内可能同时进行的AI调用数
+# （gunicorn 请求线程 + AI线程池 + 后台生成线程池），避免请求在连接池中排队
+_HTTP_MAX_CONNECTIONS = 32
+_HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+_http_client = httpx.Client(
+    limits=httpx.Limits(
+        max_connections=_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    ),
+    follow_redirects=True,
+)
+
+# 文件上传接口使用的会话，同样在进程内共享连接；
+# 建立连接失败时短暂退避后重试（请求未发出，重试安全），已发出的上传请求不重试
+_UPLOAD_CONNECT_RETRY = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+_upload_session = requests.Session()
+for _scheme in ("http://", "https://"):
+    _upload_session.mount(
+        _scheme,
+        requests.adapters.HTTPAdapter(pool_maxsize=_HTTP_MAX_KEEPALIVE_CONNECTIONS, max_retries=_UPLOAD_CONNECT_RETRY)
+    )
+
+# 上传请求体超过该大小时先 gzip 压缩（Content-Encoding: gzip）再发送；文件内容是 base64 文本，压缩后体积明显减小
+# 只有服务端以 400/415 拒绝压缩请求体时才回退为原始请求；回退成功连续达到 _UPLOAD_GZIP_MAX_REJECTIONS 次
+# 才认为服务端不支持压缩，在本进程内不再尝试压缩（偶发的 4xx 不会永久关闭压缩）
+_UPLOAD_GZIP_MIN_SIZE = 1024 * 1024
+_UPLOAD_GZIP_REJECT_STATUSES = frozenset((400, 415))
+_UPLOAD_GZIP_MAX_REJECTIONS = 3
+_upload_gzip_enabled = True
+_upload_gzip_rejections = 0
+_upload_gzip_lock = threading.Lock()
+
+
+def _get_cached_upload(key):
+    """从进程内缓存获取已上传文件信息，未命中或已过期返回 None"""
+    with _upload_cache_lock:
+        cached = _upload_cache.get(key)
+        if cached is None:
+            return None
+        uploaded_at, item = cached
+        if time.monotonic() - uploaded_at > _UPLOAD_CACHE_TTL:
+            del _upload_cache[key]
+            return None
+        _upload_cache.move_to_end(key)
+        return item
+
+
+def _set_cached_upload(key, item):
+    """写入进程内缓存，超出容量时淘汰最久未使用的记录"""
+    with _upload_cache_lock:
+        _upload_cache[key] = (time.monotonic(), item)
+        _upload_cache.move_to_end(key)
+        while len(_upload_cache) > _UPLOAD_CACHE_MAXSIZE:
+            _upload_cache.popitem(last=False)
+
+
 class DeepseekAIService(AIServiceBase):
     def __init__(self, base_url=None, api_key=None, agent_id=None, hy_source=None, hy_user=None):
         base_url =  "http://39.104.17.54:7999/v1/"
@@ -17,12 +88,27 @@ class DeepseekAIService(AIServiceBase):
         self.agent_id = agent_id or os.getenv("DEEPSEEK_AGENT_ID")
         self.hy_source = hy_source or os.getenv("DEEPSEEK_HY_SOURCE", "web")
         self.hy_user = hy_user or os.getenv("DEEPSEEK_HY_USER")
-        self.client = OpenAI(base_url=self.base_url, api_key=self.api_key)
+        self.client = OpenAI(base_url=self.base_url, api_key=self.api_key, http_client=_http_client)
         self.logger = get_logger(name="ai_service.deepseek")
         self.logger.info(f"初始化 DeepseekAIService: base_url={self.base_url}, agent_id={self.agent_id}")
 
     def chat(self, prompt: str, stream: bool = False) -> str:
         self.logger.debug(f"API调用开始: prompt长度={len(prompt)}, stream={stream}")
+        # 拼接流式响应
+        response_text = "".join(self.chat_stream(prompt))
+        self.logger.debug(f"API调用成功: 响应长度={len(response_text)}")
+        return response_text
+
+    def chat_stream(self, prompt: str):
+        """
+        对话，按接收顺序逐段产出AI响应内容
+
+        Args:
+            prompt: 对话提示词
+
+        Yields:
+            str: AI响应内容片段
+        """
         try:
             response = self.client.chat.completions.create(
                 model="deepseek-v3",
@@ -35,14 +121,11 @@ class DeepseekAIService(AIServiceBase):
                     "should_remove_conversation": True,
                 },
             )
-            # 拼接流式响应
-            response_text = ""
             for chunk in response:
                 if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content:
                     line = (json.loads(chunk.choices[0].delta.content).get("msg", "") or "")
-                    response_text += line
-            self.logger.debug(f"API调用成功: 响应长度={len(response_text)}")
-            return response_text
+                    if line:
+                        yield line
         except Exception as e:
             self.logger.error(f"API调用失败: {str(e)}")
             raise
@@ -92,7 +175,17 @@ class DeepseekAIService(AIServiceBase):
 
             file_type = ext_type_map[ext]
 
-            # 读取文件并编码为base64
+            # 内容相同的文件已上传过时直接复用服务端返回的文件信息
+            # 摘要按固定大小的缓冲区分块计算，命中缓存时不需要把整个文件读入内存
+            with open(file_path, "rb") as f:
+                cache_key = (hashlib.file_digest(f, "sha256").hexdigest(), file_name)
+            cached_item = _get_cached_upload(cache_key)
+            if cached_item is not None:
+                self.logger.info(f"文件已上传过，复用服务端文件信息: {file_name}")
+                multimedia.append(cached_item)
+                continue
+
+            # 读取文件并编码为base64（原始内容编码后即释放，不与编码结果同时保留到上传结束）
             with open(file_path, "rb") as f:
                 file_data = base64.b64encode(f.read()).decode("utf-8")
 
@@ -109,11 +202,13 @@ class DeepseekAIService(AIServiceBase):
             }
 
             # 上传文件
-            resp = requests.post(url, json=data, headers=headers)
+            resp = self._post_upload(url, data, headers, file_name)
 
             if resp.status_code == 200:
                 self.logger.info(f"文件上传成功: {file_name}")
-                multimedia.append(resp.json())
+                item = resp.json()
+                _set_cached_upload(cache_key, item)
+                multimedia.append(item)
             else:
                 self.logger.error(f"文件上传失败: {file_name}, status={resp.status_code}, msg={resp.text}")
                 raise Exception(f"文件上传失败: {file_name}, status={resp.status_code}")
@@ -121,6 +216,51 @@ class DeepseekAIService(AIServiceBase):
         self.logger.info(f"所有文件上传完成，共 {len(multimedia)} 个文件")
         return multimedia
 
+    def _post_upload(self, url: str, data: dict, headers: dict, file_name: str):
+        """
+        发送上传请求，请求体较大时使用 gzip 压缩
+
+        Args:
+            url: 上传接口地址
+            data: 上传数据
+            headers: 请求头
+            file_name: 文件名（用于日志）
+
+        Returns:
+            requests.Response: 上传接口的响应
+        """
+        global _upload_gzip_enabled, _upload_gzip_rejections
+
+        body = json.dumps(data).encode("utf-8")
+        if not _upload_gzip_enabled or len(body) < _UPLOAD_GZIP_MIN_SIZE:
+            return _upload_session.post(url, data=body, headers={**headers, "Content-Type": "application/json"})
+
+        compressed = gzip.compress(body, compresslevel=6)
+        self.logger.info(f"上传请求体已压缩: {file_name}, {len(body)} -> {len(compressed)} bytes ({len(compressed) / len(body):.0%})")
+        resp = _upload_session.post(
+            url,
+            data=compressed,
+            headers={**headers, "Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        if resp.status_code == 200:
+            with _upload_gzip_lock:
+                _upload_gzip_rejections = 0
+            return resp
+        # 限流、服务端错误、鉴权失败等与压缩无关，直接返回，不重复上传
+        if resp.status_code not in _UPLOAD_GZIP_REJECT_STATUSES:
+            return resp
+
+        # 服务端拒绝了压缩请求体，用原始请求体重试
+        self.logger.warning(f"压缩上传被拒绝，改用原始请求体重试: {file_name}, status={resp.status_code}")
+        resp = _upload_session.post(url, data=body, headers={**headers, "Content-Type": "application/json"})
+        if resp.status_code == 200:
+            with _upload_gzip_lock:
+                _upload_gzip_rejections += 1
+                if _upload_gzip_rejections >= _UPLOAD_GZIP_MAX_REJECTIONS and _upload_gzip_enabled:
+                    _upload_gzip_enabled = False
+                    self.logger.info("服务端多次拒绝压缩的上传请求体，后续上传不再压缩")
+        return resp
+
     def chat_with_multimedia(self, prompt: str, multimedia: list, chat_id: str = None, stream: bool = False) -> str:
         """
         使用已上传的文件进行对话
@@ -134,6 +274,22 @@ class DeepseekAIService(AIServiceBase):
         Returns:
             str: AI响应内容
         """
+        response_text = "".join(self.chat_with_multimedia_stream(prompt, multimedia, chat_id=chat_id))
+        self.logger.debug(f"chat_with_multimedia响应成功: 响应长度={len(response_text)}")
+        return response_text
+
+    def chat_with_multimedia_stream(self, prompt: str, multimedia: list, chat_id: str = None):
+        """
+        使用已上传的文件进行对话，按接收顺序逐段产出AI响应内容
+
+        Args:
+            prompt: 对话提示词
+            multimedia: 已上传的文件信息列表（由 upload_files 返回）
+            chat_id: 会话ID（可选）
+
+        Yields:
+            str: AI响应内容片段
+        """
         self.logger.debug(f"chat_with_multimedia调用开始: prompt长度={len(prompt)}, multimedia数量={len(multimedia)}")
 
         try:
@@ -151,15 +307,11 @@ class DeepseekAIService(AIServiceBase):
                 },
             )
 
-            # 拼接流式响应
-            response_text = ""
             for chunk in response:
                 if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content:
                     line = (json.loads(chunk.choices[0].delta.content).get("msg", "") or "")
-                    response_text += line
-
-            self.logger.debug(f"chat_with_multimedia响应成功: 响应长度={len(response_text)}")
-            return response_text
+                    if line:
+                        yield line
 
         except Exception as e:
             self.logger.error(f"chat_with_multimedia API调用失败: {str(e)}")
@@ -189,4 +341,22 @@ class DeepseekAIService(AIServiceBase):
 
         return response_text
 
+    def chat_with_files_stream(self, prompt: str, files: list):
+        """
+        支持文件上传的chat，按接收顺序逐段产出AI响应内容
+
+        内部调用 upload_files 和 chat_with_multimedia_stream
+
+        Args:
+            prompt: 对话提示词
+            files: 文件路径列表
+
+        Yields:
+            str: AI响应内容片段
+        """
+        self.logger.debug(f"chat_with_files_stream调用开始: prompt长度={len(prompt)}, files={files}")
+
+        multimedia = self.upload_files(files)
+        yield from self.chat_with_multimedia_stream(prompt, multimedia)
+
     
\ No newline at end of file
@@ -1,11 +1,44 @@
 import asyncio
 from crawl4ai import *
 
+# 常驻爬虫实例：浏览器只启动一次，后续请求复用
+# 只能在同一个事件循环中使用（业务层通过共享的后台事件循环调用）
+_crawler = None
+_crawler_lock = None
+
+
+async def _get_crawler():
+    global _crawler, _crawler_lock
+    if _crawler_lock is None:
+        _crawler_lock = asyncio.Lock()
+    async with _crawler_lock:
+        if _crawler is None:
+            crawler = AsyncWebCrawler()
+            await crawler.start()
+            _crawler = crawler
+        return _crawler
+
+
+async def _reset_crawler(crawler):
+    # 爬取出错时关闭并丢弃当前实例，下次请求重新启动浏览器
+    global _crawler
+    if _crawler is crawler:
+        _crawler = None
+    try:
+        await crawler.close()
+    except Exception:
+        pass
+
+
 async def crawl_web_content(url, type):
-    async with AsyncWebCrawler() as crawler:
+    crawler = await _get_crawler()
+    try:
         result = await crawler.arun(
             url=url,
         )
+    except Exception:
+        await _reset_crawler(crawler)
+        raise
     if type == "markdown":
         return(result.markdown)
     return result.json
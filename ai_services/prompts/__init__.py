@@ -1,6 +1,21 @@
 import os
+from functools import lru_cache
+
 import yaml
 
+
+@lru_cache(maxsize=None)
+def _load_yaml(yaml_path):
+    """
+    读取并解析提示词文件
+
+    提示词文件随代码部署、运行期间不变，每个文件只解析一次；
+    调用方只读取返回的数据，不能修改
+    """
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
 def load_prompt(card_type, lang="zh", form="text", mode="topic"):
     """
     加载提示词模板
@@ -32,8 +47,7 @@ def load_prompt(card_type, lang="zh", form="text", mode="topic"):
         else:
             yaml_path = os.path.join(base_dir, "prompts_flashcard_text.yaml")
 
-    with open(yaml_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
+    data = _load_yaml(yaml_path)
 
     # 特殊处理：summary prompt为纯字符串，非多语言结构
     if card_type in ["summarize_text", "summarize_file"]:
@@ -1,8 +1,265 @@
+import hashlib
 import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from ai_services.prompts import load_prompt
 from ai_services.ai_base import AIServiceBase
 from utils.logger import get_logger
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+# 模板占位符：[KEY] 或 {lang}
+_PLACEHOLDER_RE = re.compile(r"\[([^\[\]]+)\]|\{lang\}")
+
+# 元参数，不作为占位符替换
+_META_PARAMS = ("lang", "form", "mode", "NUMBER")
+
+# AI响应缓存：(AI服务类名, 合并空白后的提示词sha256) -> (写入时间, AI原始返回)
+# 相同提示词（同一类型、话题/文本、数量、语言）的重复请求直接复用上次的返回，不再调用AI；
+# 缓存原始文本而不是解析结果，每次命中重新解析，调用方拿到的是独立的对象
+_AI_RESULT_CACHE_MAXSIZE = 1024
+_AI_RESULT_CACHE_TTL = 3600
+_ai_result_cache = OrderedDict()
+_ai_result_cache_lock = threading.Lock()
+
+
+# AI响应磁盘缓存：进程内缓存之下的第二级，保存在 SQLite 中，重启/重新部署后仍可命中；
+# 默认放在 data 目录（fly.io 挂载的持久卷），可通过 AI_RESULT_CACHE_DB 指定路径，设为空字符串时关闭
+_AI_RESULT_DISK_CACHE_PATH = os.getenv(
+    "AI_RESULT_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "ai_result_cache.db")
+)
+_AI_RESULT_DISK_CACHE_TTL = 7 * 86400
+_ai_result_db = None
+_ai_result_db_lock = threading.Lock()
+
+_logger = get_logger(name="workflow.cache")
+
+
+def _get_ai_result_db():
+    """获取磁盘缓存连接，首次调用时打开并清理过期记录；不可用时返回 None（只使用进程内缓存）"""
+    global _ai_result_db, _AI_RESULT_DISK_CACHE_PATH
+    if _ai_result_db is None and _AI_RESULT_DISK_CACHE_PATH:
+        try:
+            os.makedirs(os.path.dirname(_AI_RESULT_DISK_CACHE_PATH), exist_ok=True)
+            conn = sqlite3.connect(_AI_RESULT_DISK_CACHE_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_result (key TEXT PRIMARY KEY, created_at REAL NOT NULL, ai_result TEXT NOT NULL)"
+            )
+            conn.execute("DELETE FROM ai_result WHERE created_at < ?", (time.time() - _AI_RESULT_DISK_CACHE_TTL,))
+            conn.commit()
+            _ai_result_db = conn
+        except (OSError, sqlite3.Error) as e:
+            _logger.warning("AI响应磁盘缓存不可用，只使用进程内缓存: %s", e)
+            _AI_RESULT_DISK_CACHE_PATH = ""
+    return _ai_result_db
+
+
+def _disk_key(key):
+    """把 (AI服务类名, 提示词摘要) 缓存键转换为磁盘缓存的主键"""
+    return f"{key[0]}:{key[1]}"
+
+
+def _get_disk_cached_ai_result(key):
+    """从磁盘缓存获取AI原始返回，未命中、已过期或出错时返回 None"""
+    with _ai_result_db_lock:
+        conn = _get_ai_result_db()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT ai_result FROM ai_result WHERE key = ? AND created_at >= ?",
+                (_disk_key(key), time.time() - _AI_RESULT_DISK_CACHE_TTL)
+            ).fetchone()
+        except sqlite3.Error as e:
+            _logger.warning("读取AI响应磁盘缓存失败: %s", e)
+            return None
+    return row[0] if row else None
+
+
+def _set_disk_cached_ai_result(key, ai_result):
+    """写入磁盘缓存，出错时只记录日志"""
+    with _ai_result_db_lock:
+        conn = _get_ai_result_db()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_result (key, created_at, ai_result) VALUES (?, ?, ?)",
+                (_disk_key(key), time.time(), ai_result)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            _logger.warning("写入AI响应磁盘缓存失败: %s", e)
+
+
+def _get_memory_cached_ai_result(key):
+    """从进程内缓存获取AI原始返回，未命中或已过期返回 None"""
+    with _ai_result_cache_lock:
+        cached = _ai_result_cache.get(key)
+        if cached is None:
+            return None
+        cached_at, ai_result = cached
+        if time.monotonic() - cached_at <= _AI_RESULT_CACHE_TTL:
+            _ai_result_cache.move_to_end(key)
+            return ai_result
+        del _ai_result_cache[key]
+        return None
+
+
+def _get_cached_ai_result(key):
+    """从进程内缓存获取AI原始返回，未命中时查磁盘缓存并回填；都未命中或已过期返回 None"""
+    ai_result = _get_memory_cached_ai_result(key)
+    if ai_result is not None:
+        return ai_result
+
+    ai_result = _get_disk_cached_ai_result(key)
+    if ai_result is not None:
+        _set_memory_cached_ai_result(key, ai_result)
+    return ai_result
+
+
+def _set_memory_cached_ai_result(key, ai_result):
+    """写入进程内缓存，超出容量时淘汰最久未使用的记录"""
+    with _ai_result_cache_lock:
+        _ai_result_cache[key] = (time.monotonic(), ai_result)
+        _ai_result_cache.move_to_end(key)
+        while len(_ai_result_cache) > _AI_RESULT_CACHE_MAXSIZE:
+            _ai_result_cache.popitem(last=False)
+
+
+def _set_cached_ai_result(key, ai_result):
+    """写入进程内缓存和磁盘缓存"""
+    _set_memory_cached_ai_result(key, ai_result)
+    _set_disk_cached_ai_result(key, ai_result)
+
+
+# 进行中的AI调用：缓存键 -> Future
+# 缓存未命中的相同请求同时到达时只调用一次AI，其余请求等待同一个结果
+_inflight_ai_calls = {}
+_inflight_ai_calls_lock = threading.Lock()
+
+
+def _json_loads(text: str):
+    """解析JSON，优先使用 orjson；orjson 更严格（如不接受 NaN），失败时交给标准库再解析一次"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+class _JsonArrayScanner:
+    """
+    增量扫描JSON数组文本，按片段输入，数组中每个对象/数组元素完整后立即产出其文本
+
+    只处理元素均为对象或数组的顶层数组（如闪卡列表），其他结构将 ok 置为 False，由调用方整体解析
+    """
+
+    def __init__(self):
+        self.ok = True          # 输出仍符合预期结构
+        self.closed = False     # 顶层数组已结束
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "first"  # 顶层数组内下一个期望的记号：first（首个元素或 ]）、item、sep（, 或 ]）
+        self._parts = []        # 当前元素已接收的文本片段
+        self._head = []         # 顶层数组之前的文本（如 ```json 标记）
+        self._tail = []         # 顶层数组之后的文本
+
+    def feed(self, text: str) -> list:
+        """输入一个文本片段，返回本次接收完整的元素文本列表"""
+        items = []
+        if not self.ok:
+            return items
+        if self.closed:
+            self._tail.append(text)
+            return items
+
+        # 当前元素在本片段中的起始位置，不在元素内时为 None
+        start = 0 if self._depth > 1 else None
+        for idx, ch in enumerate(text):
+            depth = self._depth
+
+            if depth > 1:
+                # 元素内部：跟踪字符串和嵌套层级
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == '\\':
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch == '{' or ch == '[':
+                    self._depth += 1
+                elif ch == '}' or ch == ']':
+                    self._depth -= 1
+                    if self._depth == 1:
+                        self._parts.append(text[start:idx + 1])
+                        items.append("".join(self._parts))
+                        self._parts = []
+                        start = None
+            elif depth == 1:
+                # 顶层数组内、元素之间，与 JSON 语法一致：元素间必须有逗号，不允许多余逗号
+                if ch.isspace():
+                    continue
+                if (ch == '{' or ch == '[') and self._expect != "sep":
+                    self._depth = 2
+                    self._expect = "sep"
+                    start = idx
+                elif ch == ']' and self._expect != "item":
+                    self.closed = True
+                    self._tail.append(text[idx + 1:])
+                    return items
+                elif ch == ',' and self._expect == "sep":
+                    self._expect = "item"
+                else:
+                    self.ok = False
+                    return items
+            elif ch == '[':
+                self._head.append(text[:idx])
+                self._depth = 1
+            elif ch == '{':
+                # 顶层是对象（如 {"cards": [...]}），其中的数组不能当作顶层数组逐个产出
+                self.ok = False
+                return items
+
+        if self._depth == 0:
+            self._head.append(text)
+        elif start is not None:
+            self._parts.append(text[start:])
+        return items
+
+    def finish(self) -> bool:
+        """输入结束后调用，数组完整且前后只有 parse_result 会清理的标记时返回 True"""
+        if not (self.ok and self.closed):
+            return False
+        head = "".join(self._head).strip()
+        if head.startswith("正在分析"):
+            head = head[4:]
+        if head.startswith("```json"):
+            head = head[7:]
+        elif head.startswith("```"):
+            head = head[3:]
+        tail = "".join(self._tail).strip()
+        if tail.endswith("```"):
+            tail = tail[:-3]
+        return not head.strip() and not tail.strip()
+
+
 class AIWorkflow:
     prompt_key = None  # 子类需指定
 
@@ -36,22 +293,24 @@ class AIWorkflow:
         # 加载提示词模板
         prompt_template = load_prompt(self.prompt_key, lang, form, mode)["prompt"]
 
+        # 占位符 [KEY] 对应的替换值（跳过元参数）
+        replacements = {k: str(v) for k, v in params.items() if k not in _META_PARAMS}
+
         # 处理 NUMBER_INSTRUCTION 占位符（智能数量决策）
         if "[NUMBER_INSTRUCTION]" in prompt_template:
-            number_instruction = self._generate_number_instruction(params, lang)
-            prompt_template = prompt_template.replace("[NUMBER_INSTRUCTION]", number_instruction)
+            replacements["NUMBER_INSTRUCTION"] = self._generate_number_instruction(params, lang)
 
-        # 替换占位符，格式为 [KEY]
-        prompt = prompt_template
-        for k, v in params.items():
-            if k not in ["lang", "form", "mode", "NUMBER"]:  # 跳过这些元参数
-                placeholder = f"[{k}]"
-                prompt = prompt.replace(placeholder, str(v))
+        # 在模板上一次性替换所有占位符（[KEY] 和 {lang}）
+        # 网页/文本内容等大段参数只被拷贝一次，也不会被后续替换再次扫描
+        def substitute(match):
+            key = match.group(1)
+            if key is None:
+                return lang
+            return replacements.get(key, match.group(0))
 
-        # 替换 {lang} 占位符
-        prompt = prompt.replace("{lang}", lang)
+        prompt = _PLACEHOLDER_RE.sub(substitute, prompt_template)
 
-        self.logger.debug(f"构建Prompt: {prompt}")
+        self.logger.debug("构建Prompt: %s", prompt)
         return prompt
 
     def _generate_number_instruction(self, params: dict, lang: str) -> str:
@@ -108,7 +367,7 @@ class AIWorkflow:
                     return "Generate an appropriate amount based on actual content (suggested 5-30 items)"
 
     def parse_result(self, ai_result: str):
-        self.logger.debug(f"AI原始返回: {ai_result}")
+        self.logger.debug("AI原始返回: %s", ai_result)
 
         # 清理AI返回的内容，去除markdown代码块标记
         cleaned_result = ai_result.strip()
@@ -126,14 +385,152 @@ class AIWorkflow:
         cleaned_result = cleaned_result.strip()
 
         try:
-            result = json.loads(cleaned_result)
+            result = _json_loads(cleaned_result)
             self.logger.info(f"AI返回JSON解析成功: {type(result)}")
             return result
         except Exception as e:
             self.logger.warning(f"AI返回JSON解析失败: {str(e)} | 清理后内容: {cleaned_result[:200]}...")
             return ai_result
 
+    def parse_result_stream(self, chunks):
+        """
+        边接收AI的流式输出边解析
+
+        输出为对象数组时，每个元素在文本接收完整后立即解析，解析与后续内容的生成重叠；
+        其他结构或解析出错时，在接收完整后交给 parse_result 整体解析
+
+        参数:
+            chunks: AI输出的文本片段迭代器
+
+        返回:
+            解析结果（同 parse_result）
+        """
+        pieces = []
+        items = []
+        scanner = _JsonArrayScanner()
+
+        for chunk in chunks:
+            pieces.append(chunk)
+            if not scanner.ok:
+                continue
+            for item_text in scanner.feed(chunk):
+                try:
+                    items.append(_json_loads(item_text))
+                except ValueError:
+                    scanner.ok = False
+                    break
+
+        if scanner.finish():
+            self.logger.debug("AI原始返回: %s", "".join(pieces))
+            self.logger.info(f"AI返回JSON流式解析成功: {len(items)}个元素")
+            return items
+
+        return self.parse_result("".join(pieces))
+
+    def _cache_key(self, prompt: str) -> tuple:
+        """
+        AI响应缓存键
+
+        提示词可能包含整段文本/网页内容，以摘要作为缓存键；
+        摘要前合并空白，只有换行、缩进或空格不同的文本视为同一请求
+        """
+        normalized_prompt = " ".join(prompt.split())
+        return (type(self.ai_service).__name__, hashlib.sha256(normalized_prompt.encode("utf-8")).hexdigest())
+
+    def run_stream(self, params: dict):
+        """
+        流式执行工作流，AI输出的数组元素接收完整后立即解析并产出
+
+        命中AI响应缓存时直接产出缓存结果；正常结束且能解析时写入缓存
+
+        参数:
+            params: 提示词参数字典（同 run）
+
+        产出:
+            解析后的数组元素（如单张闪卡）
+
+        异常:
+            ValueError: AI返回的内容不是JSON数组
+        """
+        prompt = self.build_prompt(params)
+        cache_key = self._cache_key(prompt)
+
+        ai_result = _get_cached_ai_result(cache_key)
+        if ai_result is not None:
+            self.logger.info("命中AI响应缓存，跳过AI调用")
+            result = self.parse_result(ai_result)
+            if not isinstance(result, list):
+                raise ValueError("AI返回格式错误")
+            yield from result
+            return
+
+        pieces = []
+        emitted = 0
+        scanner = _JsonArrayScanner()
+        for chunk in self.ai_service.chat_stream(prompt):
+            pieces.append(chunk)
+            if not scanner.ok:
+                continue
+            for item_text in scanner.feed(chunk):
+                try:
+                    item = _json_loads(item_text)
+                except ValueError:
+                    scanner.ok = False
+                    break
+                emitted += 1
+                yield item
+
+        ai_result = "".join(pieces)
+        if scanner.finish():
+            self.logger.info(f"AI返回JSON流式解析成功: {emitted}个元素")
+            _set_cached_ai_result(cache_key, ai_result)
+            return
+
+        # 扫描器无法处理的输出交给 parse_result 整体解析，只产出尚未产出的元素
+        result = self.parse_result(ai_result)
+        if not isinstance(result, list):
+            raise ValueError("AI返回格式错误")
+        _set_cached_ai_result(cache_key, ai_result)
+        yield from result[emitted:]
+
     def run(self, params: dict):
         prompt = self.build_prompt(params)
-        ai_result = self.ai_service.chat(prompt)
-        return self.parse_result(ai_result) 
\ No newline at end of file
+
+        cache_key = self._cache_key(prompt)
+        ai_result = _get_cached_ai_result(cache_key)
+        if ai_result is not None:
+            self.logger.info("命中AI响应缓存，跳过AI调用")
+            return self.parse_result(ai_result)
+
+        with _inflight_ai_calls_lock:
+            future = _inflight_ai_calls.get(cache_key)
+            is_owner = future is None
+            if is_owner:
+                # 加锁后再查一次进程内缓存，避免刚完成的调用在两次检查之间写入缓存后被重复请求；
+                # 调用方在移出 _inflight_ai_calls 之前已写入进程内缓存，不需要在全局锁内读磁盘缓存
+                ai_result = _get_memory_cached_ai_result(cache_key)
+                if ai_result is None:
+                    future = Future()
+                    _inflight_ai_calls[cache_key] = future
+
+        if not is_owner:
+            self.logger.info("相同请求的AI调用正在进行，等待其结果")
+            return self.parse_result(future.result())
+        if future is None:
+            self.logger.info("命中AI响应缓存，跳过AI调用")
+            return self.parse_result(ai_result)
+
+        try:
+            ai_result = self.ai_service.chat(prompt)
+            result = self.parse_result(ai_result)
+            # 只缓存能解析为数组的返回（与 run_stream 一致），其他结果下次重新请求
+            if isinstance(result, list):
+                _set_cached_ai_result(cache_key, ai_result)
+            future.set_result(ai_result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_ai_calls_lock:
+                _inflight_ai_calls.pop(cache_key, None)
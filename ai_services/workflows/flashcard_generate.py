@@ -7,6 +7,7 @@ class FlashcardGenerateWorkflow(AIWorkflow):
     支持三种卡片类型：basic_card, cloze_card, multiple_choice_card
     支持两种输入形式：text (文本输入), file (文件上传)
     支持三种生成模式：topic (话题模式), full (全文模式), section (章节模式)
+    文件形式的基础卡片另支持 multi_section (多章节模式，一次请求生成多个章节)
     """
 
     def __init__(self, card_type="basic_card", form="text", mode="topic", ai_service=None):
@@ -16,7 +17,7 @@ class FlashcardGenerateWorkflow(AIWorkflow):
         参数:
             card_type: 卡片类型 (basic_card, cloze_card, multiple_choice_card)
             form: 输入形式 (text: 文本输入, file: 文件上传)
-            mode: 生成模式 (topic: 话题模式, full: 全文模式, section: 章节模式)
+            mode: 生成模式 (topic: 话题模式, full: 全文模式, section: 章节模式, multi_section: 多章节模式)
             ai_service: AI服务实例
         """
         self.prompt_key = card_type
@@ -7,12 +7,124 @@
 3. 基于文件生成大纲 (analyze_catalog_from_file)
 """
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 from ai_services.workflows.catalog_analysis import CatalogAnalysisWorkflow
 from ai_services.ai_base import AIServiceBase
+from business.database.catalog_db import CatalogDB
+from business.task_manager import TaskManager
 from utils.logger import get_logger
 
 logger = get_logger(name="business.catalog")
 
+# 大纲缓存：task_id -> (查询时间, catalog_data)
+# 大纲在 analyze_catalog_from_file 中生成后不再变化，同一任务多次按章节生成闪卡时可以复用；
+# 重新生成大纲时只有本进程的缓存会立即失效，其他 worker 最多在 _CATALOG_CACHE_TTL 秒后读到新大纲
+# 命中时返回缓存中的同一个对象（闪卡业务的大纲索引缓存按对象 id 复用），调用方只能读取，不能修改
+_CATALOG_CACHE_MAXSIZE = 256
+_CATALOG_CACHE_TTL = 300
+_catalog_cache = OrderedDict()
+_catalog_cache_lock = threading.Lock()
+
+
+def _get_cached_catalog(task_id):
+    """从进程内缓存获取大纲（只读），未命中或已过期返回 None"""
+    with _catalog_cache_lock:
+        cached = _catalog_cache.get(task_id)
+        if cached is None:
+            return None
+        cached_at, catalog = cached
+        if time.monotonic() - cached_at > _CATALOG_CACHE_TTL:
+            del _catalog_cache[task_id]
+            return None
+        _catalog_cache.move_to_end(task_id)
+        return catalog
+
+
+def _set_cached_catalog(task_id, catalog):
+    """写入进程内缓存，超出容量时淘汰最久未使用的记录"""
+    with _catalog_cache_lock:
+        _catalog_cache[task_id] = (time.monotonic(), catalog)
+        _catalog_cache.move_to_end(task_id)
+        while len(_catalog_cache) > _CATALOG_CACHE_MAXSIZE:
+            _catalog_cache.popitem(last=False)
+
+
+def invalidate_cached_catalog(task_id):
+    """使指定任务的大纲缓存失效"""
+    with _catalog_cache_lock:
+        _catalog_cache.pop(task_id, None)
+
+
+# 文件大纲缓存：(文件内容sha256, lang) -> AI生成的原始大纲（未添加ID）
+# 同一文件重复上传生成大纲时直接复用，省去文件上传和AI调用
+_FILE_CATALOG_CACHE_MAXSIZE = 128
+_file_catalog_cache = OrderedDict()
+_file_catalog_cache_lock = threading.Lock()
+
+
+def _file_digest(file_path):
+    """计算文件内容的 sha256"""
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _get_cached_file_catalog(key):
+    """从进程内缓存获取文件大纲，未命中返回 None"""
+    with _file_catalog_cache_lock:
+        catalog = _file_catalog_cache.get(key)
+        if catalog is not None:
+            _file_catalog_cache.move_to_end(key)
+        return catalog
+
+
+def _set_cached_file_catalog(key, catalog):
+    """写入进程内缓存，超出容量时淘汰最久未使用的记录"""
+    with _file_catalog_cache_lock:
+        _file_catalog_cache[key] = catalog
+        _file_catalog_cache.move_to_end(key)
+        while len(_file_catalog_cache) > _FILE_CATALOG_CACHE_MAXSIZE:
+            _file_catalog_cache.popitem(last=False)
+
+
+# 话题大纲缓存：(归一化话题, lang) -> AI生成的大纲
+# 同一话题（忽略大小写和多余空白）重复生成大纲时直接返回，不再调用工作流
+_TOPIC_CATALOG_CACHE_MAXSIZE = 2048
+_TOPIC_CATALOG_CACHE_TTL = 86400
+_topic_catalog_cache = OrderedDict()
+_topic_catalog_cache_lock = threading.Lock()
+
+
+def _topic_catalog_key(topic, lang):
+    """生成话题大纲缓存键，合并空白并忽略大小写"""
+    return (" ".join(topic.split()).lower(), lang)
+
+
+def _get_cached_topic_catalog(key):
+    """从进程内缓存获取话题大纲，未命中或已过期返回 None"""
+    with _topic_catalog_cache_lock:
+        cached = _topic_catalog_cache.get(key)
+        if cached is None:
+            return None
+        cached_at, catalog = cached
+        if time.monotonic() - cached_at > _TOPIC_CATALOG_CACHE_TTL:
+            del _topic_catalog_cache[key]
+            return None
+        _topic_catalog_cache.move_to_end(key)
+        return catalog
+
+
+def _set_cached_topic_catalog(key, catalog):
+    """写入进程内缓存，超出容量时淘汰最久未使用的记录"""
+    with _topic_catalog_cache_lock:
+        _topic_catalog_cache[key] = (time.monotonic(), catalog)
+        _topic_catalog_cache.move_to_end(key)
+        while len(_topic_catalog_cache) > _TOPIC_CATALOG_CACHE_MAXSIZE:
+            _topic_catalog_cache.popitem(last=False)
+
 
 class CatalogService:
     """大纲生成服务类"""
@@ -31,6 +143,31 @@ class CatalogService:
 
         self.ai_service = ai_service
         self.logger = logger
+        # 任务管理器和大纲数据库访问对象在实例内复用，不在每次调用时重新创建
+        self.task_mgr = TaskManager()
+        self.catalog_db = CatalogDB()
+        # (form, mode) -> CatalogAnalysisWorkflow，工作流无请求级状态，可在实例内复用
+        self._workflow_cache = {}
+
+    def _get_workflow(self, form="text", mode="topic"):
+        """
+        获取大纲生成工作流，同一组参数的实例在 CatalogService 实例内复用
+
+        参数:
+            form: 输入形式
+            mode: 生成模式
+
+        返回:
+            CatalogAnalysisWorkflow: 工作流实例
+        """
+        key = (form, mode)
+        workflow = self._workflow_cache.get(key)
+        if workflow is None:
+            workflow = self._workflow_cache.setdefault(
+                key,
+                CatalogAnalysisWorkflow(form=form, mode=mode, ai_service=self.ai_service)
+            )
+        return workflow
 
     def analyze_catalog_from_topic(self, topic: str, lang="zh"):
         """
@@ -46,8 +183,14 @@ class CatalogService:
         self.logger.info(f"开始基于话题生成大纲 - 话题: {topic}, 语言: {lang}")
 
         try:
+            topic_key = _topic_catalog_key(topic, lang)
+            catalog = _get_cached_topic_catalog(topic_key)
+            if catalog is not None:
+                self.logger.info(f"命中话题大纲缓存 - 话题: {topic}")
+                return catalog
+
             # 使用 topic 模式，text 形式（话题模式与输入形式无关）
-            workflow = CatalogAnalysisWorkflow(form="text", mode="topic", ai_service=self.ai_service)
+            workflow = self._get_workflow(form="text", mode="topic")
 
             params = {
                 "TOPIC": topic,
@@ -55,6 +198,9 @@ class CatalogService:
             }
 
             catalog = workflow.run(params)
+            # 只缓存解析成功的结构化大纲，AI返回非结构化内容时下次重新生成
+            if isinstance(catalog, list):
+                _set_cached_topic_catalog(topic_key, catalog)
             self.logger.info(f"大纲生成成功 - 话题: {topic}")
 
             return catalog
@@ -78,7 +224,7 @@ class CatalogService:
 
         try:
             # 使用 full 模式，text 形式
-            workflow = CatalogAnalysisWorkflow(form="text", mode="full", ai_service=self.ai_service)
+            workflow = self._get_workflow(form="text", mode="full")
 
             params = {
                 "TEXT_CONTENT": text_content,
@@ -113,61 +259,64 @@ class CatalogService:
             self.logger.error("task_id未提供")
             raise ValueError("task_id为必填参数")
 
-        # 创建任务管理器
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
+        task_mgr = self.task_mgr
 
         try:
-            # 1. 更新状态：文件上传中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=file_uploading")
-            task_mgr.update_status(task_id, 'file_uploading')
-
-            # 2. 上传文件到AI服务器
-            self.logger.info(f"开始上传文件到AI服务器: {file_path}")
-            multimedia = self.ai_service.upload_files([file_path])
-            self.logger.info(f"文件上传成功，multimedia数量: {len(multimedia)}")
-
-            # 2.1 获取当前任务的input_data
-            task = task_mgr.get_task(task_id)
-            if task:
-                input_data = task.get('input_data', {})
-                # 更新input_data.file.info字段，保存multimedia信息
-                if 'file' not in input_data:
-                    input_data['file'] = {}
-                input_data['file']['info'] = multimedia
-
-                self.logger.info(f"保存文件multimedia到input_data.file.info: task_id={task_id}")
-                # 使用task_mgr的db来更新
-                result = task_mgr.db.update(
-                    table="task_info",
-                    data={"input_data": input_data},
-                    filters={"id": task_id}
-                )
-                if not result.get('success'):
-                    self.logger.error(f"保存multimedia失败: {result.get('error')}")
-
-            # 3. 更新状态：AI处理中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=ai_processing")
-            task_mgr.update_status(task_id, 'ai_processing')
-
-            # 4. 更新状态：生成大纲中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=generating_catalog")
-            task_mgr.update_status(task_id, 'generating_catalog')
-
-            # 5. 使用 full 模式，file 形式
-            workflow = CatalogAnalysisWorkflow(form="file", mode="full", ai_service=self.ai_service)
-
-            # 构建参数
-            params = {
-                "lang": lang
-            }
-
-            # 6. 使用已上传的文件进行对话
-            prompt = workflow.build_prompt(params)
-            ai_result = self.ai_service.chat_with_multimedia(prompt, multimedia)
-            catalog = workflow.parse_result(ai_result)
-
-            self.logger.info(f"大纲生成成功 - 文件: {file_path}")
+            # 0. 相同内容的文件已生成过该语言的大纲时直接复用，不再上传文件和调用AI
+            # （没有上传时不写入 input_data.file.info，按章节生成闪卡时会按需上传）
+            file_key = (_file_digest(file_path), lang)
+            catalog = _get_cached_file_catalog(file_key)
+
+            if catalog is not None:
+                self.logger.info(f"命中文件大纲缓存，跳过文件上传和AI调用 - 文件: {file_path}")
+                task = task_mgr.get_task(task_id)
+            else:
+                # 1. 更新状态：文件上传中
+                self.logger.info(f"更新任务状态: task_id={task_id}, status=file_uploading")
+                task_mgr.update_status(task_id, 'file_uploading')
+
+                # 2. 上传文件到AI服务器
+                self.logger.info(f"开始上传文件到AI服务器: {file_path}")
+                multimedia = self.ai_service.upload_files([file_path])
+                self.logger.info(f"文件上传成功，multimedia数量: {len(multimedia)}")
+
+                # 2.1 获取当前任务的input_data
+                task = task_mgr.get_task(task_id)
+                if task:
+                    # 更新input_data.file.info字段，保存multimedia信息
+                    file_data = (task.get('input_data') or {}).get('file') or {}
+                    file_data['info'] = multimedia
+
+                    self.logger.info(f"保存文件multimedia到input_data.file.info: task_id={task_id}")
+                    result = task_mgr.update_input_data_field(task_id, 'file', file_data, task=task)
+                    if not result.get('success'):
+                        self.logger.error(f"保存multimedia失败: {result.get('error')}")
+
+                # 3. 更新状态：AI处理中
+                self.logger.info(f"更新任务状态: task_id={task_id}, status=ai_processing")
+                task_mgr.update_status(task_id, 'ai_processing')
+
+                # 4. 更新状态：生成大纲中
+                self.logger.info(f"更新任务状态: task_id={task_id}, status=generating_catalog")
+                task_mgr.update_status(task_id, 'generating_catalog')
+
+                # 5. 使用 full 模式，file 形式
+                workflow = self._get_workflow(form="file", mode="full")
+
+                # 构建参数
+                params = {
+                    "lang": lang
+                }
+
+                # 6. 使用已上传的文件进行对话
+                prompt = workflow.build_prompt(params)
+                ai_result = self.ai_service.chat_with_multimedia(prompt, multimedia)
+                catalog = workflow.parse_result(ai_result)
+
+                self.logger.info(f"大纲生成成功 - 文件: {file_path}")
+
+                if isinstance(catalog, list):
+                    _set_cached_file_catalog(file_key, catalog)
 
             # 7. 保存大纲到 catalog_info 表，并返回带ID的catalog
             catalog_with_ids = catalog  # 默认返回原始catalog
@@ -175,9 +324,7 @@ class CatalogService:
                 user_id = task.get('user_id')
                 if user_id:
                     self.logger.info(f"保存大纲到catalog_info表: task_id={task_id}, user_id={user_id}")
-                    from business.database.catalog_db import CatalogDB
-                    catalog_db = CatalogDB()
-                    save_result = catalog_db.create_catalog(
+                    save_result = self.catalog_db.create_catalog(
                         task_id=task_id,
                         user_id=user_id,
                         catalog_data=catalog
@@ -186,6 +333,7 @@ class CatalogService:
                         # 从保存结果中获取带ID的catalog_data
                         saved_data = save_result.get('data', {})
                         catalog_with_ids = saved_data.get('catalog_data', catalog)
+                        invalidate_cached_catalog(task_id)
                         self.logger.info(f"大纲保存成功: catalog_id={saved_data.get('id')}, 已添加ID到章节")
                     else:
                         self.logger.error(f"大纲保存失败: {save_result.get('error')}")
@@ -215,7 +363,7 @@ class CatalogService:
             task_id: 任务ID（必填，用于查找大纲）
             
         返回:
-            大纲数据（JSON格式），包含章节层级结构
+            大纲数据（JSON格式），包含章节层级结构；可能是进程内缓存中的共享对象，调用方只能读取，不能修改
         """
         self.logger.info(f"从数据库获取文件大纲 - 文件: {file_path}, task_id={task_id}, 语言: {lang}")
         
@@ -223,13 +371,15 @@ class CatalogService:
         if not task_id:
             self.logger.error("task_id未提供")
             raise ValueError("task_id为必填参数")
-            
+
+        cached_catalog = _get_cached_catalog(task_id)
+        if cached_catalog is not None:
+            self.logger.info(f"命中大纲缓存 - task_id={task_id}")
+            return cached_catalog
+
         try:
             # 从数据库中获取大纲
-            from business.database.catalog_db import CatalogDB
-            catalog_db = CatalogDB()
-            
-            catalog_result = catalog_db.get_catalog_by_task_id(task_id)
+            catalog_result = self.catalog_db.get_catalog_by_task_id(task_id)
             
             if not catalog_result.get('success') or not catalog_result.get('data'):
                 self.logger.warning(f"未能从数据库获取大纲，task_id={task_id}")
@@ -237,6 +387,9 @@ class CatalogService:
                 
             catalog_data = catalog_result['data'].get('catalog_data')
             self.logger.info(f"成功从数据库获取大纲 - task_id={task_id}")
+
+            if catalog_data:
+                _set_cached_catalog(task_id, catalog_data)
             
             return catalog_data
             
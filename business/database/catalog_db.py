@@ -160,6 +160,53 @@ class CatalogDB:
                 "error": str(e)
             }
 
+    def get_catalog_by_id(self, catalog_id: str, columns: str = "*") -> Dict[str, Any]:
+        """
+        根据大纲ID获取大纲记录
+
+        Args:
+            catalog_id: 大纲ID
+            columns: 要查询的列，默认"*"查询所有列
+
+        Returns:
+            dict: 查询结果
+                - success: 是否成功
+                - data: 大纲记录（成功时）
+                - error: 错误信息（失败时）
+        """
+        try:
+            self.logger.info(f"查询大纲记录: catalog_id={catalog_id}")
+
+            result = self.db.select(
+                table=self.table,
+                columns=columns,
+                filters={"id": catalog_id}
+            )
+
+            if result['success']:
+                if result['count'] > 0:
+                    self.logger.info(f"大纲记录查询成功: catalog_id={catalog_id}")
+                    return {
+                        "success": True,
+                        "data": result['data'][0]
+                    }
+                else:
+                    self.logger.warning(f"未找到大纲记录: catalog_id={catalog_id}")
+                    return {
+                        "success": False,
+                        "error": "未找到大纲记录"
+                    }
+            else:
+                self.logger.error(f"大纲记录查询失败: catalog_id={catalog_id}, 错误: {result.get('error')}")
+                return result
+
+        except Exception as e:
+            self.logger.error(f"查询大纲记录异常: catalog_id={catalog_id}, 错误: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
     def update_selected_sections(
         self,
         task_id: str,
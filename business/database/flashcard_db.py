@@ -11,6 +11,9 @@ from utils.logger import get_logger
 
 logger = get_logger(name="business.database.flashcard_db")
 
+# 批量插入时单个请求的最大行数，超大批量按页提交，避免单个请求体过大
+_BATCH_INSERT_PAGE_SIZE = 1000
+
 
 class FlashcardDB:
     """闪卡数据库操作类"""
@@ -181,15 +184,66 @@ class FlashcardDB:
 
                 insert_list.append(insert_data)
 
-            # 执行批量插入
-            result = self.db.insert(table=self.table, data=insert_list)
+            return self._insert_in_pages(result_id, insert_list)
 
-            if result['success']:
-                self.logger.info(f"批量创建闪卡成功: result_id={result_id}, count={len(flashcards)}")
-            else:
-                self.logger.error(f"批量创建闪卡失败: result_id={result_id}, 错误: {result.get('error')}")
+        except Exception as e:
+            self.logger.error(f"批量创建闪卡异常: result_id={result_id}, 错误: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "error": str(e)
+            }
 
-            return result
+    def batch_create_flashcard_rows(
+        self,
+        result_id: str,
+        user_id: str,
+        rows: List[tuple],
+        catalog_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        批量创建闪卡（行元组形式）
+
+        与 batch_create_flashcards 相同，但每张闪卡以元组传入，调用方无需再为每张卡构建中间字典；
+        card_type 由调用方保证有效，这里不再逐张校验。
+        插入时不要求服务端回传记录，返回结果中 data 为空列表，只有 count
+
+        Args:
+            result_id: 闪卡结果集ID
+            user_id: 用户ID
+            rows: 闪卡行列表，每行为 (card_type, card_data, order_index, section_id)
+            catalog_id: 大纲ID（可选，统一设置）
+
+        Returns:
+            dict: 创建结果
+                - success: 是否成功
+                - data: 空列表（成功时）
+                - count: 创建数量（成功时）
+                - error: 错误信息（失败时）
+        """
+        try:
+            self.logger.info(f"批量创建闪卡: result_id={result_id}, count={len(rows)}")
+
+            # 所有行共享的字段
+            base_data = {
+                "result_id": result_id,
+                "user_id": user_id,
+                "is_deleted": False
+            }
+            if catalog_id:
+                base_data["catalog_id"] = catalog_id
+
+            insert_list = [
+                {
+                    **base_data,
+                    "card_type": card_type,
+                    "card_data": card_data,
+                    "order_index": order_index,
+                    "section_id": section_id
+                }
+                for card_type, card_data, order_index, section_id in rows
+            ]
+
+            return self._insert_in_pages(result_id, insert_list, returning="minimal")
 
         except Exception as e:
             self.logger.error(f"批量创建闪卡异常: result_id={result_id}, 错误: {str(e)}", exc_info=True)
@@ -198,6 +252,73 @@ class FlashcardDB:
                 "error": str(e)
             }
 
+    def _insert_in_pages(
+        self,
+        result_id: str,
+        insert_list: List[Dict[str, Any]],
+        returning: str = "representation"
+    ) -> Dict[str, Any]:
+        """
+        分页执行批量插入：每页一条多行 INSERT，常规批量只需一次请求
+
+        注意：
+            - 页内和页间都保持 insert_list 的顺序
+            - 错误以页为粒度：某一页失败时整页都未写入，但之前的页已写入（分页之间不在同一事务中）
+        """
+        inserted = []
+        count = 0
+        for start in range(0, len(insert_list), _BATCH_INSERT_PAGE_SIZE):
+            result = self.db.insert_many(
+                table=self.table,
+                data_list=insert_list[start:start + _BATCH_INSERT_PAGE_SIZE],
+                returning=returning
+            )
+            if not result['success']:
+                self.logger.error(f"批量创建闪卡失败: result_id={result_id}, offset={start}, 错误: {result.get('error')}")
+                return result
+            inserted.extend(result['data'])
+            count += result['count']
+
+        self.logger.info(f"批量创建闪卡成功: result_id={result_id}, count={count}")
+        return {
+            "success": True,
+            "data": inserted,
+            "count": count
+        }
+
+    def delete_flashcards_by_result_id(self, result_id: str) -> Dict[str, Any]:
+        """
+        删除结果集下的所有闪卡（用于保存失败时回滚已写入的分页）
+
+        Args:
+            result_id: 闪卡结果集ID
+
+        Returns:
+            dict: 删除结果
+                - success: 是否成功
+                - count: 删除数量（成功时）
+                - error: 错误信息（失败时）
+        """
+        try:
+            self.logger.info(f"删除结果集闪卡: result_id={result_id}")
+
+            result = self.db.delete(
+                table=self.table,
+                filters={"result_id": result_id}
+            )
+
+            if not result['success']:
+                self.logger.error(f"删除结果集闪卡失败: result_id={result_id}, 错误: {result.get('error')}")
+
+            return result
+
+        except Exception as e:
+            self.logger.error(f"删除结果集闪卡异常: result_id={result_id}, 错误: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
     def get_flashcards_by_task_id(self, task_id: str) -> Dict[str, Any]:
         """
         根据任务ID查询闪卡列表
@@ -4,8 +4,10 @@
 负责处理闪卡导出相关的业务逻辑，支持 CSV 和 APKG 格式导出
 """
 
+import hashlib
+import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Optional
 from business.database.flashcard_db import FlashcardDB
 from utils.anki_exporter import AnkiExporter
 from utils.logger import get_logger
@@ -32,7 +34,8 @@ class ExportBusiness:
         self,
         task_id: str,
         export_format: str = 'apkg',
-        deck_name: Optional[str] = None
+        deck_name: Optional[str] = None,
+        known_etags: Iterable[str] = ()
     ) -> Dict[str, Any]:
         """
         导出指定任务的闪卡
@@ -41,12 +44,15 @@ class ExportBusiness:
             task_id: 任务ID
             export_format: 导出格式，支持 'apkg' 或 'csv'
             deck_name: 牌组名称（仅用于 apkg 格式，可选）
+            known_etags: 客户端已缓存版本的 ETag（来自 If-None-Match），与当前内容一致时不生成文件
 
         Returns:
             dict: 导出结果
                 - success: 是否成功
-                - file_path: 生成的文件路径（成功时）
-                - file_name: 文件名（成功时）
+                - etag: 由闪卡内容、格式和牌组名称计算的 ETag（成功时）
+                - not_modified: 为 True 时内容与客户端缓存一致，未生成文件（成功时）
+                - file_path: 生成的文件路径（成功且需要返回文件时）
+                - file_name: 文件名（成功且需要返回文件时）
                 - format: 导出格式（成功时）
                 - count: 导出的卡片数量（成功时）
                 - error: 错误信息（失败时）
@@ -84,16 +90,32 @@ class ExportBusiness:
 
             self.logger.info(f"查询到 {flashcards_count} 张闪卡，准备导出")
 
+            # 使用默认牌组名称或自定义名称
+            final_deck_name = deck_name or f"AnkiGenix_{task_id[:8]}"
+
+            # apkg 文件内含生成时间，同样的闪卡每次导出的字节都不同，ETag 按导出的内容计算；
+            # 客户端已有相同版本时直接返回，不生成文件
+            etag = self._export_etag(flashcards, export_format, final_deck_name)
+            if etag in known_etags or '*' in known_etags:
+                self.logger.info(f"导出内容未变化: task_id={task_id}, format={export_format}")
+                return {
+                    "success": True,
+                    "not_modified": True,
+                    "etag": etag,
+                    "format": export_format,
+                    "count": flashcards_count
+                }
+
             # 2. 根据格式导出文件
             if export_format == 'apkg':
-                # 使用默认牌组名称或自定义名称
-                final_deck_name = deck_name or f"AnkiGenix_{task_id[:8]}"
                 file_path = self.anki_exporter.json_to_anki_pkg(final_deck_name, flashcards)
             else:  # csv
                 file_path = self.anki_exporter.json_to_csv(flashcards)
 
-            # 3. 检查文件是否生成成功
-            if not os.path.exists(file_path):
+            # 3. 检查文件是否生成成功（一次 stat 同时判断存在并获取大小）
+            try:
+                file_size = os.stat(file_path).st_size
+            except FileNotFoundError:
                 self.logger.error(f"文件生成失败: {file_path}")
                 return {
                     "success": False,
@@ -101,7 +123,6 @@ class ExportBusiness:
                 }
 
             file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
 
             self.logger.info(
                 f"导出成功: task_id={task_id}, format={export_format}, "
@@ -110,6 +131,8 @@ class ExportBusiness:
 
             return {
                 "success": True,
+                "not_modified": False,
+                "etag": etag,
                 "file_path": file_path,
                 "file_name": file_name,
                 "format": export_format,
@@ -124,6 +147,14 @@ class ExportBusiness:
                 "error": f"导出失败: {str(e)}"
             }
 
+    @staticmethod
+    def _export_etag(flashcards: list, export_format: str, deck_name: str) -> str:
+        """根据闪卡内容、导出格式和牌组名称计算 ETag（带引号的 sha256 摘要）"""
+        payload = json.dumps(
+            [export_format, deck_name, flashcards], ensure_ascii=False, sort_keys=True, default=str
+        )
+        return '"%s"' % hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
     def export_result_flashcards(
         self,
         result_id: str,
@@ -192,8 +223,10 @@ class ExportBusiness:
             else:  # csv
                 file_path = self.anki_exporter.json_to_csv(flashcards)
 
-            # 3. 检查文件是否生成成功
-            if not os.path.exists(file_path):
+            # 3. 检查文件是否生成成功（一次 stat 同时判断存在并获取大小）
+            try:
+                file_size = os.stat(file_path).st_size
+            except FileNotFoundError:
                 self.logger.error(f"文件生成失败: {file_path}")
                 return {
                     "success": False,
@@ -201,7 +234,6 @@ class ExportBusiness:
                 }
 
             file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
 
             self.logger.info(
                 f"导出成功: result_id={result_id}, format={export_format}, "
@@ -1,6 +1,350 @@
-from ai_services.workflows import CatalogAnalysisWorkflow, FlashcardGenerateWorkflow
+import asyncio
+import functools
+import ipaddress
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from ai_services.workflows import FlashcardGenerateWorkflow
+from business.catalog import CatalogService
+from business.database.catalog_db import CatalogDB
+from business.database.flashcard_db import FlashcardDB
+from business.database.flashcard_result_db import FlashcardResultDB
+from business.task_manager import TaskManager
 from utils.logger import get_logger
 
+logger = get_logger(name="business.flashcard")
+
+# URL校验：只允许 http/https，并拒绝解析到回环、内网、链路本地等非公网地址的主机，避免把内部地址交给爬虫
+# 按解析后的IP判断（而不是主机名文本），十进制/IPv6 等写法和解析到内网的域名同样会被拒绝，
+# localhost-news.com 这类公网域名和国际化域名不会被误拒
+_URL_SCHEMES = ("http", "https")
+
+
+def _is_public_ip(address):
+    """地址为公网地址时返回 True（IPv4 映射的 IPv6 地址按其 IPv4 地址判断）"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_reserved or ip.is_unspecified:
+        return False
+    # is_global 同时排除运营商级 NAT（100.64.0.0/10）等上面未覆盖的非公网地址段
+    return ip.is_global
+
+
+def _is_allowed_url(url):
+    """
+    校验待爬取的URL：协议为 http/https，且主机解析出的所有地址都是公网地址
+
+    解析失败（主机不存在等）同样视为不合法；爬虫访问时会再次解析，本校验不能防御 DNS 重绑定
+    """
+    if any(ch.isspace() for ch in url):
+        return False
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return False
+    if parts.scheme not in _URL_SCHEMES or not parts.hostname:
+        return False
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        return False
+    return bool(addresses) and all(_is_public_ip(sockaddr[0]) for *_, sockaddr in addresses)
+
+
+# 大纲索引缓存：id(catalog) -> (catalog, (id_to_title, id_to_parents))
+# 条目持有 catalog 本身的引用，保证条目存活期间该 id 不会被其他对象复用；
+# 大纲更新后 CatalogService 会返回新的对象，旧条目按 LRU 自然淘汰
+_CATALOG_INDEX_CACHE_MAXSIZE = 256
+_catalog_index_cache = OrderedDict()
+_catalog_index_cache_lock = threading.Lock()
+
+# 后台I/O线程池：与AI调用互不依赖的数据库查询提交到这里并行执行，进程内共享
+_io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="flashcard-io")
+
+# AI调用线程池：多个章节的生成请求互不依赖，并发提交；进程内共享，限制对AI服务的总并发数
+_AI_MAX_WORKERS = 8
+_ai_executor = ThreadPoolExecutor(max_workers=_AI_MAX_WORKERS, thread_name_prefix="flashcard-ai")
+
+# 单个章节AI调用失败时的重试：最多尝试次数，以及首次重试前的等待秒数（之后按指数翻倍）
+_SECTION_AI_ATTEMPTS = 3
+_SECTION_AI_RETRY_DELAY = 1
+
+# 多章节合并请求时每次请求包含的最大章节数，控制单次请求的上下文和输出长度
+_MULTI_SECTION_CHUNK_SIZE = 8
+
+# 网页内容单次请求的最大字符数：超过时按 markdown 标题切分，各段并发生成闪卡后合并
+_URL_CONTENT_CHUNK_CHARS = 30000
+_MARKDOWN_HEADING_RE = re.compile(r"(?m)^(?=#{1,3} )")
+
+
+def _split_markdown(content, max_chars):
+    """
+    按 markdown 一至三级标题把内容切分为不超过 max_chars 的片段
+
+    相邻的小节合并到同一片段；单个小节本身超长时按长度硬切分
+    """
+    chunks = []
+    current = []
+    current_len = 0
+    for part in _MARKDOWN_HEADING_RE.split(content):
+        if not part:
+            continue
+        if current_len + len(part) > max_chars and current:
+            chunks.append("".join(current))
+            current = []
+            current_len = 0
+        if len(part) > max_chars:
+            chunks.extend(part[i:i + max_chars] for i in range(0, len(part), max_chars))
+            continue
+        current.append(part)
+        current_len += len(part)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+# 爬虫共享的后台事件循环：首次爬取时启动，之后所有请求复用同一个循环和爬虫实例
+_CRAWL_TIMEOUT = 60
+_crawl_loop = None
+_crawl_loop_lock = threading.Lock()
+
+
+def _get_crawl_loop():
+    """获取后台事件循环，不存在时创建并在守护线程中运行"""
+    global _crawl_loop
+    with _crawl_loop_lock:
+        if _crawl_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="flashcard-crawl-loop", daemon=True).start()
+            _crawl_loop = loop
+        return _crawl_loop
+
+
+@functools.cache
+def _get_crawl_web_content():
+    """
+    获取爬虫函数
+
+    crawl4ai 依赖浏览器运行时，导入较慢且为可选依赖：首次需要爬取时才导入，之后直接复用；
+    未安装时抛出 ImportError（不缓存，安装后无需重启也能生效）
+    """
+    from ai_services.crawl.web_crawl import crawl_web_content
+    return crawl_web_content
+
+
+# 网页内容缓存：url -> (爬取时间, zlib 压缩后的 markdown)
+# 同一网页的重复请求不再启动浏览器爬取；网页内容可能更新，超过有效期后重新爬取
+_CRAWL_CACHE_MAXSIZE = 128
+_CRAWL_CACHE_TTL = 86400
+_crawl_cache = OrderedDict()
+_crawl_cache_lock = threading.Lock()
+
+# 网页内容磁盘缓存：进程内缓存之下的第二级，保存在 SQLite 中，各 worker 共享，重启/重新部署后仍可命中；
+# 默认放在 data 目录（fly.io 挂载的持久卷），可通过 CRAWL_CACHE_DB 指定路径，设为空字符串时关闭
+_CRAWL_DISK_CACHE_PATH = os.getenv(
+    "CRAWL_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "crawl_cache.db")
+)
+_crawl_db = None
+_crawl_db_lock = threading.Lock()
+
+
+def _get_crawl_db():
+    """获取网页内容磁盘缓存连接，首次调用时打开并清理过期记录；不可用时返回 None（只使用进程内缓存）"""
+    global _crawl_db, _CRAWL_DISK_CACHE_PATH
+    if _crawl_db is None and _CRAWL_DISK_CACHE_PATH:
+        try:
+            os.makedirs(os.path.dirname(_CRAWL_DISK_CACHE_PATH), exist_ok=True)
+            conn = sqlite3.connect(_CRAWL_DISK_CACHE_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS crawl (url TEXT PRIMARY KEY, crawled_at REAL NOT NULL, content BLOB NOT NULL)"
+            )
+            conn.execute("DELETE FROM crawl WHERE crawled_at < ?", (time.time() - _CRAWL_CACHE_TTL,))
+            conn.commit()
+            _crawl_db = conn
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("网页内容磁盘缓存不可用，只使用进程内缓存: %s", e)
+            _CRAWL_DISK_CACHE_PATH = ""
+    return _crawl_db
+
+
+def _get_disk_cached_crawl(url):
+    """从磁盘缓存获取 (爬取时间, 压缩后的网页内容)，未命中、已过期或出错时返回 None"""
+    with _crawl_db_lock:
+        conn = _get_crawl_db()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT crawled_at, content FROM crawl WHERE url = ? AND crawled_at >= ?",
+                (url, time.time() - _CRAWL_CACHE_TTL)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("读取网页内容磁盘缓存失败: %s", e)
+            return None
+    return row
+
+
+def _set_disk_cached_crawl(url, compressed):
+    """写入磁盘缓存，出错时只记录日志"""
+    with _crawl_db_lock:
+        conn = _get_crawl_db()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO crawl (url, crawled_at, content) VALUES (?, ?, ?)",
+                (url, time.time(), compressed)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("写入网页内容磁盘缓存失败: %s", e)
+
+
+def _set_memory_cached_crawl(url, compressed, age=0.0):
+    """写入进程内缓存（age 为内容已缓存的秒数），超出容量时淘汰最久未使用的记录"""
+    with _crawl_cache_lock:
+        _crawl_cache[url] = (time.monotonic() - age, compressed)
+        _crawl_cache.move_to_end(url)
+        while len(_crawl_cache) > _CRAWL_CACHE_MAXSIZE:
+            _crawl_cache.popitem(last=False)
+
+
+def _get_cached_crawl(url):
+    """从进程内缓存获取网页内容，未命中时查磁盘缓存并回填；都未命中或已过期返回 None"""
+    compressed = None
+    with _crawl_cache_lock:
+        cached = _crawl_cache.get(url)
+        if cached is not None:
+            crawled_at, compressed = cached
+            if time.monotonic() - crawled_at > _CRAWL_CACHE_TTL:
+                del _crawl_cache[url]
+                compressed = None
+            else:
+                _crawl_cache.move_to_end(url)
+
+    if compressed is None:
+        row = _get_disk_cached_crawl(url)
+        if row is None:
+            return None
+        crawled_at, compressed = row
+        # 回填时保留原爬取时间，进程内记录与磁盘记录同时过期
+        _set_memory_cached_crawl(url, compressed, age=max(0.0, time.time() - crawled_at))
+    return zlib.decompress(compressed).decode("utf-8")
+
+
+def _set_cached_crawl(url, content):
+    """写入进程内缓存和磁盘缓存（内容压缩后保存）"""
+    compressed = zlib.compress(content.encode("utf-8"))
+    _set_memory_cached_crawl(url, compressed)
+    _set_disk_cached_crawl(url, compressed)
+
+
+# 章节ID映射缓存：catalog_id -> {section_title: section_id}
+# 大纲记录创建后 catalog_data 不再修改（重新分析会创建新记录），按 catalog_id 缓存无需失效
+_SECTION_ID_MAP_CACHE_MAXSIZE = 256
+_section_id_map_cache = OrderedDict()
+_section_id_map_cache_lock = threading.Lock()
+
+
+def _get_cached_section_id_map(catalog_id):
+    """从进程内缓存获取章节ID映射，未命中返回 None"""
+    with _section_id_map_cache_lock:
+        section_id_map = _section_id_map_cache.get(catalog_id)
+        if section_id_map is not None:
+            _section_id_map_cache.move_to_end(catalog_id)
+        return section_id_map
+
+
+def _set_cached_section_id_map(catalog_id, section_id_map):
+    """写入进程内缓存，超出容量时淘汰最久未使用的记录"""
+    if not catalog_id:
+        return
+    with _section_id_map_cache_lock:
+        _section_id_map_cache[catalog_id] = section_id_map
+        _section_id_map_cache.move_to_end(catalog_id)
+        while len(_section_id_map_cache) > _SECTION_ID_MAP_CACHE_MAXSIZE:
+            _section_id_map_cache.popitem(last=False)
+
+
+def _catalog_item_title(item, parent_chapter, parent_section):
+    """
+    大纲节点的路径形式标题
+
+    生成闪卡时按此标题请求章节，保存闪卡时再按同一标题匹配 section_id，两处必须使用同一规则；
+    parent_chapter/parent_section 为最外层的章节/小节标题（见 _child_title_context），没有时为 None
+
+    Returns:
+        str: 标题，节点不是章节/小节/子小节时返回 None
+    """
+    if 'chapter' in item:
+        return item['chapter']
+    if 'section' in item:
+        if parent_chapter:
+            return f"{parent_chapter} - {item['section']}"
+        return item['section']
+    if 'subsection' in item:
+        if parent_chapter and parent_section:
+            return f"{parent_chapter} - {parent_section} - {item['subsection']}"
+        if parent_section:
+            return f"{parent_section} - {item['subsection']}"
+        return item['subsection']
+    return None
+
+
+def _child_title_context(item, parent_chapter, parent_section):
+    """子节点的 (章节标题, 小节标题) 上下文：沿用最外层的章节/小节标题"""
+    return (
+        parent_chapter if parent_chapter is not None else item.get('chapter'),
+        parent_section if parent_section is not None else item.get('section'),
+    )
+
+
+# 卡片 JSONB 格式表：(必需字段, 构建 card_data 的函数)，按顺序匹配
+_CARD_DATA_BUILDERS = (
+    # 基础卡片格式
+    (frozenset(('question', 'answer')),
+     lambda card: {'question': card['question'], 'answer': card['answer']}),
+    # 填空卡片格式
+    (frozenset(('text', 'cloze_items')),
+     lambda card: {'text': card['text'], 'cloze_items': card['cloze_items']}),
+    # 选择题格式
+    (frozenset(('question', 'options')),
+     lambda card: {'question': card['question'], 'options': card['options'], 'correct_index': card.get('correct_index', 0)}),
+)
+
+# 卡片字段组合 -> (卡片类型, 构建函数或None) 的缓存
+# AI 返回的卡片只有少数几种字段组合，同一组合只判断一次；设置上限防止异常数据无限增长
+_CARD_SHAPE_CACHE_MAXSIZE = 64
+_card_shape_cache = {}
+
+
+# 入参校验：必填参数名 -> (日志信息, 返回给调用方的错误信息)
+_REQUIRED_INPUTS = {
+    "task_id": ("task_id未提供", "task_id为必填参数"),
+    "text_content": ("文本内容为空", "文本内容不能为空"),
+    "file_path": ("文件路径为空", "文件路径不能为空"),
+    "section_title": ("章节标题为空", "章节标题不能为空"),
+    "section_titles": ("章节标题列表为空", "章节标题列表不能为空"),
+    "chapter_ids": ("章节ID列表为空", "章节ID列表不能为空"),
+}
+
+
 class FlashcardBusiness:
     def __init__(self, ai_service=None):
         if ai_service is None:
@@ -8,10 +352,18 @@ class FlashcardBusiness:
             from ai_services.ai_deepseek import DeepseekAIService
             ai_service = DeepseekAIService()
         self.ai_service = ai_service
-        self.logger = get_logger(name="business.flashcard")
+        # 数据库访问对象和服务在实例内复用，不在每次调用时重新创建
+        self.task_mgr = TaskManager()
+        self.catalog_db = CatalogDB()
+        self.result_db = FlashcardResultDB()
+        self.flashcard_db = FlashcardDB()
+        self.catalog_service = CatalogService(ai_service=ai_service)
+        # (card_type, form, mode) -> FlashcardGenerateWorkflow，工作流无请求级状态，可在实例内复用
+        self._workflow_cache = {}
+        self.logger = logger
         self.logger.info("初始化 FlashcardBusiness")
 
-    def _save_flashcard_result(self, task_id: str, cards: list, source_type: str, catalog_id: str = None) -> dict:
+    def _save_flashcard_result(self, task_id: str, cards: list, source_type: str, catalog_id: str = None, user_id: str = None) -> dict:
         """
         保存闪卡结果到数据库
 
@@ -20,6 +372,7 @@ class FlashcardBusiness:
             cards: 生成的闪卡列表
             source_type: 来源类型（text/file/web）
             catalog_id: 大纲ID（可选）
+            user_id: 用户ID（可选，调用方已获取任务时传入，未提供时查询任务获取）
 
         Returns:
             dict: 保存结果
@@ -28,31 +381,27 @@ class FlashcardBusiness:
                 - error: 错误信息（失败时）
         """
         try:
-            from business.task_manager import TaskManager
-            from business.database.flashcard_result_db import FlashcardResultDB
-
-            # 获取任务信息以获取 user_id
-            task_mgr = TaskManager()
-            task = task_mgr.get_task(task_id)
+            if not user_id:
+                # 调用方未提供 user_id 时，获取任务信息以获取 user_id
+                task = self.task_mgr.get_task(task_id)
 
-            if not task:
-                self.logger.error(f"任务不存在，无法保存闪卡结果: task_id={task_id}")
-                return {
-                    "success": False,
-                    "error": "任务不存在"
-                }
+                if not task:
+                    self.logger.error("任务不存在，无法保存闪卡结果: task_id=%s", task_id)
+                    return {
+                        "success": False,
+                        "error": "任务不存在"
+                    }
 
-            user_id = task.get('user_id')
-            if not user_id:
-                self.logger.error(f"任务中没有 user_id: task_id={task_id}")
-                return {
-                    "success": False,
-                    "error": "任务中没有user_id"
-                }
+                user_id = task.get('user_id')
+                if not user_id:
+                    self.logger.error("任务中没有 user_id: task_id=%s", task_id)
+                    return {
+                        "success": False,
+                        "error": "任务中没有user_id"
+                    }
 
             # 创建闪卡结果记录
-            result_db = FlashcardResultDB()
-            result = result_db.create_result(
+            result = self.result_db.create_result(
                 task_id=task_id,
                 user_id=user_id,
                 source_type=source_type,
@@ -62,24 +411,72 @@ class FlashcardBusiness:
 
             if result['success']:
                 result_id = result['data'].get('id')
-                self.logger.info(f"闪卡结果保存成功: task_id={task_id}, result_id={result_id}, count={len(cards)}")
+                self.logger.info("闪卡结果保存成功: task_id=%s, result_id=%s, count=%s", task_id, result_id, len(cards))
                 return {
                     "success": True,
                     "result_id": result_id,
                     "user_id": user_id
                 }
             else:
-                self.logger.error(f"闪卡结果保存失败: task_id={task_id}, 错误: {result.get('error')}")
+                self.logger.error("闪卡结果保存失败: task_id=%s, 错误: %s", task_id, result.get('error'))
                 return result
 
         except Exception as e:
-            self.logger.error(f"保存闪卡结果异常: task_id={task_id}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("保存闪卡结果异常: task_id=%s, 错误: %s", task_id, e, exc_info=True)
             return {
                 "success": False,
                 "error": str(e)
             }
 
-    def _save_flashcards(self, result_id: str, user_id: str, cards: list, catalog_id: str = None, section_results: list = None) -> dict:
+    def _save_generation(self, task_id: str, cards: list, source_type: str, catalog_id: str = None, section_results: list = None, catalog_data: list = None, user_id: str = None) -> dict:
+        """
+        保存闪卡结果记录及具体闪卡
+
+        两步写入不在同一事务中：具体闪卡写入失败时删除本次已写入的闪卡和结果记录，
+        不留下没有闪卡的结果记录
+
+        Args:
+            user_id: 用户ID（可选），调用方已获取任务时传入可省去一次任务查询；
+                其余参数同 _save_flashcard_result / _save_flashcards
+
+        Returns:
+            dict: 保存结果
+                - success: 是否成功
+                - result_id: 闪卡结果ID（成功时）
+                - user_id: 用户ID（成功时）
+                - error: 错误信息（失败时）
+        """
+        save_result = self._save_flashcard_result(
+            task_id=task_id,
+            cards=cards,
+            source_type=source_type,
+            catalog_id=catalog_id,
+            user_id=user_id
+        )
+        if not save_result['success']:
+            return save_result
+
+        result_id = save_result['result_id']
+        flashcard_save_result = self._save_flashcards(
+            result_id=result_id,
+            user_id=save_result['user_id'],
+            cards=cards,
+            catalog_id=catalog_id,
+            section_results=section_results,
+            catalog_data=catalog_data
+        )
+        if flashcard_save_result['success']:
+            return save_result
+
+        self.logger.error("具体闪卡保存失败，回滚闪卡结果: result_id=%s, 错误: %s", result_id, flashcard_save_result.get('error'))
+        self.flashcard_db.delete_flashcards_by_result_id(result_id)
+        self.result_db.delete_result(result_id)
+        return {
+            "success": False,
+            "error": flashcard_save_result.get('error')
+        }
+
+    def _save_flashcards(self, result_id: str, user_id: str, cards: list, catalog_id: str = None, section_results: list = None, catalog_data: list = None) -> dict:
         """
         批量保存闪卡到数据库
 
@@ -89,6 +486,7 @@ class FlashcardBusiness:
             cards: 闪卡列表，每张卡包含 question, answer 等字段
             catalog_id: 大纲ID（可选）
             section_results: 章节结果列表（可选），用于设置 section_id
+            catalog_data: 大纲数据（可选），调用方已持有时传入，可省去反查结果集和大纲的两次查询
 
         Returns:
             dict: 保存结果
@@ -96,91 +494,86 @@ class FlashcardBusiness:
                 - count: 保存数量（成功时）
                 - error: 错误信息（失败时）
         """
-        try:
-            from business.database.flashcard_db import FlashcardDB
-
-            flashcard_db = FlashcardDB()
+        # 没有需要保存的闪卡时直接返回，不构建章节映射也不访问数据库
+        if not cards and not section_results:
+            self.logger.info("没有需要保存的闪卡: result_id=%s", result_id)
+            return {
+                "success": True,
+                "data": [],
+                "count": 0
+            }
 
-            # 构建闪卡数据列表
-            flashcards = []
+        try:
+            # 构建闪卡行列表，每行为 (card_type, card_data, order_index, section_id)
+            rows = []
 
             # 如果有 section_results，构建 section_id 映射
             section_id_map = {}
-            if section_results and catalog_id:
+            cached_map = _get_cached_section_id_map(catalog_id) if section_results and catalog_id else None
+            if cached_map is not None:
+                # 同一大纲的映射已构建过，直接复用
+                section_id_map = cached_map
+                self.logger.info("复用已缓存的章节ID映射，映射数量: %s", len(section_id_map))
+            elif section_results and catalog_data:
+                # 调用方已提供大纲数据，直接构建映射
+                section_id_map = self._build_section_id_map(catalog_data)
+                _set_cached_section_id_map(catalog_id, section_id_map)
+                self.logger.info("构建章节ID映射成功，映射数量: %s", len(section_id_map))
+            elif section_results and catalog_id:
                 # 需要从 catalog_data 中获取 section_id
                 try:
-                    from business.database.catalog_db import CatalogDB
-                    catalog_db = CatalogDB()
-
-                    # 通过 catalog_id 获取 catalog_data
-                    from business.task_manager import TaskManager
-                    task_mgr = TaskManager()
-
-                    # 从 section_results 中获取 task_id（如果有）
-                    # 或者我们可以通过 result_id 反查 task_id
-                    from business.database.flashcard_result_db import FlashcardResultDB
-                    result_db = FlashcardResultDB()
-                    result_info = result_db.get_result_by_id(result_id)
+                    # 直接按 catalog_id 查询 catalog_data，无需先通过 result_id 反查 task_id
+                    catalog_result = self.catalog_db.get_catalog_by_id(catalog_id, columns="catalog_data")
 
-                    if result_info['success']:
-                        task_id = result_info['data'].get('task_id')
-                        catalog_result = catalog_db.get_catalog_by_task_id(task_id)
-
-                        if catalog_result['success']:
-                            catalog_data = catalog_result['data'].get('catalog_data', [])
-                            # 构建 section_title -> section_id 的映射
-                            section_id_map = self._build_section_id_map(catalog_data)
-                            self.logger.info(f"构建章节ID映射成功，映射数量: {len(section_id_map)}")
+                    if catalog_result['success']:
+                        catalog_data = catalog_result['data'].get('catalog_data', [])
+                        # 构建 section_title -> section_id 的映射
+                        section_id_map = self._build_section_id_map(catalog_data)
+                        _set_cached_section_id_map(catalog_id, section_id_map)
+                        self.logger.info("构建章节ID映射成功，映射数量: %s", len(section_id_map))
 
                 except Exception as map_err:
-                    self.logger.warning(f"构建章节ID映射失败: {str(map_err)}")
+                    self.logger.warning("构建章节ID映射失败: %s", map_err)
+
+            # 循环内用到的方法提前绑定为局部变量，避免每张卡重复查找属性
+            classify = self._classify_card
+            append = rows.append
 
             # 如果有 section_results，按章节组织卡片
             if section_results:
-                order_index = 0
-                for section_result in section_results:
-                    section_title = section_result.get('section_title', '')
-                    section_cards = section_result.get('cards', [])
-
-                    # 查找对应的 section_id
-                    section_id = section_id_map.get(section_title)
-
-                    for card in section_cards:
-                        card_data = self._convert_card_to_jsonb(card)
-                        flashcards.append({
-                            'card_type': self._detect_card_type(card),
-                            'card_data': card_data,
-                            'order_index': order_index,
-                            'section_id': section_id
-                        })
-                        order_index += 1
+                get_section_id = section_id_map.get
+                # 展开为 (卡片, 对应的 section_id) 序列，统一编号
+                section_cards = (
+                    (card, get_section_id(section_result.get('section_title', '')))
+                    for section_result in section_results
+                    for card in section_result.get('cards', [])
+                )
+                for order_index, (card, section_id) in enumerate(section_cards):
+                    card_type, card_data = classify(card)
+                    append((card_type, card_data, order_index, section_id))
             else:
                 # 没有章节信息，直接保存所有卡片
-                for idx, card in enumerate(cards):
-                    card_data = self._convert_card_to_jsonb(card)
-                    flashcards.append({
-                        'card_type': self._detect_card_type(card),
-                        'card_data': card_data,
-                        'order_index': idx
-                    })
+                for order_index, card in enumerate(cards):
+                    card_type, card_data = classify(card)
+                    append((card_type, card_data, order_index, None))
 
             # 批量保存闪卡
-            result = flashcard_db.batch_create_flashcards(
+            result = self.flashcard_db.batch_create_flashcard_rows(
                 result_id=result_id,
                 user_id=user_id,
-                flashcards=flashcards,
+                rows=rows,
                 catalog_id=catalog_id
             )
 
             if result['success']:
-                self.logger.info(f"闪卡批量保存成功: result_id={result_id}, count={len(flashcards)}")
+                self.logger.info("闪卡批量保存成功: result_id=%s, count=%s", result_id, len(rows))
             else:
-                self.logger.error(f"闪卡批量保存失败: result_id={result_id}, 错误: {result.get('error')}")
+                self.logger.error("闪卡批量保存失败: result_id=%s, 错误: %s", result_id, result.get('error'))
 
             return result
 
         except Exception as e:
-            self.logger.error(f"批量保存闪卡异常: result_id={result_id}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("批量保存闪卡异常: result_id=%s, 错误: %s", result_id, e, exc_info=True)
             return {
                 "success": False,
                 "error": str(e)
@@ -198,107 +591,136 @@ class FlashcardBusiness:
         """
         section_map = {}
 
-        def traverse(items, parents=[]):
-            for item in items:
-                # 获取当前项的标题和ID
-                title = None
-                item_id = item.get('id')
-
-                if 'chapter' in item:
-                    title = item['chapter']
-                elif 'section' in item:
-                    # 构建完整路径
-                    parent_chapter = next((p['chapter'] for p in parents if 'chapter' in p), '')
-                    if parent_chapter:
-                        title = f"{parent_chapter} - {item['section']}"
-                    else:
-                        title = item['section']
-                elif 'subsection' in item:
-                    parent_chapter = next((p['chapter'] for p in parents if 'chapter' in p), '')
-                    parent_section = next((p['section'] for p in parents if 'section' in p), '')
-                    if parent_chapter and parent_section:
-                        title = f"{parent_chapter} - {parent_section} - {item['subsection']}"
-                    elif parent_section:
-                        title = f"{parent_section} - {item['subsection']}"
-                    else:
-                        title = item['subsection']
-
-                if title and item_id:
-                    section_map[title] = item_id
-
-                # 递归处理子章节
-                new_parents = parents + [item]
-                for key in ['sections', 'subsections']:
-                    if key in item and isinstance(item[key], list):
-                        traverse(item[key], new_parents)
-
-        traverse(catalog_data)
+        # 显式栈迭代遍历，不为每个节点创建递归栈帧；
+        # 栈元素为 (节点, 所属章节标题, 所属小节标题)，子节点逆序入栈以保持与递归前序遍历相同的顺序
+        stack = [(item, None, None) for item in reversed(catalog_data)]
+        push = stack.append
+        pop = stack.pop
+
+        while stack:
+            item, parent_chapter, parent_section = pop()
+
+            # 获取当前项的标题和ID
+            title = _catalog_item_title(item, parent_chapter, parent_section)
+            item_id = item.get('id')
+
+            if title and item_id:
+                section_map[title] = item_id
+
+            # 子节点沿用最外层的章节/小节标题；先压入 subsections 再压入 sections，出栈时 sections 在前
+            child_chapter, child_section = _child_title_context(item, parent_chapter, parent_section)
+            for key in ('subsections', 'sections'):
+                children = item.get(key)
+                if isinstance(children, list):
+                    for child in reversed(children):
+                        push((child, child_chapter, child_section))
+
         return section_map
 
-    def _convert_card_to_jsonb(self, card: dict) -> dict:
+    def _classify_card(self, card: dict) -> tuple:
         """
-        将卡片转换为 JSONB 格式
+        一次判断卡片类型并转换为 JSONB 格式
 
         Args:
             card: 原始卡片数据
 
         Returns:
-            dict: JSONB 格式的卡片数据
+            tuple: (卡片类型 basic/cloze/multiple_choice, JSONB 格式的卡片数据)
         """
-        # 基础卡片格式
-        if 'question' in card and 'answer' in card:
-            return {
-                'question': card['question'],
-                'answer': card['answer']
-            }
+        shape = frozenset(card)
+        cached = _card_shape_cache.get(shape)
+        if cached is None:
+            cached = self._classify_shape(shape)
+            if len(_card_shape_cache) < _CARD_SHAPE_CACHE_MAXSIZE:
+                _card_shape_cache[shape] = cached
+
+        card_type, build_card_data = cached
+        if build_card_data is None:
+            # 未匹配任何格式时原样保存
+            return card_type, card
+        return card_type, build_card_data(card)
+
+    @staticmethod
+    def _classify_shape(keys: frozenset) -> tuple:
+        """
+        根据卡片字段组合判断卡片类型和 JSONB 构建函数
 
-        # 填空卡片格式
-        if 'text' in card and 'cloze_items' in card:
-            return {
-                'text': card['text'],
-                'cloze_items': card['cloze_items']
-            }
+        Args:
+            keys: 卡片字段集合
 
-        # 选择题格式
-        if 'question' in card and 'options' in card:
-            return {
-                'question': card['question'],
-                'options': card['options'],
-                'correct_index': card.get('correct_index', 0)
-            }
+        Returns:
+            tuple: (卡片类型, 构建函数；未匹配任何格式时为None)
+        """
+        if 'cloze_items' in keys or 'text' in keys:
+            card_type = 'cloze'
+        elif 'options' in keys:
+            card_type = 'multiple_choice'
+        else:
+            card_type = 'basic'
 
-        # 默认返回原始数据
-        return card
+        # 按顺序匹配第一个字段齐全的格式
+        for required_fields, build_card_data in _CARD_DATA_BUILDERS:
+            if keys >= required_fields:
+                return card_type, build_card_data
+        return card_type, None
 
-    def _detect_card_type(self, card: dict) -> str:
+    def _validate_inputs(self, card_number=None, **required) -> str:
         """
-        检测卡片类型
+        校验入参（不涉及任何I/O）
 
         Args:
-            card: 卡片数据
+            card_number: 卡片数量，None 表示由AI智能决定，否则必须为正整数
+            **required: 必填参数，参数名需在 _REQUIRED_INPUTS 中，按传入顺序依次校验
 
         Returns:
-            str: 卡片类型（basic/cloze/multiple_choice）
+            str: 第一个不通过的错误信息，全部通过时返回 None
         """
-        if 'cloze_items' in card or 'text' in card:
-            return 'cloze'
-        elif 'options' in card:
-            return 'multiple_choice'
-        else:
-            return 'basic'
+        for name, value in required.items():
+            if not value or (isinstance(value, str) and value.isspace()):
+                log_message, error = _REQUIRED_INPUTS[name]
+                self.logger.error(log_message)
+                return error
+
+        # bool 是 int 的子类，需单独排除
+        if card_number is not None and (isinstance(card_number, bool) or not isinstance(card_number, int) or card_number <= 0):
+            self.logger.error("卡片数量无效: %r", card_number)
+            return "卡片数量必须为正整数"
+
+        return None
+
+    def _get_workflow(self, card_type="basic_card", form="text", mode="topic"):
+        """
+        获取闪卡生成工作流，同一组参数的实例在 FlashcardBusiness 实例内复用
+
+        Args:
+            card_type: 卡片类型
+            form: 输入形式
+            mode: 生成模式
+
+        Returns:
+            FlashcardGenerateWorkflow: 工作流实例
+        """
+        key = (card_type, form, mode)
+        workflow = self._workflow_cache.get(key)
+        if workflow is None:
+            # 并发线程同时未命中时可能各自创建一次，setdefault 保证最终只保留一个实例
+            workflow = self._workflow_cache.setdefault(
+                key,
+                FlashcardGenerateWorkflow(card_type=card_type, form=form, mode=mode, ai_service=self.ai_service)
+            )
+        return workflow
 
     def analyze_catalog(self, topic, lang="zh"):
         """
         目录分析，返回AI结构化目录内容。
         """
-        self.logger.info(f"开始分析目录: topic={topic}, lang={lang}")
-        workflow = CatalogAnalysisWorkflow(ai_service=self.ai_service)
-        params = {"TOPIC": topic, "lang": lang}
-        result = workflow.run(params)
+        self.logger.info("开始分析目录: topic=%s, lang=%s", topic, lang)
+        # 与大纲服务共用话题大纲缓存，相同话题不再重复调用AI
+        result = self.catalog_service.analyze_catalog_from_topic(topic, lang)
         if isinstance(result, list):
-            self.logger.info(f"目录分析成功: 获取到{len(result)}个章节")
+            self.logger.info("目录分析成功: 获取到%s个章节", len(result))
         else:
-            self.logger.warning(f"目录分析返回非结构化内容: {result}")
+            self.logger.warning("目录分析返回非结构化内容: %s", result)
         return result
 
     def generate_flashcards(self, card_type, topic, number=10, lang="zh"):
@@ -306,14 +728,14 @@ class FlashcardBusiness:
         生成指定类型的闪卡，返回结构化内容。
         card_type: basic_card | cloze_card | multiple_choice_card
         """
-        self.logger.info(f"开始生成闪卡: card_type={card_type}, topic={topic}, number={number}, lang={lang}")
-        workflow = FlashcardGenerateWorkflow(card_type=card_type, ai_service=self.ai_service)
+        self.logger.info("开始生成闪卡: card_type=%s, topic=%s, number=%s, lang=%s", card_type, topic, number, lang)
+        workflow = self._get_workflow(card_type=card_type)
         params = {"TOPIC": topic, "NUMBER": number, "lang": lang}
         result = workflow.run(params)
         if isinstance(result, list):
-            self.logger.info(f"闪卡生成成功: 获取到{len(result)}张闪卡")
+            self.logger.info("闪卡生成成功: 获取到%s张闪卡", len(result))
         else:
-            self.logger.warning(f"闪卡生成返回非结构化内容: {result}")
+            self.logger.warning("闪卡生成返回非结构化内容: %s", result)
         return result
 
     def generate_flashcards_from_file(self, file_path, card_number=None, lang="zh", task_id=None):
@@ -332,65 +754,42 @@ class FlashcardBusiness:
                 - cards: 闪卡列表
                 - error: 错误信息（如果失败）
         """
-        self.logger.info(f"根据文件生成闪卡: {file_path}, task_id={task_id}, 数量: {card_number or '智能'}, 语言: {lang}")
-
-        # 必须提供task_id
-        if not task_id:
-            self.logger.error("task_id未提供")
+        self.logger.info("根据文件生成闪卡: %s, task_id=%s, 数量: %s, 语言: %s", file_path, task_id, card_number or '智能', lang)
+
+        # 在创建工作流、上传文件等耗时操作之前完成入参校验
+        error = self._validate_inputs(task_id=task_id, file_path=file_path, card_number=card_number)
+        if error:
+            # task_id 缺失时没有可更新的任务
+            if task_id:
+                self.task_mgr.update_status(task_id, 'failed')
             return {
                 "success": False,
-                "error": "task_id为必填参数",
+                "error": error,
                 "cards": []
             }
 
-        # 创建任务管理器
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
-
-        if not file_path:
-            self.logger.error("文件路径为空")
-            task_mgr.update_status(task_id, 'failed')
-            return {
-                "success": False,
-                "error": "文件路径不能为空",
-                "cards": []
-            }
+        # 任务管理器（实例内复用）
+        task_mgr = self.task_mgr
 
         try:
-            import os
-            if not os.path.exists(file_path):
-                self.logger.error(f"文件不存在: {file_path}")
+            # 1-2. 获取文件的multimedia（任务中已有则复用，否则上传）
+            task = task_mgr.get_task(task_id)
+            multimedia, _, error = self._ensure_multimedia(task_id, task, file_path)
+            if error:
                 task_mgr.update_status(task_id, 'failed')
                 return {
                     "success": False,
-                    "error": "文件不存在",
+                    "error": error,
                     "cards": []
                 }
 
-            # 1. 更新状态：文件上传中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=file_uploading")
-            task_mgr.update_status(task_id, 'file_uploading')
-
-            # 2. 上传文件到AI服务器
-            self.logger.info(f"开始上传文件到AI服务器: {file_path}")
-            multimedia = self.ai_service.upload_files([file_path])
-            self.logger.info(f"文件上传成功，multimedia数量: {len(multimedia)}")
-
-            # 3. 更新状态：AI处理中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=ai_processing")
-            task_mgr.update_status(task_id, 'ai_processing')
-
-            # 4. 更新状态：生成闪卡中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=generating_cards")
-            task_mgr.update_status(task_id, 'generating_cards')
+            # 3-4. 更新状态：AI处理中 -> 生成闪卡中
+            # 两个状态之间没有耗时操作，合并为一次数据库更新；在后台写入，与AI调用并行
+            self.logger.info("更新任务状态: task_id=%s, status=generating_cards", task_id)
+            task_mgr.update_status_async(task_id, 'ai_processing', 'generating_cards')
 
             # 5. 使用FlashcardGenerateWorkflow，文件模式
-            workflow = FlashcardGenerateWorkflow(
-                card_type="basic_card",
-                form="file",
-                mode="full",
-                ai_service=self.ai_service
-            )
+            workflow = self._get_workflow(card_type="basic_card", form="file", mode="full")
 
             # 构建参数
             params = {
@@ -401,37 +800,26 @@ class FlashcardBusiness:
             if card_number is not None:
                 params["NUMBER"] = card_number
 
-            # 6. 使用已上传的文件进行对话
+            # 6-7. 使用已上传的文件进行对话，边接收边解析结果
             prompt = workflow.build_prompt(params)
-            ai_result = self.ai_service.chat_with_multimedia(prompt, multimedia)
-
-            # 7. 解析结果
-            result = workflow.parse_result(ai_result)
+            result = workflow.parse_result_stream(self.ai_service.chat_with_multimedia_stream(prompt, multimedia))
 
             if isinstance(result, list):
-                self.logger.info(f"文件闪卡生成成功: 获取到{len(result)}张闪卡")
+                self.logger.info("文件闪卡生成成功: 获取到%s张闪卡", len(result))
 
-                # 8. 保存闪卡结果到数据库
-                save_result = self._save_flashcard_result(
+                # 8. 保存闪卡结果及具体闪卡到数据库
+                save_result = self._save_generation(
                     task_id=task_id,
                     cards=result,
-                    source_type='file'
+                    source_type='file',
+                    user_id=(task or {}).get('user_id')
                 )
 
                 if not save_result['success']:
-                    self.logger.warning(f"闪卡结果保存失败，但不影响返回: {save_result.get('error')}")
-                else:
-                    # 8.1 保存具体闪卡到 flashcard 表
-                    flashcard_save_result = self._save_flashcards(
-                        result_id=save_result.get('result_id'),
-                        user_id=save_result.get('user_id'),
-                        cards=result
-                    )
-                    if not flashcard_save_result['success']:
-                        self.logger.warning(f"具体闪卡保存失败: {flashcard_save_result.get('error')}")
+                    self.logger.warning("闪卡保存失败，但不影响返回: %s", save_result.get('error'))
 
                 # 9. 更新状态：完成
-                self.logger.info(f"更新任务状态: task_id={task_id}, status=completed")
+                self.logger.info("更新任务状态: task_id=%s, status=completed", task_id)
                 task_mgr.update_status(task_id, 'completed')
 
                 return {
@@ -440,7 +828,7 @@ class FlashcardBusiness:
                     "result_id": save_result.get('result_id')  # 返回结果ID
                 }
             else:
-                self.logger.warning(f"闪卡生成返回非结构化内容: {result}")
+                self.logger.warning("闪卡生成返回非结构化内容: %s", result)
                 task_mgr.update_status(task_id, 'failed')
                 return {
                     "success": False,
@@ -449,14 +837,14 @@ class FlashcardBusiness:
                 }
 
         except Exception as e:
-            self.logger.error(f"文件闪卡生成失败: {str(e)}", exc_info=True)
+            self.logger.error("文件闪卡生成失败: %s", e, exc_info=True)
             task_mgr.update_status(task_id, 'failed')
             return {
                 "success": False,
                 "error": str(e),
                 "cards": []
             }
-    def generate_flashcards_from_text(self, text_content, card_number=None, lang="zh", task_id=None):
+    def generate_flashcards_from_text(self, text_content, card_number=None, lang="zh", task_id=None, user_id=None):
         """
         根据文本内容生成闪卡列表。
 
@@ -465,6 +853,7 @@ class FlashcardBusiness:
             card_number: 卡片数量（可选，不提供则由AI智能决定）
             lang: 语言，默认中文(zh)
             task_id: 任务ID（必填，用于状态追踪和验证）
+            user_id: 任务所属用户ID（可选，调用方已校验任务时传入，保存结果时不再查询任务）
 
         Returns:
             dict: 包含生成结果的字典
@@ -472,47 +861,31 @@ class FlashcardBusiness:
                 - cards: 闪卡列表
                 - error: 错误信息（如果失败）
         """
-        self.logger.info(f"根据文本生成闪卡，task_id={task_id}, 文本长度: {len(text_content) if text_content else 0}, 数量: {card_number or '智能'}, 语言: {lang}")
-
-        # 必须提供task_id
-        if not task_id:
-            self.logger.error("task_id未提供")
+        self.logger.info("根据文本生成闪卡，task_id=%s, 文本长度: %d, 数量: %s, 语言: %s", task_id, len(text_content or ''), card_number or '智能', lang)
+
+        # 在创建工作流、上传文件等耗时操作之前完成入参校验
+        error = self._validate_inputs(task_id=task_id, text_content=text_content, card_number=card_number)
+        if error:
+            # task_id 缺失时没有可更新的任务
+            if task_id:
+                self.task_mgr.update_status(task_id, 'failed')
             return {
                 "success": False,
-                "error": "task_id为必填参数",
+                "error": error,
                 "cards": []
             }
 
-        # 创建任务管理器
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
-
-        if not text_content or not text_content.strip():
-            self.logger.error("文本内容为空")
-            # 更新任务状态为失败
-            task_mgr.update_status(task_id, 'failed')
-            return {
-                "success": False,
-                "error": "文本内容不能为空",
-                "cards": []
-            }
+        # 任务管理器（实例内复用）
+        task_mgr = self.task_mgr
 
         try:
-            # 1. 更新状态：AI处理中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=ai_processing")
-            task_mgr.update_status(task_id, 'ai_processing')
-
-            # 2. 更新状态：生成闪卡中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=generating_cards")
-            task_mgr.update_status(task_id, 'generating_cards')
+            # 1-2. 更新状态：AI处理中 -> 生成闪卡中
+            # 两个状态之间没有耗时操作，合并为一次数据库更新；在后台写入，与AI调用并行
+            self.logger.info("更新任务状态: task_id=%s, status=generating_cards", task_id)
+            task_mgr.update_status_async(task_id, 'ai_processing', 'generating_cards')
 
             # 3. 使用基础卡片类型生成闪卡
-            workflow = FlashcardGenerateWorkflow(
-                card_type="basic_card",
-                form="text",
-                mode="full",
-                ai_service=self.ai_service
-            )
+            workflow = self._get_workflow(card_type="basic_card", form="text", mode="full")
 
             # 构建参数
             params = {
@@ -527,29 +900,21 @@ class FlashcardBusiness:
             result = workflow.run(params)
 
             if isinstance(result, list):
-                self.logger.info(f"文本闪卡生成成功: 获取到{len(result)}张闪卡")
+                self.logger.info("文本闪卡生成成功: 获取到%s张闪卡", len(result))
 
-                # 4. 保存闪卡结果到数据库
-                save_result = self._save_flashcard_result(
+                # 4. 保存闪卡结果及具体闪卡到数据库
+                save_result = self._save_generation(
                     task_id=task_id,
                     cards=result,
-                    source_type='text'
+                    source_type='text',
+                    user_id=user_id
                 )
 
                 if not save_result['success']:
-                    self.logger.warning(f"闪卡结果保存失败，但不影响返回: {save_result.get('error')}")
-                else:
-                    # 4.1 保存具体闪卡到 flashcard 表
-                    flashcard_save_result = self._save_flashcards(
-                        result_id=save_result.get('result_id'),
-                        user_id=save_result.get('user_id'),
-                        cards=result
-                    )
-                    if not flashcard_save_result['success']:
-                        self.logger.warning(f"具体闪卡保存失败: {flashcard_save_result.get('error')}")
+                    self.logger.warning("闪卡保存失败，但不影响返回: %s", save_result.get('error'))
 
                 # 5. 更新状态：完成
-                self.logger.info(f"更新任务状态: task_id={task_id}, status=completed")
+                self.logger.info("更新任务状态: task_id=%s, status=completed", task_id)
                 task_mgr.update_status(task_id, 'completed')
 
                 return {
@@ -558,7 +923,7 @@ class FlashcardBusiness:
                     "result_id": save_result.get('result_id')  # 返回结果ID
                 }
             else:
-                self.logger.warning(f"闪卡生成返回非结构化内容: {result}")
+                self.logger.warning("闪卡生成返回非结构化内容: %s", result)
                 # 更新任务状态为失败
                 task_mgr.update_status(task_id, 'failed')
                 return {
@@ -568,7 +933,7 @@ class FlashcardBusiness:
                 }
 
         except Exception as e:
-            self.logger.error(f"文本闪卡生成失败: {str(e)}", exc_info=True)
+            self.logger.error("文本闪卡生成失败: %s", e, exc_info=True)
             # 更新任务状态为失败
             task_mgr.update_status(task_id, 'failed')
             return {
@@ -577,6 +942,85 @@ class FlashcardBusiness:
                 "cards": []
             }
 
+    def generate_flashcards_from_text_stream(self, text_content, card_number=None, lang="zh", task_id=None, user_id=None):
+        """
+        根据文本内容生成闪卡，AI输出中每张闪卡接收完整后立即产出。
+
+        全部生成完成后保存闪卡结果并把任务状态更新为完成；任何步骤失败时把任务状态更新为失败并抛出异常
+
+        Args:
+            text_content: 输入的文本内容
+            card_number: 卡片数量（可选，不提供则由AI智能决定）
+            lang: 语言，默认中文(zh)
+            task_id: 任务ID（必填，用于状态追踪和验证）
+            user_id: 任务所属用户ID（可选，调用方已校验任务时传入，保存结果时不再查询任务）
+
+        Yields:
+            dict: 单张闪卡
+
+        Raises:
+            ValueError: 入参校验失败或AI返回格式错误
+        """
+        self.logger.info("根据文本流式生成闪卡，task_id=%s, 文本长度: %d, 数量: %s, 语言: %s", task_id, len(text_content or ''), card_number or '智能', lang)
+
+        error = self._validate_inputs(task_id=task_id, text_content=text_content, card_number=card_number)
+        if error:
+            if task_id:
+                self.task_mgr.update_status(task_id, 'failed')
+            raise ValueError(error)
+
+        task_mgr = self.task_mgr
+
+        try:
+            self.logger.info("更新任务状态: task_id=%s, status=generating_cards", task_id)
+            task_mgr.update_status_async(task_id, 'ai_processing', 'generating_cards')
+
+            workflow = self._get_workflow(card_type="basic_card", form="text", mode="full")
+
+            params = {
+                "TEXT_CONTENT": text_content,
+                "lang": lang
+            }
+
+            # 只有当card_number不为None时才添加NUMBER参数
+            if card_number is not None:
+                params["NUMBER"] = card_number
+
+            cards = []
+            card_stream = workflow.run_stream(params)
+            try:
+                for card in card_stream:
+                    cards.append(card)
+                    yield card
+            finally:
+                # 调用方提前关闭（如客户端断开连接）时立即关闭AI流式连接，不再等待垃圾回收
+                card_stream.close()
+
+            self.logger.info("文本闪卡流式生成成功: 获取到%s张闪卡", len(cards))
+
+            save_result = self._save_generation(
+                task_id=task_id,
+                cards=cards,
+                source_type='text',
+                user_id=user_id
+            )
+
+            if not save_result['success']:
+                self.logger.warning("闪卡保存失败，但不影响返回: %s", save_result.get('error'))
+
+            self.logger.info("更新任务状态: task_id=%s, status=completed", task_id)
+            task_mgr.update_status(task_id, 'completed')
+
+        except GeneratorExit:
+            # 调用方未读完就关闭了生成器（客户端断开连接），闪卡不完整，不保存，任务标记为失败
+            self.logger.warning("文本闪卡流式生成被中断: task_id=%s, 已产出%s张闪卡", task_id, len(cards))
+            task_mgr.update_status(task_id, 'failed')
+            raise
+        except Exception as e:
+            self.logger.error("文本闪卡流式生成失败: %s", e, exc_info=True)
+            task_mgr.update_status(task_id, 'failed')
+            raise
+
     def generate_flashcards_from_url(self, url, card_number=None, lang="zh"):
         """
         根据URL爬取网页内容并生成闪卡列表。
@@ -593,7 +1037,7 @@ class FlashcardBusiness:
                 - error: 错误信息（如果失败）
                 - crawled_content: 爬取到的网页内容（可选，用于调试）
         """
-        self.logger.info(f"根据URL生成闪卡: url={url}, card_number={card_number or '智能'}, lang={lang}")
+        self.logger.info("根据URL生成闪卡: url=%s, card_number=%s, lang=%s", url, card_number or '智能', lang)
 
         if not url or not url.strip():
             self.logger.error("URL为空")
@@ -603,65 +1047,75 @@ class FlashcardBusiness:
                 "cards": []
             }
 
-        # 验证URL格式
-        if not url.startswith(('http://', 'https://')):
-            self.logger.error(f"URL格式不正确: {url}")
+        # 验证URL格式（在进入爬虫之前拒绝非法地址和内网地址）
+        if not _is_allowed_url(url):
+            self.logger.error("URL格式不正确或指向内部地址: %s", url)
             return {
                 "success": False,
-                "error": "URL格式不正确，必须以 http:// 或 https:// 开头",
+                "error": "URL格式不正确或指向内部地址，必须以 http:// 或 https:// 开头",
                 "cards": []
             }
 
         try:
-            # 使用web_crawl爬取网页内容
-            import asyncio
-            from ai_services.crawl.web_crawl import crawl_web_content
+            crawled_content = _get_cached_crawl(url)
+            if crawled_content is not None:
+                self.logger.info("命中网页内容缓存，跳过爬取: %s", url)
+            else:
+                # 使用web_crawl爬取网页内容（命中缓存时不需要加载爬虫）
+                crawl_web_content = _get_crawl_web_content()
 
-            self.logger.info(f"开始爬取网页: {url}")
+                self.logger.info("开始爬取网页: %s", url)
 
-            # 运行异步爬虫获取markdown格式内容
-            crawled_content = asyncio.run(crawl_web_content(url, "markdown"))
+                # 在共享的后台事件循环中运行异步爬虫获取markdown格式内容
+                crawl_future = asyncio.run_coroutine_threadsafe(crawl_web_content(url, "markdown"), _get_crawl_loop())
+                try:
+                    crawled_content = crawl_future.result(timeout=_CRAWL_TIMEOUT)
+                except Exception:
+                    crawl_future.cancel()
+                    raise
 
-            if not crawled_content or not crawled_content.strip():
-                self.logger.error("爬取到的网页内容为空")
-                return {
-                    "success": False,
-                    "error": "无法获取网页内容或网页内容为空",
-                    "cards": []
-                }
+                if not crawled_content or crawled_content.isspace():
+                    self.logger.error("爬取到的网页内容为空")
+                    return {
+                        "success": False,
+                        "error": "无法获取网页内容或网页内容为空",
+                        "cards": []
+                    }
+
+                _set_cached_crawl(url, crawled_content)
 
-            self.logger.info(f"成功爬取网页内容，长度: {len(crawled_content)}")
+            crawled_length = len(crawled_content)
+            self.logger.info("成功爬取网页内容，长度: %s", crawled_length)
 
             # 使用FlashcardGenerateWorkflow生成闪卡
-            workflow = FlashcardGenerateWorkflow(
-                card_type="basic_card",
-                form="text",
-                mode="full",
-                ai_service=self.ai_service
-            )
+            workflow = self._get_workflow(card_type="basic_card", form="text", mode="full")
 
-            # 构建参数
-            params = {
-                "TEXT_CONTENT": crawled_content,
-                "lang": lang
-            }
+            if crawled_length > _URL_CONTENT_CHUNK_CHARS:
+                # 长网页超出单次请求的上下文，分段并发生成
+                result = self._generate_from_content_chunks(workflow, crawled_content, card_number, lang)
+            else:
+                # 构建参数
+                params = {
+                    "TEXT_CONTENT": crawled_content,
+                    "lang": lang
+                }
 
-            # 只有当card_number不为None时才添加NUMBER参数
-            if card_number is not None:
-                params["NUMBER"] = card_number
+                # 只有当card_number不为None时才添加NUMBER参数
+                if card_number is not None:
+                    params["NUMBER"] = card_number
 
-            result = workflow.run(params)
+                result = workflow.run(params)
 
             if isinstance(result, list):
-                self.logger.info(f"URL闪卡生成成功: 获取到{len(result)}张闪卡")
+                self.logger.info("URL闪卡生成成功: 获取到%s张闪卡", len(result))
                 return {
                     "success": True,
                     "cards": result,
                     "url": url,
-                    "crawled_length": len(crawled_content)
+                    "crawled_length": crawled_length
                 }
             else:
-                self.logger.warning(f"闪卡生成返回非结构化内容: {result}")
+                self.logger.warning("闪卡生成返回非结构化内容: %s", result)
                 return {
                     "success": False,
                     "error": "AI返回格式错误",
@@ -669,20 +1123,66 @@ class FlashcardBusiness:
                 }
 
         except ImportError as e:
-            self.logger.error(f"导入爬虫模块失败: {str(e)}", exc_info=True)
+            self.logger.error("导入爬虫模块失败: %s", e, exc_info=True)
             return {
                 "success": False,
                 "error": "爬虫模块未安装，请先安装 crawl4ai 库",
                 "cards": []
             }
+        except TimeoutError:
+            self.logger.error("爬取网页超时: url=%s, timeout=%ss", url, _CRAWL_TIMEOUT)
+            return {
+                "success": False,
+                "error": "爬取网页超时",
+                "cards": []
+            }
         except Exception as e:
-            self.logger.error(f"URL闪卡生成失败: {str(e)}", exc_info=True)
+            self.logger.error("URL闪卡生成失败: %s", e, exc_info=True)
             return {
                 "success": False,
                 "error": f"处理失败: {str(e)}",
                 "cards": []
             }
 
+    def _generate_from_content_chunks(self, workflow, content, card_number=None, lang="zh"):
+        """
+        把长内容按 markdown 标题切分后在AI线程池中并发生成闪卡，合并各段结果
+
+        指定了卡片数量时按各段长度比例分配（每段至少1张）
+
+        Args:
+            workflow: 文本全文模式的闪卡生成工作流
+            content: 网页/文本内容
+            card_number: 卡片总数（可选，不提供则由AI智能决定）
+            lang: 语言，默认中文(zh)
+
+        Returns:
+            list: 合并后的闪卡列表；所有片段都失败时返回最后一个片段的非结构化结果
+        """
+        chunks = _split_markdown(content, _URL_CONTENT_CHUNK_CHARS)
+        self.logger.info("内容过长，切分为%d段并发生成闪卡，总长度: %d", len(chunks), len(content))
+
+        futures = []
+        for chunk in chunks:
+            params = {"TEXT_CONTENT": chunk, "lang": lang}
+            if card_number is not None:
+                params["NUMBER"] = max(1, round(card_number * len(chunk) / len(content)))
+            futures.append(_ai_executor.submit(workflow.run, params))
+
+        cards = []
+        failed = None
+        for idx, future in enumerate(futures, 1):
+            result = future.result()
+            if isinstance(result, list):
+                cards.extend(result)
+            else:
+                self.logger.warning("第%d段内容闪卡生成返回非结构化内容: %s", idx, result)
+                failed = result
+
+        if not cards and failed is not None:
+            return failed
+        return cards
+
     def generate_flashcards_from_text_section(self, text_content, section_title, card_number=None, lang="zh"):
         """
         根据文本内容和指定章节生成闪卡列表。
@@ -699,32 +1199,20 @@ class FlashcardBusiness:
                 - cards: 闪卡列表
                 - error: 错误信息（如果失败）
         """
-        self.logger.info(f"根据文本章节生成闪卡，章节: {section_title}, 文本长度: {len(text_content) if text_content else 0}, 数量: {card_number or '智能'}, 语言: {lang}")
-
-        if not text_content or not text_content.strip():
-            self.logger.error("文本内容为空")
-            return {
-                "success": False,
-                "error": "文本内容不能为空",
-                "cards": []
-            }
+        self.logger.info("根据文本章节生成闪卡，章节: %s, 文本长度: %d, 数量: %s, 语言: %s", section_title, len(text_content or ''), card_number or '智能', lang)
 
-        if not section_title or not section_title.strip():
-            self.logger.error("章节标题为空")
+        # 在创建工作流、上传文件等耗时操作之前完成入参校验
+        error = self._validate_inputs(text_content=text_content, section_title=section_title, card_number=card_number)
+        if error:
             return {
                 "success": False,
-                "error": "章节标题不能为空",
+                "error": error,
                 "cards": []
             }
 
         try:
             # 使用章节模式，文本形式
-            workflow = FlashcardGenerateWorkflow(
-                card_type="basic_card",
-                form="text",
-                mode="section",
-                ai_service=self.ai_service
-            )
+            workflow = self._get_workflow(card_type="basic_card", form="text", mode="section")
 
             # 构建参数
             params = {
@@ -740,14 +1228,14 @@ class FlashcardBusiness:
             result = workflow.run(params)
 
             if isinstance(result, list):
-                self.logger.info(f"章节闪卡生成成功: 获取到{len(result)}张闪卡 - 章节: {section_title}")
+                self.logger.info("章节闪卡生成成功: 获取到%s张闪卡 - 章节: %s", len(result), section_title)
                 return {
                     "success": True,
                     "cards": result,
                     "section_title": section_title
                 }
             else:
-                self.logger.warning(f"闪卡生成返回非结构化内容: {result}")
+                self.logger.warning("闪卡生成返回非结构化内容: %s", result)
                 return {
                     "success": False,
                     "error": "AI返回格式错误",
@@ -755,13 +1243,77 @@ class FlashcardBusiness:
                 }
 
         except Exception as e:
-            self.logger.error(f"章节闪卡生成失败 - 章节: {section_title}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("章节闪卡生成失败 - 章节: %s, 错误: %s", section_title, e, exc_info=True)
             return {
                 "success": False,
                 "error": str(e),
                 "cards": []
             }
 
+    def generate_flashcards_from_text_sections(self, text_content, section_titles, card_number=None, lang="zh"):
+        """
+        根据文本内容为多个章节并发生成闪卡列表。
+
+        每个章节的AI调用互不依赖，提交到共享的AI线程池并发执行，结果按 section_titles 顺序返回。
+
+        Args:
+            text_content: 完整的学习材料文本
+            section_titles: 章节标题列表
+            card_number: 每个章节的卡片数量（可选，不提供则由AI智能决定）
+            lang: 语言，默认中文(zh)
+
+        Returns:
+            dict: 包含生成结果的字典
+                - success: 是否至少有一个章节生成成功
+                - cards: 所有章节的闪卡列表
+                - section_results: 成功章节的结果列表（section_title, cards, count）
+                - error: 错误信息（如果失败）
+        """
+        self.logger.info("根据文本多章节生成闪卡，章节数量: %d, 文本长度: %d, 数量: %s, 语言: %s", len(section_titles or ()), len(text_content or ''), card_number or '智能', lang)
+
+        # 在创建工作流、上传文件等耗时操作之前完成入参校验
+        error = self._validate_inputs(text_content=text_content, section_titles=section_titles, card_number=card_number)
+        if error:
+            return {
+                "success": False,
+                "error": error,
+                "cards": [],
+                "section_results": []
+            }
+
+        futures = [
+            _ai_executor.submit(self.generate_flashcards_from_text_section, text_content, section_title, card_number, lang)
+            for section_title in section_titles
+        ]
+
+        all_cards = []
+        section_results = []
+        for section_title, future in zip(section_titles, futures):
+            result = future.result()
+            if result['success']:
+                all_cards.extend(result['cards'])
+                section_results.append({
+                    "section_title": section_title,
+                    "cards": result['cards'],
+                    "count": len(result['cards'])
+                })
+            else:
+                self.logger.warning("章节 %s 闪卡生成失败: %s", section_title, result.get('error'))
+
+        if not section_results:
+            return {
+                "success": False,
+                "error": "所有章节的闪卡生成都失败了",
+                "cards": [],
+                "section_results": []
+            }
+
+        return {
+            "success": True,
+            "cards": all_cards,
+            "section_results": section_results
+        }
+
     def generate_flashcards_from_file_section(self, file_path, section_title, card_number=None, lang="zh", task_id=None):
         """
         根据文件和指定章节生成闪卡列表。
@@ -779,100 +1331,51 @@ class FlashcardBusiness:
                 - cards: 闪卡列表
                 - error: 错误信息（如果失败）
         """
-        self.logger.info(f"根据文件章节生成闪卡: {file_path}, task_id={task_id}, 章节: {section_title}, 数量: {card_number or '智能'}, 语言: {lang}")
-
-        # 必须提供task_id
-        if not task_id:
-            self.logger.error("task_id未提供")
+        self.logger.info("根据文件章节生成闪卡: %s, task_id=%s, 章节: %s, 数量: %s, 语言: %s", file_path, task_id, section_title, card_number or '智能', lang)
+
+        # 在创建工作流、上传文件等耗时操作之前完成入参校验
+        error = self._validate_inputs(task_id=task_id, section_title=section_title, card_number=card_number)
+        if error:
+            # task_id 缺失时没有可更新的任务
+            if task_id:
+                self.task_mgr.update_status(task_id, 'failed')
             return {
                 "success": False,
-                "error": "task_id为必填参数",
+                "error": error,
                 "cards": []
             }
 
-        # 创建任务管理器
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
-
-        if not section_title or not section_title.strip():
-            self.logger.error("章节标题为空")
-            task_mgr.update_status(task_id, 'failed')
-            return {
-                "success": False,
-                "error": "章节标题不能为空",
-                "cards": []
-            }
+        # 任务管理器（实例内复用）
+        task_mgr = self.task_mgr
 
         try:
             # 1. 获取任务信息
             task = task_mgr.get_task(task_id)
             if not task:
-                self.logger.error(f"任务不存在: task_id={task_id}")
+                self.logger.error("任务不存在: task_id=%s", task_id)
                 return {
                     "success": False,
                     "error": "任务不存在",
                     "cards": []
                 }
 
-            # 2. 尝试从input_data.file.info中获取multimedia
-            input_data = task.get('input_data', {})
-            file_data = input_data.get('file', {})
-            multimedia = file_data.get('info')
-
-            file_name = file_data.get('name', 'unknown')
-
-            if multimedia:
-                # 从缓存中获取已上传的文件信息
-                self.logger.info(f"从input_data.file.info中获取到已上传的multimedia，跳过文件上传步骤")
-            else:
-                # 没有缓存，需要上传文件
-                self.logger.info(f"input_data.file.info中没有multimedia，需要上传文件")
-
-                if not file_path:
-                    self.logger.error("文件路径为空")
-                    task_mgr.update_status(task_id, 'failed')
-                    return {
-                        "success": False,
-                        "error": "文件路径不能为空",
-                        "cards": []
-                    }
-
-                import os
-                if not os.path.exists(file_path):
-                    self.logger.error(f"文件不存在: {file_path}")
-                    task_mgr.update_status(task_id, 'failed')
-                    return {
-                        "success": False,
-                        "error": "文件不存在",
-                        "cards": []
-                    }
-
-                # 更新状态：文件上传中
-                self.logger.info(f"更新任务状态: task_id={task_id}, status=file_uploading")
-                task_mgr.update_status(task_id, 'file_uploading')
-
-                # 上传文件到AI服务器
-                self.logger.info(f"开始上传文件到AI服务器: {file_path}")
-                multimedia = self.ai_service.upload_files([file_path])
-                self.logger.info(f"文件上传成功，multimedia数量: {len(multimedia)}")
-
-                file_name = os.path.basename(file_path)
-
-            # 3. 更新状态：AI处理中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=ai_processing")
-            task_mgr.update_status(task_id, 'ai_processing')
+            # 2. 获取文件的multimedia（input_data.file.info 中已有则复用，否则上传）
+            multimedia, file_name, error = self._ensure_multimedia(task_id, task, file_path)
+            if error:
+                task_mgr.update_status(task_id, 'failed')
+                return {
+                    "success": False,
+                    "error": error,
+                    "cards": []
+                }
 
-            # 4. 更新状态：生成闪卡中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=generating_cards")
-            task_mgr.update_status(task_id, 'generating_cards')
+            # 3-4. 更新状态：AI处理中 -> 生成闪卡中
+            # 两个状态之间没有耗时操作，合并为一次数据库更新；在后台写入，与AI调用并行
+            self.logger.info("更新任务状态: task_id=%s, status=generating_cards", task_id)
+            task_mgr.update_status_async(task_id, 'ai_processing', 'generating_cards')
 
             # 5. 使用章节模式，文件形式
-            workflow = FlashcardGenerateWorkflow(
-                card_type="basic_card",
-                form="file",
-                mode="section",
-                ai_service=self.ai_service
-            )
+            workflow = self._get_workflow(card_type="basic_card", form="file", mode="section")
 
             # 构建参数
             params = {
@@ -885,18 +1388,15 @@ class FlashcardBusiness:
             if card_number is not None:
                 params["NUMBER"] = card_number
 
-            # 6. 使用已上传的文件进行对话
+            # 6-7. 使用已上传的文件进行对话，边接收边解析结果
             prompt = workflow.build_prompt(params)
-            ai_result = self.ai_service.chat_with_multimedia(prompt, multimedia)
-
-            # 7. 解析结果
-            result = workflow.parse_result(ai_result)
+            result = workflow.parse_result_stream(self.ai_service.chat_with_multimedia_stream(prompt, multimedia))
 
             if isinstance(result, list):
-                self.logger.info(f"文件章节闪卡生成成功: 获取到{len(result)}张闪卡 - 文件: {file_name}, 章节: {section_title}")
+                self.logger.info("文件章节闪卡生成成功: 获取到%s张闪卡 - 文件: %s, 章节: %s", len(result), file_name, section_title)
 
                 # 8. 更新状态：完成
-                self.logger.info(f"更新任务状态: task_id={task_id}, status=completed")
+                self.logger.info("更新任务状态: task_id=%s, status=completed", task_id)
                 task_mgr.update_status(task_id, 'completed')
 
                 return {
@@ -906,7 +1406,7 @@ class FlashcardBusiness:
                     "file_name": file_name
                 }
             else:
-                self.logger.warning(f"闪卡生成返回非结构化内容: {result}")
+                self.logger.warning("闪卡生成返回非结构化内容: %s", result)
                 task_mgr.update_status(task_id, 'failed')
                 return {
                     "success": False,
@@ -915,7 +1415,7 @@ class FlashcardBusiness:
                 }
 
         except Exception as e:
-            self.logger.error(f"文件章节闪卡生成失败 - 文件: {file_path}, 章节: {section_title}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("文件章节闪卡生成失败 - 文件: %s, 章节: %s, 错误: %s", file_path, section_title, e, exc_info=True)
             task_mgr.update_status(task_id, 'failed')
             return {
                 "success": False,
@@ -941,37 +1441,33 @@ class FlashcardBusiness:
                 - section_results: 每个章节的结果列表
                 - error: 错误信息（如果失败）
         """
-        self.logger.info(f"根据文件章节ID列表生成闪卡: {file_path}, task_id={task_id}, 章节ID数量: {len(chapter_ids)}, 数量: {card_number or '智能'}, 语言: {lang}")
-
-        # 必须提供task_id
-        if not task_id:
-            self.logger.error("task_id未提供")
+        self.logger.info("根据文件章节ID列表生成闪卡: %s, task_id=%s, 章节ID数量: %s, 数量: %s, 语言: %s", file_path, task_id, len(chapter_ids), card_number or '智能', lang)
+
+        # 在创建工作流、上传文件等耗时操作之前完成入参校验
+        error = self._validate_inputs(task_id=task_id, chapter_ids=chapter_ids, card_number=card_number)
+        if error:
+            # task_id 缺失时没有可更新的任务
+            if task_id:
+                self.task_mgr.update_status(task_id, 'failed')
             return {
                 "success": False,
-                "error": "task_id为必填参数",
+                "error": error,
                 "cards": [],
                 "section_results": []
             }
 
-        # 创建任务管理器
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
-
-        if not chapter_ids:
-            self.logger.error("章节ID列表为空")
-            task_mgr.update_status(task_id, 'failed')
-            return {
-                "success": False,
-                "error": "章节ID列表不能为空",
-                "cards": [],
-                "section_results": []
-            }
+        # 任务管理器（实例内复用）
+        task_mgr = self.task_mgr
 
         try:
+            # 大纲记录只依赖 task_id，一开始就提交到后台线程，与任务查询、文件上传、大纲获取和AI调用并行
+            # （提前返回的分支不等待结果，查询在后台自然结束）
+            catalog_record_future = _io_executor.submit(self._fetch_catalog_record, task_id)
+
             # 1. 获取任务信息
             task = task_mgr.get_task(task_id)
             if not task:
-                self.logger.error(f"任务不存在: task_id={task_id}")
+                self.logger.error("任务不存在: task_id=%s", task_id)
                 return {
                     "success": False,
                     "error": "任务不存在",
@@ -979,73 +1475,30 @@ class FlashcardBusiness:
                     "section_results": []
                 }
 
-            # 2. 尝试从input_data.file.info中获取multimedia
-            input_data = task.get('input_data', {})
-            file_data = input_data.get('file', {})
-            multimedia = file_data.get('info')
-
-            file_name = file_data.get('name', 'unknown')
-
-            if multimedia:
-                # 从缓存中获取已上传的文件信息
-                self.logger.info(f"从input_data.file.info中获取到已上传的multimedia，跳过文件上传步骤")
-            else:
-                # 没有缓存，需要上传文件
-                self.logger.info(f"input_data.file.info中没有multimedia，需要上传文件")
-
-                if not file_path:
-                    self.logger.error("文件路径为空")
-                    task_mgr.update_status(task_id, 'failed')
-                    return {
-                        "success": False,
-                        "error": "文件路径不能为空",
-                        "cards": [],
-                        "section_results": []
-                    }
-
-                import os
-                if not os.path.exists(file_path):
-                    self.logger.error(f"文件不存在: {file_path}")
-                    task_mgr.update_status(task_id, 'failed')
-                    return {
-                        "success": False,
-                        "error": "文件不存在",
-                        "cards": [],
-                        "section_results": []
-                    }
-
-                # 更新状态：文件上传中
-                self.logger.info(f"更新任务状态: task_id={task_id}, status=file_uploading")
-                task_mgr.update_status(task_id, 'file_uploading')
-
-                # 上传文件到AI服务器
-                self.logger.info(f"开始上传文件到AI服务器: {file_path}")
-                multimedia = self.ai_service.upload_files([file_path])
-                self.logger.info(f"文件上传成功，multimedia数量: {len(multimedia)}")
-
-                file_name = os.path.basename(file_path)
-
-            # 3. 更新状态：AI处理中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=ai_processing")
-            task_mgr.update_status(task_id, 'ai_processing')
+            # 2. 获取文件的multimedia（input_data.file.info 中已有则复用，否则上传）
+            multimedia, file_name, error = self._ensure_multimedia(task_id, task, file_path)
+            if error:
+                task_mgr.update_status(task_id, 'failed')
+                return {
+                    "success": False,
+                    "error": error,
+                    "cards": [],
+                    "section_results": []
+                }
 
-            # 4. 更新状态：生成闪卡中
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=generating_cards")
-            task_mgr.update_status(task_id, 'generating_cards')
+            # 3-4. 更新状态：AI处理中 -> 生成闪卡中
+            # 两个状态之间没有耗时操作，合并为一次数据库更新；在后台写入，与大纲获取和AI调用并行
+            self.logger.info("更新任务状态: task_id=%s, status=generating_cards", task_id)
+            task_mgr.update_status_async(task_id, 'ai_processing', 'generating_cards')
 
             # 5. 获取文件大纲信息
-            from business.catalog import CatalogService
-            catalog_service = CatalogService()
-            catalog = catalog_service.get_catalog_from_file(file_path, lang, task_id)
+            catalog = self.catalog_service.get_catalog_from_file(file_path, lang, task_id)
 
-            # 从大纲中获取章节标题
-            section_titles = self._get_section_titles_by_ids(catalog, chapter_ids)
-
-            # 过滤掉父章节，只保留叶子节点（没有子章节的节点）
-            section_titles = self._filter_leaf_sections(section_titles, chapter_ids, catalog)
+            # 从大纲中获取章节标题，过滤掉父章节，只保留叶子节点（没有子章节的节点）
+            section_titles = self._filter_leaf_sections(chapter_ids, catalog)
 
             if not section_titles:
-                self.logger.error(f"无法根据章节ID找到对应的章节: {chapter_ids}")
+                self.logger.error("无法根据章节ID找到对应的章节: %s", chapter_ids)
                 task_mgr.update_status(task_id, 'failed')
                 return {
                     "success": False,
@@ -1054,50 +1507,41 @@ class FlashcardBusiness:
                     "section_results": []
                 }
 
-            # 6. 遍历章节ID，为每个章节生成闪卡
+            # 6. 为每个章节生成闪卡
+            # 多个章节合并为一次请求（文件内容只读取一次），各组请求互不依赖，提交到共享的AI线程池并发执行
+            chunks = [
+                section_titles[start:start + _MULTI_SECTION_CHUNK_SIZE]
+                for start in range(0, len(section_titles), _MULTI_SECTION_CHUNK_SIZE)
+            ]
+            futures = [
+                _ai_executor.submit(self._generate_file_sections, chunk, file_name, multimedia, card_number, lang)
+                for chunk in chunks
+            ]
+
             all_cards = []
             section_results = []
 
-            for section_title in section_titles:
-                self.logger.info(f"开始为章节生成闪卡，章节: {section_title}")
-                
-                # 使用章节模式，文件形式
-                workflow = FlashcardGenerateWorkflow(
-                    card_type="basic_card",
-                    form="file",
-                    mode="section",
-                    ai_service=self.ai_service
-                )
-
-                # 构建参数
-                params = {
-                    "FILENAME": file_name,
-                    "SECTION_TITLE": section_title,
-                    "lang": lang
-                }
-
-                # 只有当card_number不为None时才添加NUMBER参数
-                if card_number is not None:
-                    params["NUMBER"] = card_number
-
-                # 使用已上传的文件进行对话
-                prompt = workflow.build_prompt(params)
-                ai_result = self.ai_service.chat_with_multimedia(prompt, multimedia)
-
-                # 解析结果
-                result = workflow.parse_result(ai_result)
-
-                if isinstance(result, list):
-                    self.logger.info(f"章节闪卡生成成功: 获取到{len(result)}张闪卡 - 章节: {section_title}")
-                    all_cards.extend(result)
-                    
-                    section_results.append({
-                        "section_title": section_title,
-                        "cards": result,
-                        "count": len(result)
-                    })
-                else:
-                    self.logger.warning(f"章节 {section_title} 闪卡生成失败，AI返回格式错误: {result}")
+            try:
+                # 按提交顺序收集结果，保持章节顺序
+                for chunk, future in zip(chunks, futures):
+                    for section_title, result in zip(chunk, future.result()):
+                        if not isinstance(result, list):
+                            self.logger.warning("章节 %s 闪卡生成失败，AI返回格式错误: %s", section_title, result)
+                            continue
+
+                        self.logger.info("章节闪卡生成成功: 获取到%s张闪卡 - 章节: %s", len(result), section_title)
+                        all_cards.extend(result)
+
+                        section_results.append({
+                            "section_title": section_title,
+                            "cards": result,
+                            "count": len(result)
+                        })
+            except Exception:
+                # 任一章节出错时整个任务失败，取消尚未开始的章节
+                for future in futures:
+                    future.cancel()
+                raise
 
             # 7. 检查是否成功生成了闪卡
             if not all_cards:
@@ -1110,42 +1554,27 @@ class FlashcardBusiness:
                     "section_results": []
                 }
 
-            # 8. 获取 catalog_id（如果有）
-            catalog_id = None
-            try:
-                from business.database.catalog_db import CatalogDB
-                catalog_db = CatalogDB()
-                catalog_result = catalog_db.get_catalog_by_task_id(task_id)
-                if catalog_result['success']:
-                    catalog_id = catalog_result['data'].get('id')
-                    self.logger.info(f"获取到 catalog_id: {catalog_id}")
-            except Exception as catalog_err:
-                self.logger.warning(f"获取 catalog_id 失败: {str(catalog_err)}")
-
-            # 9. 保存闪卡结果到数据库
-            save_result = self._save_flashcard_result(
+            # 8. 获取大纲记录（如果有），查询已在后台线程中完成
+            # 同一条记录同时提供 catalog_id 和章节映射所需的 catalog_data，收尾阶段不再重复查询
+            catalog_record = catalog_record_future.result() or {}
+            catalog_id = catalog_record.get('id')
+
+            # 9. 保存闪卡结果及具体闪卡（带章节信息）到数据库
+            save_result = self._save_generation(
                 task_id=task_id,
                 cards=all_cards,
                 source_type='file',
-                catalog_id=catalog_id
+                catalog_id=catalog_id,
+                section_results=section_results,
+                catalog_data=catalog_record.get('catalog_data'),
+                user_id=task.get('user_id')
             )
 
             if not save_result['success']:
-                self.logger.warning(f"闪卡结果保存失败，但不影响返回: {save_result.get('error')}")
-            else:
-                # 9.1 保存具体闪卡到 flashcard 表（带章节信息）
-                flashcard_save_result = self._save_flashcards(
-                    result_id=save_result.get('result_id'),
-                    user_id=save_result.get('user_id'),
-                    cards=all_cards,
-                    catalog_id=catalog_id,
-                    section_results=section_results
-                )
-                if not flashcard_save_result['success']:
-                    self.logger.warning(f"具体闪卡保存失败: {flashcard_save_result.get('error')}")
+                self.logger.warning("闪卡保存失败，但不影响返回: %s", save_result.get('error'))
 
             # 10. 更新状态：完成
-            self.logger.info(f"更新任务状态: task_id={task_id}, status=completed")
+            self.logger.info("更新任务状态: task_id=%s, status=completed", task_id)
             task_mgr.update_status(task_id, 'completed')
 
             return {
@@ -1157,7 +1586,7 @@ class FlashcardBusiness:
             }
 
         except Exception as e:
-            self.logger.error(f"文件章节ID列表闪卡生成失败 - 文件: {file_path}, 章节ID: {chapter_ids}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("文件章节ID列表闪卡生成失败 - 文件: %s, 章节ID: %s, 错误: %s", file_path, chapter_ids, e, exc_info=True)
             task_mgr.update_status(task_id, 'failed')
             return {
                 "success": False,
@@ -1166,6 +1595,206 @@ class FlashcardBusiness:
                 "section_results": []
             }
 
+    def _generate_file_section(self, section_title, file_name, multimedia, card_number=None, lang="zh"):
+        """
+        使用已上传的文件为单个章节生成闪卡（在AI线程池中执行）
+
+        AI调用失败时按指数退避重试，次数用尽后抛出最后一次的异常
+
+        Args:
+            section_title: 章节标题
+            file_name: 文件名
+            multimedia: 已上传文件的multimedia信息
+            card_number: 卡片数量（可选，不提供则由AI智能决定）
+            lang: 语言，默认中文(zh)
+
+        Returns:
+            AI返回的解析结果，成功时为闪卡列表
+        """
+        self.logger.info("开始为章节生成闪卡，章节: %s", section_title)
+
+        # 使用章节模式，文件形式
+        workflow = self._get_workflow(card_type="basic_card", form="file", mode="section")
+
+        # 构建参数
+        params = {
+            "FILENAME": file_name,
+            "SECTION_TITLE": section_title,
+            "lang": lang
+        }
+
+        # 只有当card_number不为None时才添加NUMBER参数
+        if card_number is not None:
+            params["NUMBER"] = card_number
+
+        # 使用已上传的文件进行对话
+        prompt = workflow.build_prompt(params)
+        return self._chat_with_multimedia_retry(workflow, prompt, multimedia, section_title)
+
+    def _generate_file_sections(self, section_titles, file_name, multimedia, card_number=None, lang="zh") -> list:
+        """
+        使用已上传的文件，在一次请求中为多个章节生成闪卡（在AI线程池中执行）
+
+        AI返回中缺失或格式错误的章节，单独按章节模式重新生成
+
+        Args:
+            section_titles: 章节标题列表
+            file_name: 文件名
+            multimedia: 已上传文件的multimedia信息
+            card_number: 每个章节的卡片数量（可选，不提供则由AI智能决定）
+            lang: 语言，默认中文(zh)
+
+        Returns:
+            list: 与 section_titles 一一对应的解析结果，成功时为闪卡列表
+        """
+        # 单个章节直接使用章节模式
+        if len(section_titles) == 1:
+            return [self._generate_file_section(section_titles[0], file_name, multimedia, card_number, lang)]
+
+        self.logger.info("开始为多个章节生成闪卡，章节数量: %d", len(section_titles))
+
+        workflow = self._get_workflow(card_type="basic_card", form="file", mode="multi_section")
+
+        params = {
+            "FILENAME": file_name,
+            "SECTION_TITLES": "\n".join(f"{idx}. {title}" for idx, title in enumerate(section_titles, 1)),
+            "lang": lang
+        }
+
+        # 只有当card_number不为None时才添加NUMBER参数
+        if card_number is not None:
+            params["NUMBER"] = card_number
+
+        prompt = workflow.build_prompt(params)
+        result = self._chat_with_multimedia_retry(workflow, prompt, multimedia, section_titles[0])
+
+        # 按章节标题取回各章节的卡片
+        cards_by_title = {}
+        if isinstance(result, dict) and isinstance(result.get('sections'), list):
+            for entry in result['sections']:
+                if isinstance(entry, dict) and isinstance(entry.get('cards'), list):
+                    cards_by_title.setdefault(entry.get('section_title'), entry['cards'])
+
+        results = []
+        for section_title in section_titles:
+            cards = cards_by_title.get(section_title)
+            if cards is None:
+                self.logger.warning("多章节结果中缺少章节，单独重新生成 - 章节: %s", section_title)
+                cards = self._generate_file_section(section_title, file_name, multimedia, card_number, lang)
+            results.append(cards)
+        return results
+
+    def _chat_with_multimedia_retry(self, workflow, prompt, multimedia, section_title):
+        """
+        使用已上传的文件进行对话并边接收边解析，失败时按指数退避重试，次数用尽后抛出最后一次的异常
+
+        响应在流中途出错时整次重试，重试会重新开始解析
+
+        Args:
+            workflow: 用于解析结果的工作流
+            prompt: 对话提示词
+            multimedia: 已上传文件的multimedia信息
+            section_title: 章节标题（仅用于日志）
+
+        Returns:
+            AI返回的解析结果（同 parse_result）
+        """
+        for attempt in range(1, _SECTION_AI_ATTEMPTS + 1):
+            try:
+                return workflow.parse_result_stream(self.ai_service.chat_with_multimedia_stream(prompt, multimedia))
+            except Exception as e:
+                if attempt == _SECTION_AI_ATTEMPTS:
+                    raise
+                delay = _SECTION_AI_RETRY_DELAY * 2 ** (attempt - 1)
+                self.logger.warning("章节AI调用失败，%s秒后重试(%d/%d) - 章节: %s, 错误: %s", delay, attempt, _SECTION_AI_ATTEMPTS - 1, section_title, e)
+                time.sleep(delay)
+
+    def _ensure_multimedia(self, task_id: str, task: dict, file_path: str) -> tuple:
+        """
+        获取任务文件的 multimedia
+
+        input_data.file.info 中已有上传结果时直接复用；否则上传文件，并把结果写回
+        input_data.file.info，同一任务后续的生成请求不再重复上传
+
+        Args:
+            task_id: 任务ID
+            task: 任务信息（可为None，此时只上传不写回）
+            file_path: 本地文件路径
+
+        Returns:
+            tuple: (multimedia, file_name, error)，error 不为None时表示失败
+        """
+        input_data = (task or {}).get('input_data') or {}
+        file_data = input_data.get('file') or {}
+        multimedia = file_data.get('info')
+
+        if multimedia:
+            # 从缓存中获取已上传的文件信息
+            self.logger.info("从input_data.file.info中获取到已上传的multimedia，跳过文件上传步骤")
+            return multimedia, file_data.get('name', 'unknown'), None
+
+        # 没有缓存，需要上传文件
+        self.logger.info("input_data.file.info中没有multimedia，需要上传文件")
+
+        if not file_path:
+            self.logger.error("文件路径为空")
+            return None, None, "文件路径不能为空"
+
+        # 一次 stat 同时判断文件是否存在和是否为空，空文件不再上传和调用AI
+        try:
+            file_size = os.stat(file_path).st_size
+        except FileNotFoundError:
+            self.logger.error("文件不存在: %s", file_path)
+            return None, None, "文件不存在"
+
+        if file_size == 0:
+            self.logger.error("文件为空: %s", file_path)
+            return None, None, "文件内容为空"
+
+        # 更新状态：文件上传中（后台写入，与上传并行；后续状态写入会排在其后）
+        self.logger.info("更新任务状态: task_id=%s, status=file_uploading", task_id)
+        self.task_mgr.update_status_async(task_id, 'file_uploading')
+
+        # 上传文件到AI服务器
+        self.logger.info("开始上传文件到AI服务器: %s", file_path)
+        multimedia = self.ai_service.upload_files([file_path])
+        self.logger.info("文件上传成功，multimedia数量: %s", len(multimedia))
+
+        # 写回 input_data.file.info（后台写入，不阻塞生成）
+        if task:
+            file_data['info'] = multimedia
+            input_data['file'] = file_data
+            _io_executor.submit(self._save_input_data, task_id, task, file_data)
+
+        return multimedia, os.path.basename(file_path), None
+
+    def _save_input_data(self, task_id: str, task: dict, file_data: dict):
+        """写回任务 input_data 中的文件信息，失败只记录日志"""
+        self.logger.info("保存文件multimedia到input_data.file.info: task_id=%s", task_id)
+        result = self.task_mgr.update_input_data_field(task_id, 'file', file_data, task=task)
+        if not result.get('success'):
+            self.logger.error("保存multimedia失败: %s", result.get('error'))
+
+    def _fetch_catalog_record(self, task_id: str):
+        """
+        根据任务ID查询大纲记录
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            dict: 大纲记录（包含 id 和 catalog_data），查询失败或不存在时返回None
+        """
+        try:
+            catalog_result = self.catalog_db.get_catalog_by_task_id(task_id)
+            if catalog_result['success']:
+                catalog_record = catalog_result['data']
+                self.logger.info("获取到 catalog_id: %s", catalog_record.get('id'))
+                return catalog_record
+        except Exception as catalog_err:
+            self.logger.warning("获取 catalog_id 失败: %s", catalog_err)
+        return None
+
     def _get_section_titles_by_ids(self, catalog, chapter_ids):
         """
         根据章节ID列表从大纲中提取章节标题列表
@@ -1175,129 +1804,126 @@ class FlashcardBusiness:
             chapter_ids: 章节ID列表
             
         Returns:
-            list: 章节标题列表
+            list: 章节标题列表（按 chapter_ids 顺序，已去重）
         """
-        titles = []
-
-        def search_catalog(items, parents=[]):
-            for item in items:
-                # 检查当前项目是否是选中的ID
-                if item.get('id') in chapter_ids:
-                    if 'chapter' in item:
-                        # 章节
-                        titles.append(item['chapter'])
-                    elif 'section' in item:
-                        # 小节，使用路径形式
-                        parent_chapter = next((parent['chapter'] for parent in parents if 'chapter' in parent), "")
-                        if parent_chapter:
-                            titles.append(f"{parent_chapter} - {item['section']}")
-                        else:
-                            titles.append(item['section'])
-                    elif 'subsection' in item:
-                        # 子小节，使用路径形式
-                        parent_chapter = next((parent['chapter'] for parent in parents if 'chapter' in parent), "")
-                        parent_section = next((parent['section'] for parent in parents if 'section' in parent), "")
-                        if parent_chapter and parent_section:
-                            titles.append(f"{parent_chapter} - {parent_section} - {item['subsection']}")
-                        elif parent_section:
-                            titles.append(f"{parent_section} - {item['subsection']}")
-                        else:
-                            titles.append(item['subsection'])
-                
-                # 递归搜索子章节
-                new_parents = parents + [item]
-                for key in ['sections', 'subsections']:
-                    if key in item and isinstance(item[key], list):
-                        search_catalog(item[key], new_parents)
-
-        search_catalog(catalog if catalog else [])
-        return titles
-
-    def _filter_leaf_sections(self, section_titles: list, chapter_ids: list, catalog: list) -> list:
+        return list(self._iter_section_titles(catalog, chapter_ids))
+
+    def _iter_section_titles(self, catalog, chapter_ids):
         """
-        过滤掉父章节，只保留叶子节点（没有被选中的子章节的节点）
+        按 chapter_ids 顺序逐个产出章节标题，调用方只需要前几个时可提前停止迭代
 
         Args:
-            section_titles: 章节标题列表
-            chapter_ids: 选中的章节ID列表
-            catalog: 大纲数据
+            catalog: 大纲结构
+            chapter_ids: 章节ID列表
+
+        Yields:
+            str: 章节标题
+        """
+        id_to_title = self._build_id_title_map(catalog)
+        # 按请求顺序去重，重复传入的ID不会生成重复章节（否则会多发一次AI请求）
+        for chapter_id in dict.fromkeys(chapter_ids):
+            title = id_to_title.get(chapter_id)
+            if title is not None:
+                yield title
+
+    def _build_id_title_map(self, catalog):
+        """
+        构建 章节ID -> 章节标题（路径形式）的映射
+
+        Args:
+            catalog: 大纲结构
+
+        Returns:
+            dict: 章节ID -> 章节标题
+        """
+        return self._index_catalog(catalog)[0]
+
+    def _index_catalog(self, catalog):
+        """
+        遍历一次大纲，同时构建标题映射和父子关系
+
+        Args:
+            catalog: 大纲结构
 
         Returns:
-            list: 过滤后的章节标题列表（只包含叶子节点）
+            tuple: (章节ID -> 章节标题（路径形式）, 章节ID -> 直接父节点ID集合)
         """
-        # 构建 ID -> 是否有被选中的子节点 的映射
-        has_selected_children = set()
-
-        def check_children(items):
-            for item in items:
-                item_id = item.get('id')
-
-                # 检查子节点
-                has_child_selected = False
-                for key in ['sections', 'subsections']:
-                    if key in item and isinstance(item[key], list):
-                        for child in item[key]:
-                            child_id = child.get('id')
-                            if child_id in chapter_ids:
-                                has_child_selected = True
-                                # 递归检查更深层的子节点
-                                check_children([child])
-
-                # 如果当前节点有子节点被选中，标记它
-                if has_child_selected and item_id in chapter_ids:
-                    has_selected_children.add(item_id)
-
-                # 继续递归处理子节点
-                for key in ['sections', 'subsections']:
-                    if key in item and isinstance(item[key], list):
-                        check_children(item[key])
-
-        check_children(catalog if catalog else [])
-
-        # 构建 ID -> title 的映射
+        # 同一份大纲（如缓存中的大纲）只展开一次，后续请求直接复用索引
+        cache_key = id(catalog)
+        with _catalog_index_cache_lock:
+            cached = _catalog_index_cache.get(cache_key)
+            if cached is not None and cached[0] is catalog:
+                _catalog_index_cache.move_to_end(cache_key)
+                return cached[1]
+
         id_to_title = {}
-        def build_mapping(items, parents=[]):
-            for item in items:
-                item_id = item.get('id')
-                title = None
-
-                if 'chapter' in item:
-                    title = item['chapter']
-                elif 'section' in item:
-                    parent_chapter = next((p['chapter'] for p in parents if 'chapter' in p), '')
-                    if parent_chapter:
-                        title = f"{parent_chapter} - {item['section']}"
-                    else:
-                        title = item['section']
-                elif 'subsection' in item:
-                    parent_chapter = next((p['chapter'] for p in parents if 'chapter' in p), '')
-                    parent_section = next((p['section'] for p in parents if 'section' in p), '')
-                    if parent_chapter and parent_section:
-                        title = f"{parent_chapter} - {parent_section} - {item['subsection']}"
-                    elif parent_section:
-                        title = f"{parent_section} - {item['subsection']}"
-                    else:
-                        title = item['subsection']
-
-                if title and item_id:
+        # 同一ID可能在大纲中出现多次，因此父节点记录为集合
+        id_to_parents = {}
+
+        # 显式栈迭代遍历，栈元素为 (节点, 所属章节标题, 所属小节标题)
+        # 标题规则与保存闪卡时的 _build_section_id_map 相同，生成的标题才能匹配到 section_id
+        stack = deque((item, None, None) for item in (catalog or []))
+        while stack:
+            item, parent_chapter, parent_section = stack.pop()
+            item_id = item.get('id')
+
+            if item_id:
+                title = _catalog_item_title(item, parent_chapter, parent_section)
+                if title is not None:
                     id_to_title[item_id] = title
 
-                new_parents = parents + [item]
-                for key in ['sections', 'subsections']:
-                    if key in item and isinstance(item[key], list):
-                        build_mapping(item[key], new_parents)
+            child_chapter, child_section = _child_title_context(item, parent_chapter, parent_section)
+            for key in ('sections', 'subsections'):
+                children = item.get(key)
+                if isinstance(children, list):
+                    for child in children:
+                        id_to_parents.setdefault(child.get('id'), set()).add(item_id)
+                        stack.append((child, child_chapter, child_section))
+
+        index = (id_to_title, id_to_parents)
+        with _catalog_index_cache_lock:
+            _catalog_index_cache[cache_key] = (catalog, index)
+            _catalog_index_cache.move_to_end(cache_key)
+            while len(_catalog_index_cache) > _CATALOG_INDEX_CACHE_MAXSIZE:
+                _catalog_index_cache.popitem(last=False)
+        return index
+
+    def _filter_leaf_sections(self, chapter_ids: list, catalog: list) -> list:
+        """
+        根据选中的章节ID获取章节标题，过滤掉父章节，只保留叶子节点（没有被选中的子章节的节点）
+
+        Args:
+            chapter_ids: 选中的章节ID列表
+            catalog: 大纲数据
+
+        Returns:
+            list: 过滤后的章节标题列表（只包含叶子节点，按 chapter_ids 顺序，已去重）
+        """
+        # 选中ID集合，成员判断为 O(1)
+        selected_ids = frozenset(chapter_ids)
+
+        # 标题映射和父子关系来自同一次（已缓存的）大纲遍历
+        id_to_title, id_to_parents = self._index_catalog(catalog)
+
+        # 有直接子节点被选中的选中节点：只需查看每个选中节点的父节点，不再遍历大纲
+        has_selected_children = {
+            parent_id
+            for child_id in selected_ids
+            for parent_id in id_to_parents.get(child_id, ())
+            if parent_id in selected_ids
+        }
 
-        build_mapping(catalog if catalog else [])
+        # 叶子节点 = 选中节点 - 有选中子节点的节点；按请求顺序输出
+        leaf_ids = selected_ids - has_selected_children
 
-        # 过滤：只保留没有被选中子节点的章节
         filtered_titles = []
-        for chapter_id in chapter_ids:
-            if chapter_id not in has_selected_children:
+        for chapter_id in dict.fromkeys(chapter_ids):
+            if chapter_id in leaf_ids:
                 title = id_to_title.get(chapter_id)
                 if title:
                     filtered_titles.append(title)
-                    self.logger.info(f"保留叶子节点章节: {chapter_id} -> {title}")
+                    self.logger.info("保留叶子节点章节: %s -> %s", chapter_id, title)
             else:
-                self.logger.info(f"过滤父章节（有子节点被选中）: {chapter_id}")
+                self.logger.info("过滤父章节（有子节点被选中）: %s", chapter_id)
 
         return filtered_titles 
\ No newline at end of file
@@ -8,12 +8,76 @@
 3. 验证任务合法性
 """
 
-from typing import Optional, Dict, Any
+import copy
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, List, Any
 from supabase_service.database import DatabaseService
 from utils.logger import get_logger
 
 logger = get_logger(name="business.task_manager")
 
+# 后台状态写入线程池，进程内共享
+_status_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="task-status")
+
+# 每个任务最近一次提交的后台状态写入：task_id -> (序号, Future)
+# 同一任务的写入依次等待前一次完成，保证状态按调用顺序落库；
+# 轮到执行时已有更新的写入排在后面的，直接跳过（会被后面的写入覆盖），多次连续推进只落库最后一个状态
+_pending_status = {}
+_pending_status_lock = threading.Lock()
+_status_write_seq = itertools.count()
+
+# input_data 字段合并使用的数据库函数，在 Postgres 中以一条 UPDATE 原子合并（见 docs/TODO.md）
+# 数据库中未部署该函数时回退为读取-修改-写入，并在本进程内不再尝试
+_MERGE_INPUT_DATA_RPC = "merge_task_input_data"
+_merge_input_data_rpc_available = True
+
+# 后台生成的任务只在接收请求的进程内存中执行（见 views._background_executor），worker 重启或机器自动停止时
+# 任务会丢失且停留在中间状态；提交后台生成时在 input_data 中记录提交时间，校验任务时超过该时长仍未结束的视为已丢失，标记为失败
+_BACKGROUND_STARTED_FIELD = "background_started_at"
+_BACKGROUND_GENERATION_TIMEOUT = 30 * 60
+
+# 任务信息短时缓存：task_id -> (查询时间, 任务信息)
+# 同一请求中视图层校验任务后，业务层会再次查询同一任务，短时间内直接复用；
+# 本进程写入任务（状态、input_data）后立即失效，其他进程的写入最多延迟 _TASK_CACHE_TTL 秒可见
+_TASK_CACHE_MAXSIZE = 512
+_TASK_CACHE_TTL = 2
+_task_cache = OrderedDict()
+_task_cache_lock = threading.Lock()
+
+
+def _get_cached_task(task_id):
+    """从进程内缓存获取任务信息（返回副本，调用方可修改），未命中或已过期返回 None"""
+    with _task_cache_lock:
+        cached = _task_cache.get(task_id)
+        if cached is None:
+            return None
+        fetched_at, task = cached
+        if time.monotonic() - fetched_at > _TASK_CACHE_TTL:
+            del _task_cache[task_id]
+            return None
+        _task_cache.move_to_end(task_id)
+    return copy.deepcopy(task)
+
+
+def _set_cached_task(task_id, task):
+    """写入进程内缓存（保存副本），超出容量时淘汰最久未使用的记录"""
+    task = copy.deepcopy(task)
+    with _task_cache_lock:
+        _task_cache[task_id] = (time.monotonic(), task)
+        _task_cache.move_to_end(task_id)
+        while len(_task_cache) > _TASK_CACHE_MAXSIZE:
+            _task_cache.popitem(last=False)
+
+
+def _invalidate_cached_task(task_id):
+    """任务被修改后移除缓存"""
+    with _task_cache_lock:
+        _task_cache.pop(task_id, None)
+
 
 class TaskManager:
     """任务状态管理器"""
@@ -34,7 +98,12 @@ class TaskManager:
             dict: 任务信息，如果不存在则返回 None
         """
         try:
-            self.logger.info(f"查询任务信息: task_id={task_id}")
+            task = _get_cached_task(task_id)
+            if task is not None:
+                self.logger.info("命中任务缓存: task_id=%s, status=%s", task_id, task.get('status'))
+                return task
+
+            self.logger.info("查询任务信息: task_id=%s", task_id)
 
             result = self.db.select(
                 table="task_info",
@@ -43,14 +112,15 @@ class TaskManager:
 
             if result['success'] and result['count'] > 0:
                 task = result['data'][0]
-                self.logger.info(f"任务查询成功: task_id={task_id}, status={task.get('status')}")
+                self.logger.info("任务查询成功: task_id=%s, status=%s", task_id, task.get('status'))
+                _set_cached_task(task_id, task)
                 return task
             else:
-                self.logger.warning(f"任务不存在: task_id={task_id}")
+                self.logger.warning("任务不存在: task_id=%s", task_id)
                 return None
 
         except Exception as e:
-            self.logger.error(f"查询任务失败: task_id={task_id}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("查询任务失败: task_id=%s, 错误: %s", task_id, e, exc_info=True)
             return None
 
     def update_status(
@@ -70,8 +140,79 @@ class TaskManager:
                 - success: 是否成功
                 - error: 错误信息（失败时）
         """
+        # 先等待该任务已提交的后台状态写入，避免终态被较早的中间状态覆盖
+        self.wait_status_writes(task_id)
+        return self._write_status(task_id, status)
+
+    def update_status_async(self, task_id: str, *statuses: str) -> Future:
+        """
+        在后台线程写入中间状态，调用方无需等待数据库往返
+
+        同一任务的后台写入按提交顺序执行；之后的同步 update_status（如 completed / failed）
+        会先等待这些写入完成，因此终态不会被覆盖
+
+        Args:
+            task_id: 任务ID
+            *statuses: 按顺序推进的状态，多个时只写入最后一个（同 update_status_batch）
+
+        Returns:
+            Future: 写入结果（同 update_status 的返回值）
+        """
+        status = self._last_status(task_id, list(statuses))
+        if status is None:
+            future = Future()
+            future.set_result({
+                "success": False,
+                "error": "状态列表不能为空"
+            })
+            return future
+
+        with _pending_status_lock:
+            seq = next(_status_write_seq)
+            previous = _pending_status.get(task_id)
+            future = _status_executor.submit(
+                self._write_status_after, previous[1] if previous else None, task_id, seq, status
+            )
+            _pending_status[task_id] = (seq, future)
+        future.add_done_callback(lambda done: self._clear_pending_status(task_id, done))
+        return future
+
+    def wait_status_writes(self, task_id: str):
+        """等待该任务已提交的后台状态写入完成"""
+        with _pending_status_lock:
+            pending = _pending_status.get(task_id)
+        if pending is not None:
+            pending[1].result()
+
+    def _write_status_after(self, previous: Optional[Future], task_id: str, seq: int, status: str) -> Dict[str, Any]:
+        """等待同一任务的前一次后台写入完成后再写入；之后已有新的写入提交时跳过本次写入"""
+        if previous is not None:
+            previous.result()
+
+        with _pending_status_lock:
+            pending = _pending_status.get(task_id)
+            superseded = pending is not None and pending[0] != seq
+        if superseded:
+            self.logger.info("跳过被覆盖的任务状态: task_id=%s, status=%s", task_id, status)
+            return {
+                "success": True,
+                "skipped": True
+            }
+
+        return self._write_status(task_id, status)
+
+    @staticmethod
+    def _clear_pending_status(task_id: str, future: Future):
+        """后台写入完成后移除记录（期间已有更新的写入提交时保留）"""
+        with _pending_status_lock:
+            pending = _pending_status.get(task_id)
+            if pending is not None and pending[1] is future:
+                del _pending_status[task_id]
+
+    def _write_status(self, task_id: str, status: str) -> Dict[str, Any]:
+        """写入任务状态"""
         try:
-            self.logger.info(f"更新任务状态: task_id={task_id}, status={status}")
+            self.logger.info("更新任务状态: task_id=%s, status=%s", task_id, status)
 
             # 构建更新数据（只更新状态）
             update_data = {"status": status}
@@ -82,45 +223,109 @@ class TaskManager:
                 data=update_data,
                 filters={"id": task_id}
             )
+            _invalidate_cached_task(task_id)
 
             if result['success']:
-                self.logger.info(f"任务状态更新成功: task_id={task_id}, status={status}")
+                self.logger.info("任务状态更新成功: task_id=%s, status=%s", task_id, status)
             else:
-                self.logger.error(f"任务状态更新失败: task_id={task_id}, 错误: {result.get('error')}")
+                self.logger.error("任务状态更新失败: task_id=%s, 错误: %s", task_id, result.get('error'))
 
             return result
 
         except Exception as e:
-            self.logger.error(f"更新任务状态异常: task_id={task_id}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("更新任务状态异常: task_id=%s, 错误: %s", task_id, e, exc_info=True)
             return {
                 "success": False,
                 "error": str(e)
             }
 
+    def update_status_batch(
+        self,
+        task_id: str,
+        statuses: List[str]
+    ) -> Dict[str, Any]:
+        """
+        连续推进多个状态时合并为一次更新
+
+        中间状态之间没有耗时操作、会被立即覆盖时，只写入最后一个状态，
+        省去中间状态的数据库往返
+
+        Args:
+            task_id: 任务ID
+            statuses: 按顺序推进的状态列表
+
+        Returns:
+            dict: 更新结果
+                - success: 是否成功
+                - error: 错误信息（失败时）
+        """
+        status = self._last_status(task_id, statuses)
+        if status is None:
+            return {
+                "success": False,
+                "error": "状态列表不能为空"
+            }
+
+        return self.update_status(task_id, status)
+
+    def _last_status(self, task_id: str, statuses: List[str]) -> Optional[str]:
+        """取连续推进的状态中最后一个，空列表返回 None"""
+        if not statuses:
+            return None
+
+        if len(statuses) > 1:
+            self.logger.info("合并任务状态更新: task_id=%s, 跳过中间状态=%s", task_id, statuses[:-1])
+
+        return statuses[-1]
+
     def update_input_data_field(
         self,
         task_id: str,
         field_name: str,
-        field_value: Any
+        field_value: Any,
+        task: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         更新任务input_data中的某个字段
 
+        优先由数据库函数在一条 UPDATE 中合并字段：只需一次往返，并发更新不同字段时不会互相覆盖；
+        数据库函数不可用时回退为读取任务后整体写回 input_data
+
         Args:
             task_id: 任务ID
             field_name: 字段名
             field_value: 字段值
+            task: 调用方已获取的任务信息（可选，回退时用于省去再次查询）
 
         Returns:
             dict: 更新结果
                 - success: 是否成功
                 - error: 错误信息（失败时）
         """
+        global _merge_input_data_rpc_available
+
         try:
-            self.logger.info(f"更新任务input_data字段: task_id={task_id}, field={field_name}")
+            self.logger.info("更新任务input_data字段: task_id=%s, field=%s", task_id, field_name)
+
+            if _merge_input_data_rpc_available:
+                result = self.db.rpc(_MERGE_INPUT_DATA_RPC, {
+                    "p_task_id": task_id,
+                    "p_patch": {field_name: field_value}
+                })
+                _invalidate_cached_task(task_id)
+                if result['success']:
+                    self.logger.info("input_data字段更新成功: task_id=%s, field=%s", task_id, field_name)
+                    return result
+                # PGRST202：数据库中没有该函数
+                if "PGRST202" not in str(result.get('error')):
+                    self.logger.error("input_data字段更新失败: task_id=%s, 错误: %s", task_id, result.get('error'))
+                    return result
+                self.logger.warning("数据库函数 %s 未部署，改为读取后整体写回 input_data", _MERGE_INPUT_DATA_RPC)
+                _merge_input_data_rpc_available = False
 
             # 先获取当前任务
-            task = self.get_task(task_id)
+            if not task:
+                task = self.get_task(task_id)
             if not task:
                 return {
                     "success": False,
@@ -141,21 +346,43 @@ class TaskManager:
                 data={"input_data": input_data},
                 filters={"id": task_id}
             )
+            _invalidate_cached_task(task_id)
 
             if result['success']:
-                self.logger.info(f"input_data字段更新成功: task_id={task_id}, field={field_name}")
+                self.logger.info("input_data字段更新成功: task_id=%s, field=%s", task_id, field_name)
             else:
-                self.logger.error(f"input_data字段更新失败: task_id={task_id}, 错误: {result.get('error')}")
+                self.logger.error("input_data字段更新失败: task_id=%s, 错误: %s", task_id, result.get('error'))
 
             return result
 
         except Exception as e:
-            self.logger.error(f"更新input_data字段异常: task_id={task_id}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("更新input_data字段异常: task_id=%s, 错误: %s", task_id, e, exc_info=True)
             return {
                 "success": False,
                 "error": str(e)
             }
 
+    def mark_background_started(self, task_id: str, task: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        记录任务已提交后台生成的时间（写入 input_data），用于发现进程退出后丢失的后台任务
+
+        Args:
+            task_id: 任务ID
+            task: 调用方已获取的任务信息（可选，同 update_input_data_field）
+
+        Returns:
+            dict: 更新结果（同 update_input_data_field）
+        """
+        return self.update_input_data_field(task_id, _BACKGROUND_STARTED_FIELD, time.time(), task=task)
+
+    @staticmethod
+    def _is_stale_background_task(task: Dict[str, Any]) -> bool:
+        """任务已提交后台生成超过 _BACKGROUND_GENERATION_TIMEOUT 秒仍未结束时返回 True"""
+        started_at = (task.get('input_data') or {}).get(_BACKGROUND_STARTED_FIELD)
+        if not isinstance(started_at, (int, float)) or task.get('status') in ('completed', 'failed'):
+            return False
+        return time.time() - started_at > _BACKGROUND_GENERATION_TIMEOUT
+
     def validate_task(
         self,
         task_id: str,
@@ -207,14 +434,23 @@ class TaskManager:
                     "error": f"任务已结束，当前状态: {current_status}"
                 }
 
-            self.logger.info(f"任务验证通过: task_id={task_id}")
+            # 5. 后台生成超时未结束：执行该任务的进程已退出（重启、自动停止），任务不会再推进，标记为失败
+            if self._is_stale_background_task(task):
+                self.logger.warning("后台生成超时未结束，标记为失败: task_id=%s, status=%s", task_id, current_status)
+                self.update_status(task_id, 'failed')
+                return {
+                    "valid": False,
+                    "error": "后台生成超时，任务已标记为失败"
+                }
+
+            self.logger.info("任务验证通过: task_id=%s", task_id)
             return {
                 "valid": True,
                 "task": task
             }
 
         except Exception as e:
-            self.logger.error(f"任务验证异常: task_id={task_id}, 错误: {str(e)}", exc_info=True)
+            self.logger.error("任务验证异常: task_id=%s, 错误: %s", task_id, e, exc_info=True)
             return {
                 "valid": False,
                 "error": str(e)
@@ -1,19 +1,208 @@
+import functools
 import json
 import os
 import tempfile
-from django.http import JsonResponse
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from business.flashcard import FlashcardBusiness
-from business.catalog import CatalogService
 from utils.logger import get_logger
 
 logger = get_logger(name="api.views")
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+
+# 后台生成线程池：请求带 async=true 时，闪卡生成在此执行，接口立即返回 202，
+# 前端通过任务状态（completed/failed）获知结果；线程数限制后台生成对AI服务的并发
+# 后台任务只保存在本进程内存中，worker 重启或机器自动停止时会丢失，不会自动重新执行；
+# 提交时记录时间（TaskManager.mark_background_started），超时未结束的任务在下次校验时标记为失败
+_BACKGROUND_MAX_WORKERS = 4
+_background_executor = ThreadPoolExecutor(max_workers=_BACKGROUND_MAX_WORKERS, thread_name_prefix="api-background")
+
+
+def _json_line(data):
+    """把一条数据编码为 NDJSON 的一行"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _log_background_result(task_id, future):
+    """记录后台生成任务的结果（成功/失败状态已由业务层写入任务表）"""
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.error("后台闪卡生成异常: task_id=%s, 错误: %s", task_id, e, exc_info=True)
+        return
+    if result.get('success'):
+        logger.info("后台闪卡生成完成: task_id=%s, 数量: %d", task_id, len(result.get('cards') or ()))
+    else:
+        logger.error("后台闪卡生成失败: task_id=%s, 错误: %s", task_id, result.get('error'))
+
+
+@functools.cache
+def _get_flashcard_business():
+    """获取进程内共享的 FlashcardBusiness，首次调用时创建；业务对象不持有请求级状态，可在请求间复用"""
+    return FlashcardBusiness()
+
+
+def _get_catalog_service():
+    """获取进程内共享的大纲服务（与 FlashcardBusiness 共用同一个实例）"""
+    return _get_flashcard_business().catalog_service
+
+
+def _get_task_manager():
+    """获取进程内共享的任务管理器（与 FlashcardBusiness 共用同一个实例）"""
+    return _get_flashcard_business().task_mgr
+
+
+def _json_loads(data):
+    """解析请求中的JSON，优先使用 orjson；解析失败时抛出 json.JSONDecodeError（orjson 的异常是其子类）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# JSON 请求体大小上限：在读取和解析请求体之前按 Content-Length 拒绝，超大文本也不会再交给AI
+_MAX_JSON_BODY_SIZE = 1024 * 1024
+
+
+def _limit_json_body(view):
+    """JSON 接口装饰器：请求体超过 _MAX_JSON_BODY_SIZE 时直接返回 413"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > _MAX_JSON_BODY_SIZE:
+            logger.warning("请求数据过大: %s bytes", content_length)
+            return _json_response({
+                'success': False,
+                'error': f'请求数据过大，不能超过 {_MAX_JSON_BODY_SIZE // 1024} KB'
+            }, status=413)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+# AI生成接口限流：按客户端IP的令牌桶，桶容量即允许的突发请求数，令牌按固定速率补充；
+# 计数保存在进程内，多个 gunicorn 进程各自计数
+_RATE_LIMIT_CAPACITY = 20
+_RATE_LIMIT_REFILL_PER_SECOND = 20 / 60
+_RATE_LIMIT_MAXSIZE = 10000
+_rate_limit_buckets = OrderedDict()
+_rate_limit_lock = threading.Lock()
+
+
+def _client_ip(request):
+    """
+    获取限流使用的客户端IP：使用 fly.io 代理写入的 Fly-Client-IP，没有时使用连接的对端地址
+
+    不读取 X-Forwarded-For：该请求头可由客户端任意填写，按它计数会让每个请求都拿到新的令牌桶
+    """
+    return request.META.get('HTTP_FLY_CLIENT_IP') or request.META.get('REMOTE_ADDR', '')
+
+
+def _take_rate_limit_token(key):
+    """从 key 对应的令牌桶取一个令牌，成功返回 0，令牌不足时返回需要等待的秒数"""
+    now = time.monotonic()
+    with _rate_limit_lock:
+        tokens, updated_at = _rate_limit_buckets.get(key, (_RATE_LIMIT_CAPACITY, now))
+        tokens = min(_RATE_LIMIT_CAPACITY, tokens + (now - updated_at) * _RATE_LIMIT_REFILL_PER_SECOND)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0
+        else:
+            wait = (1 - tokens) / _RATE_LIMIT_REFILL_PER_SECOND
+        _rate_limit_buckets[key] = (tokens, now)
+        _rate_limit_buckets.move_to_end(key)
+        # 超出容量时淘汰最久未访问的客户端，被淘汰的客户端下次按满桶计算
+        while len(_rate_limit_buckets) > _RATE_LIMIT_MAXSIZE:
+            _rate_limit_buckets.popitem(last=False)
+    return wait
+
+
+def _rate_limit(view):
+    """AI生成接口装饰器：同一客户端IP请求过于频繁时返回 429"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        ip = _client_ip(request)
+        wait = _take_rate_limit_token(ip)
+        if wait:
+            logger.warning("请求过于频繁: ip=%s, path=%s", ip, request.path)
+            response = _json_response({
+                'success': False,
+                'error': '请求过于频繁，请稍后再试'
+            }, status=429)
+            response['Retry-After'] = str(int(wait) + 1)
+            return response
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _load_json_body(request):
+    """解析请求体JSON并确认是对象；不是对象时同样抛出 json.JSONDecodeError，由各接口按格式错误返回 400"""
+    data = _json_loads(request.body)
+    if not isinstance(data, dict):
+        raise json.JSONDecodeError("请求体必须是JSON对象", request.body.decode("utf-8", "replace"), 0)
+    return data
+
+
+def _get_str(data, key):
+    """取请求中的字符串字段并去除首尾空白；字段缺失、为 null 或不是字符串时返回空字符串，按未提供处理"""
+    value = data.get(key)
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _parse_card_number(card_number):
+    """
+    校验并转换请求中的卡片数量（与 URL 接口一致：接受整数或数字字符串，范围 1-50）
+
+    Returns:
+        tuple: (卡片数量, 错误信息)；未提供时卡片数量为 None，校验通过时错误信息为 None
+    """
+    if card_number is None:
+        return None, None
+    # bool 是 int 的子类，true/false 不作为数量
+    if isinstance(card_number, bool):
+        logger.warning("闪卡数量格式错误: %s", card_number)
+        return None, '闪卡数量必须是有效的整数'
+    try:
+        card_number = int(card_number)
+    except (ValueError, TypeError):
+        logger.warning("闪卡数量格式错误: %s", card_number)
+        return None, '闪卡数量必须是有效的整数'
+    if card_number <= 0 or card_number > 50:
+        logger.warning("闪卡数量不合理: %s", card_number)
+        return None, '闪卡数量必须在1-50之间'
+    return card_number, None
+
+
+def _json_response(data, status=200):
+    """返回JSON响应，优先使用 orjson 序列化（闪卡列表等大响应体编码更快）"""
+    if orjson is None:
+        return JsonResponse(data, status=status)
+    return HttpResponse(
+        orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS),
+        content_type="application/json; charset=utf-8",
+        status=status
+    )
+
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
+@_limit_json_body
 def generate_flashcards_from_text(request):
     """
     API接口：根据文本生成闪卡
@@ -24,7 +213,9 @@ def generate_flashcards_from_text(request):
         "task_id": "任务ID（必填）",
         "text": "要学习的文本内容",
         "card_number": 10,  # 可选，不提供则由AI智能决定数量
-        "lang": "zh"  # 可选，默认中文
+        "lang": "zh",  # 可选，默认中文
+        "async": false,  # 可选，为 true 时在后台生成，立即返回 202
+        "stream": false  # 可选，为 true 时以 NDJSON 流式返回
     }
 
     响应 (JSON):
@@ -38,28 +229,51 @@ def generate_flashcards_from_text(request):
         ],
         "count": 10
     }
+
+    async 为 true 时的响应 (202):
+    {
+        "success": true,
+        "task_id": "任务ID",
+        "status": "accepted"
+    }
+    生成结果通过任务状态（completed/failed）和闪卡结果表获取
+
+    stream 为 true 时的响应 (application/x-ndjson)，每张闪卡生成后立即输出一行，最后一行为汇总:
+    {"card": {"question": "问题", "answer": "答案"}}
+    ...
+    {"success": true, "count": 10}
+    生成失败时最后一行为 {"success": false, "error": "错误信息"}
     """
     try:
         # 解析请求数据
-        data = json.loads(request.body)
-        task_id = data.get('task_id', '').strip()
-        text_content = data.get('text', '').strip()
+        data = _load_json_body(request)
+        task_id = _get_str(data, 'task_id')
+        text_content = _get_str(data, 'text')
         card_number = data.get('card_number', None)  # 可选，None表示智能模式
         lang = data.get('lang', 'zh')
+        run_async = data.get('async') is True
+        run_stream = data.get('stream') is True
 
-        logger.info(f"收到文本闪卡生成请求，task_id={task_id}, 文本长度: {len(text_content)}, 数量: {card_number or '智能'}, 语言: {lang}")
+        logger.info("收到文本闪卡生成请求，task_id=%s, 文本长度: %s, 数量: %s, 语言: %s", task_id, len(text_content), card_number or '智能', lang)
 
         # 1. 验证 task_id 是否提供
         if not task_id:
             logger.warning("task_id未提供")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': 'task_id为必填参数'
             }, status=400)
 
+        # 验证并转换卡片数量（如 "10"），格式错误时直接返回，不把任务标记为失败
+        card_number, error = _parse_card_number(card_number)
+        if error:
+            return _json_response({
+                'success': False,
+                'error': error
+            }, status=400)
+
         # 2. 验证任务是否存在且合法
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
+        task_mgr = _get_task_manager()
 
         validation = task_mgr.validate_task(
             task_id=task_id,
@@ -67,8 +281,8 @@ def generate_flashcards_from_text(request):
         )
 
         if not validation['valid']:
-            logger.warning(f"任务验证失败: {validation['error']}")
-            return JsonResponse({
+            logger.warning("任务验证失败: %s", validation['error'])
+            return _json_response({
                 'success': False,
                 'error': validation['error']
             }, status=400)
@@ -76,7 +290,7 @@ def generate_flashcards_from_text(request):
         # 3. 验证文本内容
         if not text_content:
             logger.warning("文本内容为空")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请提供要学习的文本内容'
             }, status=400)
@@ -90,41 +304,81 @@ def generate_flashcards_from_text(request):
             expected_text_length = len(expected_text)
             actual_text_length = len(text_content)
             if actual_text_length != expected_text_length:
-                logger.warning(f"文本长度不匹配: 期望={expected_text_length}, 实际={actual_text_length}")
-                return JsonResponse({
+                logger.warning("文本长度不匹配: 期望=%s, 实际=%s", expected_text_length, actual_text_length)
+                return _json_response({
                     'success': False,
                     'error': f'文本内容长度不匹配，期望: {expected_text_length}, 实际: {actual_text_length}'
                 }, status=400)
 
         # 4. 调用业务层生成闪卡（会自动更新任务状态）
-        biz = FlashcardBusiness()
-        result = biz.generate_flashcards_from_text(text_content, card_number, lang, task_id)
+        biz = _get_flashcard_business()
+
+        if run_async:
+            # 后台生成，不占用请求线程等待AI响应；先记录提交时间，进程退出导致任务丢失时可按超时标记为失败
+            marked = task_mgr.mark_background_started(task_id, task=task)
+            if not marked.get('success'):
+                logger.warning("记录后台生成提交时间失败: task_id=%s, 错误: %s", task_id, marked.get('error'))
+            future = _background_executor.submit(biz.generate_flashcards_from_text, text_content, card_number, lang, task_id, task.get('user_id'))
+            future.add_done_callback(lambda f: _log_background_result(task_id, f))
+            logger.info("文本闪卡生成已提交后台执行: task_id=%s", task_id)
+            return _json_response({
+                'success': True,
+                'task_id': task_id,
+                'status': 'accepted'
+            }, status=202)
+
+        if run_stream:
+            def stream_cards():
+                count = 0
+                cards = biz.generate_flashcards_from_text_stream(text_content, card_number, lang, task_id, task.get('user_id'))
+                try:
+                    for card in cards:
+                        count += 1
+                        yield _json_line({'card': card})
+                except Exception as e:
+                    # 响应头已发出，错误以最后一行返回
+                    logger.error("流式闪卡生成失败: %s", e)
+                    yield _json_line({'success': False, 'error': '生成闪卡失败'})
+                    return
+                finally:
+                    # 客户端断开连接时 Django 关闭本生成器（GeneratorExit 不被上面捕获），
+                    # 随即关闭业务层生成器，由其把任务标记为失败并断开AI流式连接
+                    cards.close()
+                logger.info("成功流式生成 %s 张闪卡", count)
+                yield _json_line({'success': True, 'count': count})
+
+            response = StreamingHttpResponse(stream_cards(), content_type='application/x-ndjson')
+            # 禁用反向代理缓冲，每张闪卡生成后立即送达客户端
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        result = biz.generate_flashcards_from_text(text_content, card_number, lang, task_id, task.get('user_id'))
 
         # 5. 返回结果
         if result['success']:
-            logger.info(f"成功生成 {len(result['cards'])} 张闪卡")
-            return JsonResponse({
+            logger.info("成功生成 %s 张闪卡", len(result['cards']))
+            return _json_response({
                 'success': True,
                 'cards': result['cards'],
                 'count': len(result['cards'])
             })
         else:
-            logger.error(f"闪卡生成失败: {result.get('error')}")
-            return JsonResponse({
+            logger.error("闪卡生成失败: %s", result.get('error'))
+            return _json_response({
                 'success': False,
                 'error': result.get('error', '生成闪卡失败')
             }, status=500)
 
     except json.JSONDecodeError as e:
-        logger.error(f"JSON解析错误: {str(e)}")
-        return JsonResponse({
+        logger.error("JSON解析错误: %s", e)
+        return _json_response({
             'success': False,
             'error': '请求数据格式错误'
         }, status=400)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
@@ -132,6 +386,7 @@ def generate_flashcards_from_text(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
 def generate_flashcards_from_file(request):
     """
     API接口：根据上传的文件生成闪卡
@@ -161,7 +416,7 @@ def generate_flashcards_from_file(request):
         task_id = request.POST.get('task_id', '').strip()
         if not task_id:
             logger.warning("task_id未提供")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': 'task_id为必填参数'
             }, status=400)
@@ -169,7 +424,7 @@ def generate_flashcards_from_file(request):
         # 2. 检查是否有文件上传
         if 'file' not in request.FILES:
             logger.warning("未找到上传的文件")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请上传文件'
             }, status=400)
@@ -184,11 +439,10 @@ def generate_flashcards_from_file(request):
                 card_number = None
         lang = request.POST.get('lang', 'zh')
 
-        logger.info(f"收到文件闪卡生成请求，task_id={task_id}, 文件名: {file_name}, 大小: {uploaded_file.size} bytes, 数量: {card_number or '智能'}, 语言: {lang}")
+        logger.info("收到文件闪卡生成请求，task_id=%s, 文件名: %s, 大小: %s bytes, 数量: %s, 语言: %s", task_id, file_name, uploaded_file.size, card_number or '智能', lang)
 
         # 3. 验证任务是否存在且合法
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
+        task_mgr = _get_task_manager()
 
         validation = task_mgr.validate_task(
             task_id=task_id,
@@ -196,8 +450,8 @@ def generate_flashcards_from_file(request):
         )
 
         if not validation['valid']:
-            logger.warning(f"任务验证失败: {validation['error']}")
-            return JsonResponse({
+            logger.warning("任务验证失败: %s", validation['error'])
+            return _json_response({
                 'success': False,
                 'error': validation['error']
             }, status=400)
@@ -209,8 +463,8 @@ def generate_flashcards_from_file(request):
         expected_file_name = file_info.get('name')
 
         if expected_file_name is not None and file_name != expected_file_name:
-            logger.warning(f"文件名不匹配: 期望={expected_file_name}, 实际={file_name}")
-            return JsonResponse({
+            logger.warning("文件名不匹配: 期望=%s, 实际=%s", expected_file_name, file_name)
+            return _json_response({
                 'success': False,
                 'error': f'文件名不匹配，期望: {expected_file_name}, 实际: {file_name}'
             }, status=400)
@@ -218,9 +472,9 @@ def generate_flashcards_from_file(request):
         # 5. 文件大小限制（10MB）
         max_size = 10 * 1024 * 1024
         if uploaded_file.size > max_size:
-            logger.warning(f"文件过大: {uploaded_file.size} bytes")
+            logger.warning("文件过大: %s bytes", uploaded_file.size)
             task_mgr.update_status(task_id, 'failed')
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': f'文件大小不能超过 {max_size // (1024*1024)}MB'
             }, status=400)
@@ -233,25 +487,25 @@ def generate_flashcards_from_file(request):
             for chunk in uploaded_file.chunks():
                 destination.write(chunk)
 
-        logger.info(f"文件已保存至临时路径: {temp_file_path}")
+        logger.info("文件已保存至临时路径: %s", temp_file_path)
 
         try:
             # 7. 调用业务层生成闪卡（会自动更新任务状态）
-            biz = FlashcardBusiness()
+            biz = _get_flashcard_business()
             result = biz.generate_flashcards_from_file(temp_file_path, card_number, lang, task_id)
 
             # 8. 返回结果
             if result['success']:
-                logger.info(f"成功生成 {len(result['cards'])} 张闪卡")
-                return JsonResponse({
+                logger.info("成功生成 %s 张闪卡", len(result['cards']))
+                return _json_response({
                     'success': True,
                     'cards': result['cards'],
                     'count': len(result['cards']),
                     'file_name': file_name
                 })
             else:
-                logger.error(f"闪卡生成失败: {result.get('error')}")
-                return JsonResponse({
+                logger.error("闪卡生成失败: %s", result.get('error'))
+                return _json_response({
                     'success': False,
                     'error': result.get('error', '生成闪卡失败')
                 }, status=500)
@@ -260,11 +514,11 @@ def generate_flashcards_from_file(request):
             # 9. 清理临时文件
             if os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
-                logger.debug(f"已删除临时文件: {temp_file_path}")
+                logger.debug("已删除临时文件: %s", temp_file_path)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
@@ -272,6 +526,8 @@ def generate_flashcards_from_file(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
+@_limit_json_body
 def generate_flashcards_from_url(request):
     """
     API接口：根据URL爬取网页内容并生成闪卡
@@ -301,25 +557,24 @@ def generate_flashcards_from_url(request):
     """
     try:
         # 解析请求数据
-        data = json.loads(request.body)
-        task_id = data.get('task_id', '').strip()
-        url = data.get('url', '').strip()
+        data = _load_json_body(request)
+        task_id = _get_str(data, 'task_id')
+        url = _get_str(data, 'url')
         card_number = data.get('card_number', None)  # 可选，None表示智能模式
         lang = data.get('lang', 'zh')
 
-        logger.info(f"收到URL闪卡生成请求，task_id={task_id}, URL: {url}, 数量: {card_number or '智能'}, 语言: {lang}")
+        logger.info("收到URL闪卡生成请求，task_id=%s, URL: %s, 数量: %s, 语言: %s", task_id, url, card_number or '智能', lang)
 
         # 1. 验证 task_id 是否提供
         if not task_id:
             logger.warning("task_id未提供")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': 'task_id为必填参数'
             }, status=400)
 
         # 2. 验证任务是否存在且合法
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
+        task_mgr = _get_task_manager()
 
         validation = task_mgr.validate_task(
             task_id=task_id,
@@ -327,8 +582,8 @@ def generate_flashcards_from_url(request):
         )
 
         if not validation['valid']:
-            logger.warning(f"任务验证失败: {validation['error']}")
-            return JsonResponse({
+            logger.warning("任务验证失败: %s", validation['error'])
+            return _json_response({
                 'success': False,
                 'error': validation['error']
             }, status=400)
@@ -336,7 +591,7 @@ def generate_flashcards_from_url(request):
         # 3. 验证URL
         if not url:
             logger.warning("URL为空")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请提供有效的URL地址'
             }, status=400)
@@ -347,37 +602,28 @@ def generate_flashcards_from_url(request):
         expected_url = input_data.get('web_url')
 
         if expected_url is not None and url != expected_url:
-            logger.warning(f"URL不匹配: 期望={expected_url}, 实际={url}")
-            return JsonResponse({
+            logger.warning("URL不匹配: 期望=%s, 实际=%s", expected_url, url)
+            return _json_response({
                 'success': False,
                 'error': f'URL不匹配，期望: {expected_url}, 实际: {url}'
             }, status=400)
 
         # 5. 验证card_number参数（如果提供了的话）
-        if card_number is not None:
-            try:
-                card_number = int(card_number)
-                if card_number <= 0 or card_number > 50:
-                    logger.warning(f"闪卡数量不合理: {card_number}")
-                    return JsonResponse({
-                        'success': False,
-                        'error': '闪卡数量必须在1-50之间'
-                    }, status=400)
-            except (ValueError, TypeError):
-                logger.warning(f"闪卡数量格式错误: {card_number}")
-                return JsonResponse({
-                    'success': False,
-                    'error': '闪卡数量必须是有效的整数'
-                }, status=400)
+        card_number, error = _parse_card_number(card_number)
+        if error:
+            return _json_response({
+                'success': False,
+                'error': error
+            }, status=400)
 
         # 6. 调用业务层生成闪卡
-        biz = FlashcardBusiness()
+        biz = _get_flashcard_business()
         result = biz.generate_flashcards_from_url(url, card_number, lang)
 
         # 7. 返回结果
         if result['success']:
-            logger.info(f"成功从URL生成 {len(result['cards'])} 张闪卡")
-            return JsonResponse({
+            logger.info("成功从URL生成 %s 张闪卡", len(result['cards']))
+            return _json_response({
                 'success': True,
                 'cards': result['cards'],
                 'count': len(result['cards']),
@@ -385,42 +631,48 @@ def generate_flashcards_from_url(request):
                 'crawled_length': result.get('crawled_length')
             })
         else:
-            logger.error(f"闪卡生成失败: {result.get('error')}")
-            return JsonResponse({
+            logger.error("闪卡生成失败: %s", result.get('error'))
+            return _json_response({
                 'success': False,
                 'error': result.get('error', '生成闪卡失败')
             }, status=500)
 
     except json.JSONDecodeError as e:
-        logger.error(f"JSON解析错误: {str(e)}")
-        return JsonResponse({
+        logger.error("JSON解析错误: %s", e)
+        return _json_response({
             'success': False,
             'error': '请求数据格式错误'
         }, status=400)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
 
 
+# 健康检查响应体固定不变，模块加载时编码一次
+_HEALTH_BODY = json.dumps({
+    'status': 'ok',
+    'service': 'ankigenix-backend'
+}).encode('utf-8')
+
+
 @require_http_methods(["GET"])
 def health_check(request):
     """
     健康检查接口
     """
-    return JsonResponse({
-        'status': 'ok',
-        'service': 'ankigenix-backend'
-    })
+    return HttpResponse(_HEALTH_BODY, content_type="application/json")
 
 
 # ============ 章节闪卡生成接口 ============
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
+@_limit_json_body
 def generate_flashcards_from_text_section(request):
     """
     API接口：根据文本内容和指定章节生成闪卡
@@ -430,7 +682,8 @@ def generate_flashcards_from_text_section(request):
     {
         "text": "完整的学习材料文本内容",
         "section_title": "第三章：Python数据类型",
-        "card_number": 10,  # 可选，不提供则由AI智能决定数量
+        "section_titles": ["第三章", "第四章"],  # 可选，提供时为多个章节并发生成，忽略 section_title
+        "card_number": 10,  # 可选，不提供则由AI智能决定数量（多章节时为每个章节的数量）
         "lang": "zh"  # 可选，默认中文
     }
 
@@ -444,64 +697,90 @@ def generate_flashcards_from_text_section(request):
             }
         ],
         "count": 10,
-        "section_title": "第三章：Python数据类型"
+        "section_title": "第三章：Python数据类型",
+        "section_results": [...]  # 仅多章节请求返回，每个成功章节的 section_title, cards, count
     }
     """
     try:
         # 解析请求数据
-        data = json.loads(request.body)
-        text_content = data.get('text', '').strip()
-        section_title = data.get('section_title', '').strip()
+        data = _load_json_body(request)
+        text_content = _get_str(data, 'text')
+        section_title = _get_str(data, 'section_title')
+        section_titles = data.get('section_titles')  # 可选，多章节请求
         card_number = data.get('card_number', None)  # 可选，None表示智能模式
         lang = data.get('lang', 'zh')
 
-        logger.info(f"收到文本章节闪卡生成请求，章节: {section_title}, 文本长度: {len(text_content)}, 数量: {card_number or '智能'}, 语言: {lang}")
+        if section_titles is not None:
+            if not isinstance(section_titles, list) or not all(isinstance(title, str) for title in section_titles):
+                logger.warning("章节标题列表格式错误")
+                return _json_response({
+                    'success': False,
+                    'error': 'section_titles 必须是字符串列表'
+                }, status=400)
+            section_titles = [title.strip() for title in section_titles if title.strip()]
+            if section_titles:
+                section_title = ", ".join(section_titles)
+
+        logger.info("收到文本章节闪卡生成请求，章节: %s, 文本长度: %s, 数量: %s, 语言: %s", section_title, len(text_content), card_number or '智能', lang)
 
         # 验证输入
         if not text_content:
             logger.warning("文本内容为空")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请提供学习材料文本内容'
             }, status=400)
 
         if not section_title:
             logger.warning("章节标题为空")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请提供章节标题'
             }, status=400)
 
-        # 调用业务层生成闪卡
-        biz = FlashcardBusiness()
-        result = biz.generate_flashcards_from_text_section(text_content, section_title, card_number, lang)
+        card_number, error = _parse_card_number(card_number)
+        if error:
+            return _json_response({
+                'success': False,
+                'error': error
+            }, status=400)
+
+        # 调用业务层生成闪卡；多个章节时各章节的AI调用并发执行
+        biz = _get_flashcard_business()
+        if section_titles:
+            result = biz.generate_flashcards_from_text_sections(text_content, section_titles, card_number, lang)
+        else:
+            result = biz.generate_flashcards_from_text_section(text_content, section_title, card_number, lang)
 
         # 返回结果
         if result['success']:
-            logger.info(f"成功生成 {len(result['cards'])} 张闪卡 - 章节: {section_title}")
-            return JsonResponse({
+            logger.info("成功生成 %s 张闪卡 - 章节: %s", len(result['cards']), section_title)
+            response_data = {
                 'success': True,
                 'cards': result['cards'],
                 'count': len(result['cards']),
-                'section_title': result.get('section_title')
-            })
+                'section_title': result.get('section_title', section_title)
+            }
+            if section_titles:
+                response_data['section_results'] = result['section_results']
+            return _json_response(response_data)
         else:
-            logger.error(f"闪卡生成失败: {result.get('error')}")
-            return JsonResponse({
+            logger.error("闪卡生成失败: %s", result.get('error'))
+            return _json_response({
                 'success': False,
                 'error': result.get('error', '生成闪卡失败')
             }, status=500)
 
     except json.JSONDecodeError as e:
-        logger.error(f"JSON解析错误: {str(e)}")
-        return JsonResponse({
+        logger.error("JSON解析错误: %s", e)
+        return _json_response({
             'success': False,
             'error': '请求数据格式错误'
         }, status=400)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
@@ -509,6 +788,7 @@ def generate_flashcards_from_text_section(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
 def generate_flashcards_from_file_section(request):
     """
     API接口：根据上传文件和指定章节ID列表生成闪卡
@@ -547,7 +827,7 @@ def generate_flashcards_from_file_section(request):
         task_id = request.POST.get('task_id', '').strip()
         if not task_id:
             logger.warning("task_id未提供")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': 'task_id为必填参数'
             }, status=400)
@@ -555,7 +835,7 @@ def generate_flashcards_from_file_section(request):
         # 2. 检查是否有文件上传
         if 'file' not in request.FILES:
             logger.warning("未找到上传的文件")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请上传文件'
             }, status=400)
@@ -573,21 +853,20 @@ def generate_flashcards_from_file_section(request):
 
         # 解析章节ID列表
         try:
-            chapter_ids = json.loads(chapter_ids)
+            chapter_ids = _json_loads(chapter_ids)
             if not isinstance(chapter_ids, list):
                 chapter_ids = []
         except json.JSONDecodeError:
             logger.warning("章节ID列表格式错误")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '章节ID列表格式错误'
             }, status=400)
 
-        logger.info(f"收到文件章节闪卡生成请求，task_id={task_id}, 文件名: {file_name}, 章节ID: {chapter_ids}, 大小: {uploaded_file.size} bytes, 数量: {card_number or '智能'}, 语言: {lang}")
+        logger.info("收到文件章节闪卡生成请求，task_id=%s, 文件名: %s, 章节ID: %s, 大小: %s bytes, 数量: %s, 语言: %s", task_id, file_name, chapter_ids, uploaded_file.size, card_number or '智能', lang)
 
         # 3. 验证任务是否存在且合法
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
+        task_mgr = _get_task_manager()
 
         validation = task_mgr.validate_task(
             task_id=task_id,
@@ -595,8 +874,8 @@ def generate_flashcards_from_file_section(request):
         )
 
         if not validation['valid']:
-            logger.warning(f"任务验证失败: {validation['error']}")
-            return JsonResponse({
+            logger.warning("任务验证失败: %s", validation['error'])
+            return _json_response({
                 'success': False,
                 'error': validation['error']
             }, status=400)
@@ -605,8 +884,8 @@ def generate_flashcards_from_file_section(request):
         task = validation['task']
         current_status = task.get('status')
         if current_status != 'catalog_ready':
-            logger.warning(f"任务状态不正确: 期望=catalog_ready, 实际={current_status}")
-            return JsonResponse({
+            logger.warning("任务状态不正确: 期望=catalog_ready, 实际=%s", current_status)
+            return _json_response({
                 'success': False,
                 'error': f'任务状态不正确，期望: catalog_ready, 实际: {current_status}'
             }, status=400)
@@ -617,9 +896,9 @@ def generate_flashcards_from_file_section(request):
         expected_file_name = file_info.get('name')
 
         if expected_file_name is not None and file_name != expected_file_name:
-            logger.warning(f"文件名不匹配: 期望={expected_file_name}, 实际={file_name}")
+            logger.warning("文件名不匹配: 期望=%s, 实际=%s", expected_file_name, file_name)
             task_mgr.update_status(task_id, 'failed')
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': f'文件名不匹配，期望: {expected_file_name}, 实际: {file_name}'
             }, status=400)
@@ -628,30 +907,29 @@ def generate_flashcards_from_file_section(request):
         if not chapter_ids:
             logger.warning("章节ID列表为空")
             task_mgr.update_status(task_id, 'failed')
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请提供章节ID列表'
             }, status=400)
 
         # 7. 更新大纲信息表中的选中章节ID列表 (在验证合法后立即更新)
         try:
-            from business.database.catalog_db import CatalogDB
-            catalog_db = CatalogDB()
+            catalog_db = _get_flashcard_business().catalog_db
             update_result = catalog_db.update_selected_sections(task_id, chapter_ids)
             
             if update_result.get('success'):
-                logger.info(f"成功更新选中章节ID到大纲表: task_id={task_id}, 选中ID数量: {len(chapter_ids)}")
+                logger.info("成功更新选中章节ID到大纲表: task_id=%s, 选中ID数量: %s", task_id, len(chapter_ids))
             else:
-                logger.warning(f"更新选中章节ID到大纲表失败: {update_result.get('error')}")
+                logger.warning("更新选中章节ID到大纲表失败: %s", update_result.get('error'))
         except Exception as update_error:
-            logger.error(f"更新选中章节ID到大纲表时发生异常: {str(update_error)}", exc_info=True)
+            logger.error("更新选中章节ID到大纲表时发生异常: %s", update_error, exc_info=True)
 
         # 8. 文件大小限制（10MB）
         max_size = 10 * 1024 * 1024
         if uploaded_file.size > max_size:
-            logger.warning(f"文件过大: {uploaded_file.size} bytes")
+            logger.warning("文件过大: %s bytes", uploaded_file.size)
             task_mgr.update_status(task_id, 'failed')
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': f'文件大小不能超过 {max_size // (1024*1024)}MB'
             }, status=400)
@@ -664,18 +942,18 @@ def generate_flashcards_from_file_section(request):
             for chunk in uploaded_file.chunks():
                 destination.write(chunk)
 
-        logger.info(f"文件已保存至临时路径: {temp_file_path}")
+        logger.info("文件已保存至临时路径: %s", temp_file_path)
 
         try:
             # 10. 调用业务层生成闪卡（会自动更新任务状态）
             # 需要更新业务层方法以支持章节ID
-            biz = FlashcardBusiness()
+            biz = _get_flashcard_business()
             result = biz.generate_flashcards_from_file_section_by_ids(temp_file_path, chapter_ids, card_number, lang, task_id)
 
             # 11. 返回结果
             if result['success']:
-                logger.info(f"成功生成 {len(result['cards'])} 张闪卡 - 文件: {file_name}, 章节ID数量: {len(chapter_ids)}")
-                return JsonResponse({
+                logger.info("成功生成 %s 张闪卡 - 文件: %s, 章节ID数量: %s", len(result['cards']), file_name, len(chapter_ids))
+                return _json_response({
                     'success': True,
                     'cards': result['cards'],
                     'count': len(result['cards']),
@@ -683,8 +961,8 @@ def generate_flashcards_from_file_section(request):
                     'file_name': result.get('file_name', file_name)
                 })
             else:
-                logger.error(f"闪卡生成失败: {result.get('error')}")
-                return JsonResponse({
+                logger.error("闪卡生成失败: %s", result.get('error'))
+                return _json_response({
                     'success': False,
                     'error': result.get('error', '生成闪卡失败')
                 }, status=500)
@@ -693,11 +971,11 @@ def generate_flashcards_from_file_section(request):
             # 12. 清理临时文件
             if os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
-                logger.debug(f"已删除临时文件: {temp_file_path}")
+                logger.debug("已删除临时文件: %s", temp_file_path)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
@@ -707,6 +985,8 @@ def generate_flashcards_from_file_section(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
+@_limit_json_body
 def analyze_catalog_from_topic(request):
     """
     API接口：基于话题生成知识大纲
@@ -740,41 +1020,41 @@ def analyze_catalog_from_topic(request):
     """
     try:
         # 解析请求数据
-        data = json.loads(request.body)
-        topic = data.get('topic', '').strip()
+        data = _load_json_body(request)
+        topic = _get_str(data, 'topic')
         lang = data.get('lang', 'zh')
 
-        logger.info(f"收到话题大纲生成请求，话题: {topic}, 语言: {lang}")
+        logger.info("收到话题大纲生成请求，话题: %s, 语言: %s", topic, lang)
 
         # 验证输入
         if not topic:
             logger.warning("话题为空")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请提供学习主题'
             }, status=400)
 
         # 调用业务层生成大纲
-        catalog_service = CatalogService()
+        catalog_service = _get_catalog_service()
         catalog = catalog_service.analyze_catalog_from_topic(topic, lang)
 
         # 返回结果
-        logger.info(f"成功生成大纲 - 话题: {topic}")
-        return JsonResponse({
+        logger.info("成功生成大纲 - 话题: %s", topic)
+        return _json_response({
             'success': True,
             'catalog': catalog
         })
 
     except json.JSONDecodeError as e:
-        logger.error(f"JSON解析错误: {str(e)}")
-        return JsonResponse({
+        logger.error("JSON解析错误: %s", e)
+        return _json_response({
             'success': False,
             'error': '请求数据格式错误'
         }, status=400)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
@@ -782,6 +1062,8 @@ def analyze_catalog_from_topic(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
+@_limit_json_body
 def analyze_catalog_from_text(request):
     """
     API接口：基于文本内容生成知识大纲
@@ -807,41 +1089,41 @@ def analyze_catalog_from_text(request):
     """
     try:
         # 解析请求数据
-        data = json.loads(request.body)
-        text_content = data.get('text', '').strip()
+        data = _load_json_body(request)
+        text_content = _get_str(data, 'text')
         lang = data.get('lang', 'zh')
 
-        logger.info(f"收到文本大纲生成请求，文本长度: {len(text_content)}, 语言: {lang}")
+        logger.info("收到文本大纲生成请求，文本长度: %s, 语言: %s", len(text_content), lang)
 
         # 验证输入
         if not text_content:
             logger.warning("文本内容为空")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请提供文本内容'
             }, status=400)
 
         # 调用业务层生成大纲
-        catalog_service = CatalogService()
+        catalog_service = _get_catalog_service()
         catalog = catalog_service.analyze_catalog_from_text(text_content, lang)
 
         # 返回结果
-        logger.info(f"成功生成大纲 - 文本长度: {len(text_content)}")
-        return JsonResponse({
+        logger.info("成功生成大纲 - 文本长度: %s", len(text_content))
+        return _json_response({
             'success': True,
             'catalog': catalog
         })
 
     except json.JSONDecodeError as e:
-        logger.error(f"JSON解析错误: {str(e)}")
-        return JsonResponse({
+        logger.error("JSON解析错误: %s", e)
+        return _json_response({
             'success': False,
             'error': '请求数据格式错误'
         }, status=400)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
@@ -849,6 +1131,7 @@ def analyze_catalog_from_text(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_rate_limit
 def analyze_catalog_from_file(request):
     """
     API接口：基于上传文件生成知识大纲
@@ -895,7 +1178,7 @@ def analyze_catalog_from_file(request):
         task_id = request.POST.get('task_id', '').strip()
         if not task_id:
             logger.warning("task_id未提供")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': 'task_id为必填参数'
             }, status=400)
@@ -903,7 +1186,7 @@ def analyze_catalog_from_file(request):
         # 2. 检查是否有文件上传
         if 'file' not in request.FILES:
             logger.warning("未找到上传的文件")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': '请上传文件'
             }, status=400)
@@ -912,11 +1195,10 @@ def analyze_catalog_from_file(request):
         file_name = uploaded_file.name
         lang = request.POST.get('lang', 'zh')
 
-        logger.info(f"收到文件大纲生成请求，task_id={task_id}, 文件名: {file_name}, 大小: {uploaded_file.size} bytes, 语言: {lang}")
+        logger.info("收到文件大纲生成请求，task_id=%s, 文件名: %s, 大小: %s bytes, 语言: %s", task_id, file_name, uploaded_file.size, lang)
 
         # 3. 验证任务是否存在且合法
-        from business.task_manager import TaskManager
-        task_mgr = TaskManager()
+        task_mgr = _get_task_manager()
 
         validation = task_mgr.validate_task(
             task_id=task_id,
@@ -925,8 +1207,8 @@ def analyze_catalog_from_file(request):
         )
 
         if not validation['valid']:
-            logger.warning(f"任务验证失败: {validation['error']}")
-            return JsonResponse({
+            logger.warning("任务验证失败: %s", validation['error'])
+            return _json_response({
                 'success': False,
                 'error': validation['error']
             }, status=400)
@@ -938,9 +1220,9 @@ def analyze_catalog_from_file(request):
         expected_file_name = file_info.get('name')
 
         if expected_file_name is not None and file_name != expected_file_name:
-            logger.warning(f"文件名不匹配: 期望={expected_file_name}, 实际={file_name}")
+            logger.warning("文件名不匹配: 期望=%s, 实际=%s", expected_file_name, file_name)
             task_mgr.update_status(task_id, 'failed')
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': f'文件名不匹配，期望: {expected_file_name}, 实际: {file_name}'
             }, status=400)
@@ -948,9 +1230,9 @@ def analyze_catalog_from_file(request):
         # 5. 文件大小限制（10MB）
         max_size = 10 * 1024 * 1024
         if uploaded_file.size > max_size:
-            logger.warning(f"文件过大: {uploaded_file.size} bytes")
+            logger.warning("文件过大: %s bytes", uploaded_file.size)
             task_mgr.update_status(task_id, 'failed')
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': f'文件大小不能超过 {max_size // (1024*1024)}MB'
             }, status=400)
@@ -963,16 +1245,16 @@ def analyze_catalog_from_file(request):
             for chunk in uploaded_file.chunks():
                 destination.write(chunk)
 
-        logger.info(f"文件已保存至临时路径: {temp_file_path}")
+        logger.info("文件已保存至临时路径: %s", temp_file_path)
 
         try:
             # 7. 调用业务层生成大纲（会自动更新任务状态）
-            catalog_service = CatalogService()
+            catalog_service = _get_catalog_service()
             catalog = catalog_service.analyze_catalog_from_file(temp_file_path, lang, task_id)
 
             # 8. 返回结果
-            logger.info(f"成功生成大纲 - 文件: {file_name}")
-            return JsonResponse({
+            logger.info("成功生成大纲 - 文件: %s", file_name)
+            return _json_response({
                 'success': True,
                 'catalog': catalog,
                 'file_name': file_name
@@ -982,11 +1264,11 @@ def analyze_catalog_from_file(request):
             # 9. 清理临时文件
             if os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
-                logger.debug(f"已删除临时文件: {temp_file_path}")
+                logger.debug("已删除临时文件: %s", temp_file_path)
 
     except Exception as e:
-        logger.error(f"API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
@@ -994,6 +1276,19 @@ def analyze_catalog_from_file(request):
 
 # ============ 导出接口 ============
 
+def _if_none_match_etags(request):
+    """
+    解析 If-None-Match 请求头，返回客户端已缓存版本的 ETag 集合
+
+    按弱比较处理（与 ConditionalGetMiddleware 一致）：GZipMiddleware 会把压缩响应的 ETag 改为 W/ 形式，
+    客户端回传时去掉 W/ 前缀再比较
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return frozenset()
+    return frozenset(etag[2:] if etag.startswith('W/') else etag for etag in parse_etags(header))
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def export_flashcards(request):
@@ -1016,12 +1311,12 @@ def export_flashcards(request):
         export_format = request.GET.get('format', 'apkg').strip().lower()
         deck_name = request.GET.get('deck_name', '').strip()
 
-        logger.info(f"收到导出请求: task_id={task_id}, format={export_format}, deck_name={deck_name or '默认'}")
+        logger.info("收到导出请求: task_id=%s, format=%s, deck_name=%s", task_id, export_format, deck_name or '默认')
 
         # 验证 task_id
         if not task_id:
             logger.warning("task_id未提供")
-            return JsonResponse({
+            return _json_response({
                 'success': False,
                 'error': 'task_id为必填参数'
             }, status=400)
@@ -1032,16 +1327,24 @@ def export_flashcards(request):
         result = export_biz.export_task_flashcards(
             task_id=task_id,
             export_format=export_format,
-            deck_name=deck_name if deck_name else None
+            deck_name=deck_name if deck_name else None,
+            known_etags=_if_none_match_etags(request)
         )
 
         if not result['success']:
-            logger.error(f"导出失败: {result.get('error')}")
-            return JsonResponse({
+            logger.error("导出失败: %s", result.get('error'))
+            return _json_response({
                 'success': False,
                 'error': result.get('error', '导出失败')
             }, status=500)
 
+        # 客户端缓存的版本仍是最新的，返回 304
+        if result['not_modified']:
+            response = HttpResponseNotModified()
+            response['ETag'] = result['etag']
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
         # 读取文件并返回
         file_path = result['file_path']
         file_name = result['file_name']
@@ -1060,20 +1363,22 @@ def export_flashcards(request):
         # 删除临时文件
         if os.path.exists(file_path):
             os.remove(file_path)
-            logger.debug(f"已删除临时导出文件: {file_path}")
+            logger.debug("已删除临时导出文件: %s", file_path)
 
         # 返回文件响应
-        from django.http import HttpResponse
         response = HttpResponse(file_content, content_type=content_type)
         response['Content-Disposition'] = f'attachment; filename="{file_name}"'
         response['Content-Length'] = len(file_content)
+        # 导出内容随任务的闪卡变化：浏览器可缓存文件，但每次使用前须用 ETag 向服务端确认
+        response['ETag'] = result['etag']
+        response['Cache-Control'] = 'private, no-cache'
 
-        logger.info(f"成功导出闪卡: task_id={task_id}, format={export_format}, size={len(file_content)} bytes")
+        logger.info("成功导出闪卡: task_id=%s, format=%s, size=%s bytes", task_id, export_format, len(file_content))
         return response
 
     except Exception as e:
-        logger.error(f"导出API处理异常: {str(e)}", exc_info=True)
-        return JsonResponse({
+        logger.error("导出API处理异常: %s", e, exc_info=True)
+        return _json_response({
             'success': False,
             'error': '服务器内部错误'
         }, status=500)
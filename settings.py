@@ -7,7 +7,6 @@ DEBUG = True
 ALLOWED_HOSTS = ['*']
 
 INSTALLED_APPS = [
-    'rest_framework',
     'corsheaders',
     'business',
     'django.contrib.contenttypes',
@@ -17,7 +16,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # 闪卡列表等 JSON 响应重复键多、压缩率高，客户端支持时 gzip 压缩响应体（流式响应按片段压缩并立即发送）
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # GET 响应（导出文件等）自动附带 ETag，客户端带 If-None-Match 重复请求未变化的内容时返回 304
+    'django.middleware.http.ConditionalGetMiddleware',
 ]
 
 ROOT_URLCONF = 'urls'
@@ -115,7 +115,11 @@ class DatabaseService:
             }
 
         try:
-            self.logger.info(f"插入数据: table={table}, data={data}")
+            # 批量插入（如闪卡列表）时只记录条数，避免把整批卡片内容格式化进日志
+            if isinstance(data, list):
+                self.logger.info(f"插入数据: table={table}, count={len(data)}")
+            else:
+                self.logger.info(f"插入数据: table={table}, data={data}")
 
             # 执行插入
             response = self.client.table(table).insert(data).execute()
@@ -133,18 +137,25 @@ class DatabaseService:
                 "error": str(e)
             }
 
-    def insert_many(self, table: str, data_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def insert_many(
+        self,
+        table: str,
+        data_list: List[Dict[str, Any]],
+        returning: str = "representation"
+    ) -> Dict[str, Any]:
         """
         批量插入数据
 
         Args:
             table: 表名
             data_list: 要插入的数据列表
+            returning: 返回方式，"representation" 返回插入后的记录，
+                "minimal" 不返回记录（响应体为空，适合调用方不需要插入结果的大批量写入）
 
         Returns:
             dict: 插入结果
                 - success: 是否成功
-                - data: 插入的数据列表（成功时）
+                - data: 插入的数据列表（成功时，returning="minimal" 时为空列表）
                 - count: 插入数量（成功时）
                 - error: 错误信息（失败时）
         """
@@ -158,13 +169,17 @@ class DatabaseService:
             self.logger.info(f"批量插入数据: table={table}, count={len(data_list)}")
 
             # 执行批量插入
-            response = self.client.table(table).insert(data_list).execute()
+            response = self.client.table(table).insert(data_list, returning=returning).execute()
 
-            self.logger.info(f"批量插入成功: table={table}, count={len(response.data)}")
+            # minimal 模式下服务端不返回记录，插入数量以提交的行数为准
+            data = response.data or []
+            count = len(data) if returning != "minimal" else len(data_list)
+
+            self.logger.info(f"批量插入成功: table={table}, count={count}")
             return {
                 "success": True,
-                "data": response.data,
-                "count": len(response.data)
+                "data": data,
+                "count": count
             }
 
         except Exception as e:
@@ -323,6 +338,44 @@ class DatabaseService:
                 "error": str(e)
             }
 
+    def rpc(self, function_name: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        调用数据库函数（Postgres function）
+
+        Args:
+            function_name: 函数名
+            params: 函数参数字典
+
+        Returns:
+            dict: 调用结果
+                - success: 是否成功
+                - data: 函数返回值（成功时）
+                - error: 错误信息（失败时）
+        """
+        if not self.client:
+            return {
+                "success": False,
+                "error": "Supabase 客户端未初始化"
+            }
+
+        try:
+            self.logger.info(f"调用数据库函数: function={function_name}")
+
+            response = self.client.rpc(function_name, params or {}).execute()
+
+            self.logger.info(f"数据库函数调用成功: function={function_name}")
+            return {
+                "success": True,
+                "data": response.data
+            }
+
+        except Exception as e:
+            self.logger.error(f"数据库函数调用失败: function={function_name}, 错误: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
     def count(self, table: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         统计数据数量
@@ -0,0 +1,16 @@
+"""
+测试公共配置
+
+在导入业务模块之前配置 Django，并关闭 AI 响应和网页内容磁盘缓存，测试不访问外部服务、不写入 data 目录
+"""
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+os.environ["AI_RESULT_CACHE_DB"] = ""
+os.environ["CRAWL_CACHE_DB"] = ""
+
+import django
+
+django.setup()
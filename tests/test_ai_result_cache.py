@@ -0,0 +1,134 @@
+"""AI响应缓存测试：进程内 LRU/TTL、SQLite 磁盘缓存、相同请求只调用一次AI"""
+
+import threading
+
+import pytest
+
+from ai_services.workflows import base_workflow
+from ai_services.workflows.base_workflow import AIWorkflow
+
+
+class FakeAIService:
+    def __init__(self, reply='[{"q": 1}]'):
+        self.reply = reply
+        self.calls = 0
+
+    def chat(self, prompt):
+        self.calls += 1
+        return self.reply
+
+
+class EchoWorkflow(AIWorkflow):
+    """直接以参数作为提示词，不加载提示词模板"""
+
+    def build_prompt(self, params):
+        return params["TEXT"]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(monkeypatch):
+    monkeypatch.setattr(base_workflow, "_ai_result_cache", base_workflow.OrderedDict())
+    monkeypatch.setattr(base_workflow, "_inflight_ai_calls", {})
+
+
+@pytest.fixture
+def disk_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(base_workflow, "_AI_RESULT_DISK_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(base_workflow, "_ai_result_db", None)
+    yield
+    if base_workflow._ai_result_db is not None:
+        base_workflow._ai_result_db.close()
+
+
+def test_memory_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(base_workflow, "_AI_RESULT_CACHE_MAXSIZE", 2)
+    base_workflow._set_memory_cached_ai_result("a", "A")
+    base_workflow._set_memory_cached_ai_result("b", "B")
+    assert base_workflow._get_cached_ai_result("a") == "A"
+    base_workflow._set_memory_cached_ai_result("c", "C")
+    assert base_workflow._get_cached_ai_result("b") is None
+    assert base_workflow._get_cached_ai_result("a") == "A"
+
+
+def test_memory_cache_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(base_workflow.time, "monotonic", lambda: now[0])
+    base_workflow._set_memory_cached_ai_result("a", "A")
+    now[0] += base_workflow._AI_RESULT_CACHE_TTL + 1
+    assert base_workflow._get_cached_ai_result("a") is None
+    assert "a" not in base_workflow._ai_result_cache
+
+
+def test_disk_cache_backfills_memory(disk_cache):
+    key = ("FakeAIService", "digest")
+    base_workflow._set_cached_ai_result(key, "[]")
+    base_workflow._ai_result_cache.clear()
+
+    assert base_workflow._get_memory_cached_ai_result(key) is None
+    assert base_workflow._get_cached_ai_result(key) == "[]"
+    assert base_workflow._get_memory_cached_ai_result(key) == "[]"
+
+
+def test_run_uses_cache_for_whitespace_variants():
+    service = FakeAIService()
+    workflow = EchoWorkflow(ai_service=service)
+    assert workflow.run({"TEXT": "some  text\n"}) == [{"q": 1}]
+    assert workflow.run({"TEXT": "some text"}) == [{"q": 1}]
+    assert service.calls == 1
+
+
+@pytest.mark.parametrize("reply", ['not json', '{"q": 1}'])
+def test_run_caches_only_arrays(reply):
+    service = FakeAIService(reply)
+    workflow = EchoWorkflow(ai_service=service)
+    workflow.run({"TEXT": "text"})
+    workflow.run({"TEXT": "text"})
+    assert service.calls == 2
+
+
+def test_run_singleflight():
+    release = threading.Event()
+    started = threading.Event()
+
+    class SlowAIService(FakeAIService):
+        def chat(self, prompt):
+            started.set()
+            release.wait(5)
+            return super().chat(prompt)
+
+    service = SlowAIService()
+    workflow = EchoWorkflow(ai_service=service)
+    results = []
+
+    def call():
+        results.append(workflow.run({"TEXT": "same"}))
+
+    owner = threading.Thread(target=call)
+    owner.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=call) for _ in range(3)]
+    for t in waiters:
+        t.start()
+    release.set()
+    for t in [owner, *waiters]:
+        t.join(5)
+
+    assert service.calls == 1
+    assert results == [[{"q": 1}]] * 4
+    assert base_workflow._inflight_ai_calls == {}
+
+
+def test_run_failure_is_shared_and_not_cached():
+    class FailingAIService(FakeAIService):
+        def chat(self, prompt):
+            self.calls += 1
+            raise RuntimeError("boom")
+
+    service = FailingAIService()
+    workflow = EchoWorkflow(ai_service=service)
+    with pytest.raises(RuntimeError):
+        workflow.run({"TEXT": "text"})
+    with pytest.raises(RuntimeError):
+        workflow.run({"TEXT": "text"})
+    assert service.calls == 2
+    assert base_workflow._inflight_ai_calls == {}
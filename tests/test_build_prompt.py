@@ -0,0 +1,44 @@
+"""提示词构建测试：占位符一次性替换，参数内容不会被再次替换"""
+
+from ai_services.workflows.base_workflow import AIWorkflow
+from ai_services.workflows.flashcard_generate import FlashcardGenerateWorkflow
+
+
+def make_workflow(template, monkeypatch, prompt_key="basic_card"):
+    monkeypatch.setattr("ai_services.workflows.base_workflow.load_prompt", lambda *args: {"prompt": template})
+    workflow = AIWorkflow(ai_service=object())
+    workflow.prompt_key = prompt_key
+    return workflow
+
+
+def test_placeholders_and_lang_are_replaced(monkeypatch):
+    workflow = make_workflow("[TOPIC] in {lang}, [TOPIC] again", monkeypatch)
+    assert workflow.build_prompt({"TOPIC": "Python", "lang": "en"}) == "Python in en, Python again"
+
+
+def test_parameter_values_are_not_rescanned(monkeypatch):
+    workflow = make_workflow("text: [TEXT_CONTENT] / [TOPIC]", monkeypatch)
+    prompt = workflow.build_prompt({"TEXT_CONTENT": "see [TOPIC] and {lang}", "TOPIC": "T", "lang": "zh"})
+    assert prompt == "text: see [TOPIC] and {lang} / T"
+
+
+def test_unknown_placeholders_and_meta_params_are_kept(monkeypatch):
+    workflow = make_workflow("[UNKNOWN] [form] [NUMBER]", monkeypatch)
+    assert workflow.build_prompt({"form": "text", "NUMBER": 5}) == "[UNKNOWN] [form] [NUMBER]"
+
+
+def test_number_instruction(monkeypatch):
+    workflow = make_workflow("[NUMBER_INSTRUCTION]", monkeypatch)
+    assert workflow.build_prompt({"NUMBER": 5, "lang": "zh"}) == "生成5组"
+    assert workflow.build_prompt({"NUMBER": 5, "lang": "en"}) == "Generate 5"
+    assert workflow.build_prompt({"lang": "zh"}).startswith("分析内容")
+
+
+def test_real_template_has_no_placeholders_left():
+    workflow = FlashcardGenerateWorkflow(card_type="basic_card", form="text", mode="full", ai_service=object())
+    prompt = workflow.build_prompt({"TEXT_CONTENT": "光合作用", "NUMBER": 3, "lang": "zh"})
+    assert "光合作用" in prompt
+    assert "生成3组" in prompt
+    assert "[TEXT_CONTENT]" not in prompt
+    assert "[NUMBER_INSTRUCTION]" not in prompt
+    assert "{lang}" not in prompt
@@ -0,0 +1,55 @@
+"""大纲缓存测试：按 task_id 缓存的大纲有有效期，其他 worker 更新大纲后最多延迟一个有效期可见"""
+
+import pytest
+
+from business import catalog
+from business.catalog import CatalogService
+
+
+class FakeCatalogDB:
+    def __init__(self):
+        self.catalog_data = [{"id": "1", "chapter": "第一章"}]
+        self.calls = 0
+
+    def get_catalog_by_task_id(self, task_id):
+        self.calls += 1
+        return {"success": True, "data": {"catalog_data": self.catalog_data}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(catalog.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(catalog, "_catalog_cache", catalog.OrderedDict())
+    svc = CatalogService(ai_service=object())
+    svc.catalog_db = FakeCatalogDB()
+    return svc
+
+
+def test_cached_catalog_is_reused_within_ttl(service, clock):
+    first = service.get_catalog_from_file("a.pdf", task_id="t1")
+    clock[0] += catalog._CATALOG_CACHE_TTL - 1
+    assert service.get_catalog_from_file("a.pdf", task_id="t1") is first
+    assert service.catalog_db.calls == 1
+
+
+def test_catalog_updated_elsewhere_is_seen_after_ttl(service, clock):
+    service.get_catalog_from_file("a.pdf", task_id="t1")
+    # 另一个 worker 重新生成了大纲，本进程的缓存没有被失效
+    service.catalog_db.catalog_data = [{"id": "1", "chapter": "新的第一章"}]
+    clock[0] += catalog._CATALOG_CACHE_TTL + 1
+
+    assert service.get_catalog_from_file("a.pdf", task_id="t1") == [{"id": "1", "chapter": "新的第一章"}]
+    assert service.catalog_db.calls == 2
+
+
+def test_invalidate_drops_entry(service, clock):
+    service.get_catalog_from_file("a.pdf", task_id="t1")
+    catalog.invalidate_cached_catalog("t1")
+    service.get_catalog_from_file("a.pdf", task_id="t1")
+    assert service.catalog_db.calls == 2
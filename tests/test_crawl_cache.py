@@ -0,0 +1,57 @@
+"""网页内容缓存测试：进程内缓存与 SQLite 磁盘缓存（各 worker 共享，重启后仍可命中）"""
+
+import pytest
+
+from business import flashcard
+
+
+@pytest.fixture(autouse=True)
+def crawl_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(flashcard, "_crawl_cache", flashcard.OrderedDict())
+    monkeypatch.setattr(flashcard, "_CRAWL_DISK_CACHE_PATH", str(tmp_path / "crawl_cache.db"))
+    monkeypatch.setattr(flashcard, "_crawl_db", None)
+    yield
+    if flashcard._crawl_db is not None:
+        flashcard._crawl_db.close()
+
+
+def test_round_trip():
+    flashcard._set_cached_crawl("https://example.com/", "# 标题\n正文")
+    assert flashcard._get_cached_crawl("https://example.com/") == "# 标题\n正文"
+    assert flashcard._get_cached_crawl("https://example.com/other") is None
+
+
+def test_disk_cache_survives_memory_loss():
+    flashcard._set_cached_crawl("https://example.com/", "content")
+    # 模拟另一个 worker 或重启后的进程：进程内缓存为空
+    flashcard._crawl_cache.clear()
+    assert flashcard._get_cached_crawl("https://example.com/") == "content"
+    assert "https://example.com/" in flashcard._crawl_cache
+
+
+def test_expired_disk_entry_is_ignored(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(flashcard.time, "time", lambda: now[0])
+    flashcard._set_cached_crawl("https://example.com/", "content")
+    flashcard._crawl_cache.clear()
+    now[0] += flashcard._CRAWL_CACHE_TTL + 1
+    assert flashcard._get_cached_crawl("https://example.com/") is None
+
+
+def test_backfill_keeps_original_crawl_time(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(flashcard.time, "time", lambda: now[0])
+    flashcard._set_cached_crawl("https://example.com/", "content")
+    flashcard._crawl_cache.clear()
+    now[0] += flashcard._CRAWL_CACHE_TTL - 10
+    assert flashcard._get_cached_crawl("https://example.com/") == "content"
+
+    crawled_at, _ = flashcard._crawl_cache["https://example.com/"]
+    assert flashcard.time.monotonic() - crawled_at >= flashcard._CRAWL_CACHE_TTL - 10
+
+
+def test_disabled_disk_cache_uses_memory_only(monkeypatch):
+    monkeypatch.setattr(flashcard, "_CRAWL_DISK_CACHE_PATH", "")
+    flashcard._set_cached_crawl("https://example.com/", "content")
+    assert flashcard._get_crawl_db() is None
+    assert flashcard._get_cached_crawl("https://example.com/") == "content"
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import pytest
+
+from ai_services import ai_deepseek
+from utils.logger import get_logger
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """按顺序返回预设状态码，并记录每次请求的请求头和请求体"""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = []
+
+    def post(self, url, data=None, headers=None):
+        self.calls.append((data, headers))
+        return FakeResponse(self.statuses.pop(0))
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(ai_deepseek, "_UPLOAD_GZIP_MIN_SIZE", 16)
+    monkeypatch.setattr(ai_deepseek, "_upload_gzip_enabled", True)
+    monkeypatch.setattr(ai_deepseek, "_upload_gzip_rejections", 0)
+    svc = ai_deepseek.DeepseekAIService.__new__(ai_deepseek.DeepseekAIService)
+    svc.logger = get_logger("test")
+    return svc
+
+
+def _upload(service, monkeypatch, *statuses):
+    session = FakeSession(*statuses)
+    monkeypatch.setattr(ai_deepseek, "_upload_session", session)
+    resp = service._post_upload("http://upload", {"content": "x" * 64}, {}, "a.pdf")
+    return resp, session.calls
+
+
+def test_large_body_is_gzipped(service, monkeypatch):
+    resp, calls = _upload(service, monkeypatch, 200)
+    assert resp.status_code == 200
+    assert len(calls) == 1
+    data, headers = calls[0]
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(data)) == {"content": "x" * 64}
+
+
+@pytest.mark.parametrize("status", [429, 500, 401])
+def test_unrelated_errors_are_not_retried(service, monkeypatch, status):
+    resp, calls = _upload(service, monkeypatch, status)
+    assert resp.status_code == status
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("status", [400, 415])
+def test_rejected_encoding_retries_uncompressed(service, monkeypatch, status):
+    resp, calls = _upload(service, monkeypatch, status, 200)
+    assert resp.status_code == 200
+    assert len(calls) == 2
+    assert "Content-Encoding" not in calls[1][1]
+    # 单次回退成功不会关闭压缩
+    assert ai_deepseek._upload_gzip_enabled
+
+
+def test_gzip_disabled_after_repeated_rejections(service, monkeypatch):
+    for _ in range(ai_deepseek._UPLOAD_GZIP_MAX_REJECTIONS):
+        _upload(service, monkeypatch, 415, 200)
+    assert not ai_deepseek._upload_gzip_enabled
+
+    _, calls = _upload(service, monkeypatch, 200)
+    assert "Content-Encoding" not in calls[0][1]
+
+
+def test_gzip_success_resets_rejections(service, monkeypatch):
+    for _ in range(ai_deepseek._UPLOAD_GZIP_MAX_REJECTIONS - 1):
+        _upload(service, monkeypatch, 415, 200)
+    _upload(service, monkeypatch, 200)
+    _upload(service, monkeypatch, 415, 200)
+    assert ai_deepseek._upload_gzip_enabled
@@ -0,0 +1,68 @@
+"""导出接口测试：ETag 由导出内容计算，客户端版本未变化时返回 304 且不生成文件"""
+
+import pytest
+from django.test import RequestFactory
+
+from business import export, views
+
+CARDS = [
+    {"id": "c1", "card_type": "basic", "card_data": {"question": "Q1", "answer": "A1"}, "order_index": 0},
+    {"id": "c2", "card_type": "basic", "card_data": {"question": "Q2", "answer": "A2"}, "order_index": 1},
+]
+
+
+class FakeFlashcardDB:
+    cards = CARDS
+
+    def get_flashcards_by_task_id(self, task_id):
+        return {"success": True, "data": self.cards, "count": len(self.cards)}
+
+
+@pytest.fixture
+def export_biz(monkeypatch, tmp_path):
+    monkeypatch.setattr(export, "FlashcardDB", FakeFlashcardDB)
+    built = []
+
+    class RecordingExportBusiness(export.ExportBusiness):
+        def __init__(self):
+            super().__init__(output_dir=str(tmp_path))
+            original = self.anki_exporter.json_to_csv
+
+            def json_to_csv(cards):
+                built.append(cards)
+                return original(cards)
+
+            self.anki_exporter.json_to_csv = json_to_csv
+
+    monkeypatch.setattr(export, "ExportBusiness", RecordingExportBusiness)
+    return built
+
+
+def _get(**headers):
+    request = RequestFactory().get("/api/flashcards/export/", {"task_id": "task-1", "format": "csv"}, **headers)
+    return views.export_flashcards(request)
+
+
+def test_export_sets_etag(export_biz):
+    response = _get()
+    assert response.status_code == 200
+    assert response["ETag"].startswith('"')
+    assert response["Cache-Control"] == "private, no-cache"
+    assert len(export_biz) == 1
+
+
+@pytest.mark.parametrize("prefix", ["", "W/"])
+def test_matching_if_none_match_skips_export(export_biz, prefix):
+    etag = _get()["ETag"]
+    response = _get(HTTP_IF_NONE_MATCH=prefix + etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert len(export_biz) == 1
+
+
+def test_changed_cards_change_etag(export_biz, monkeypatch):
+    etag = _get()["ETag"]
+    monkeypatch.setattr(FakeFlashcardDB, "cards", CARDS[:1])
+    response = _get(HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
@@ -0,0 +1,55 @@
+"""章节标题测试：按章节ID生成时请求的标题必须能在保存闪卡时匹配到 section_id"""
+
+import pytest
+
+from business.flashcard import FlashcardBusiness
+
+
+@pytest.fixture
+def biz():
+    return FlashcardBusiness(ai_service=object())
+
+
+CHAPTER_SUBSECTION_CATALOG = [
+    {"id": "1", "chapter": "第一章", "subsections": [
+        {"id": "1.1", "subsection": "子小节A"},
+        {"id": "1.2", "subsection": "子小节B"},
+    ]},
+    {"id": "2", "chapter": "第二章", "sections": [
+        {"id": "2.1", "section": "小节", "sections": [
+            {"id": "2.1.1", "section": "嵌套小节", "subsections": [
+                {"id": "2.1.1.1", "subsection": "深层子小节"},
+            ]},
+        ]},
+    ]},
+]
+
+
+def test_chapter_subsection_titles(biz):
+    titles = biz._get_section_titles_by_ids(CHAPTER_SUBSECTION_CATALOG, ["1.1", "1.2"])
+    # 没有小节时子小节只使用自身标题
+    assert titles == ["子小节A", "子小节B"]
+
+
+def test_nested_sections_use_outermost_ancestors(biz):
+    titles = biz._get_section_titles_by_ids(CHAPTER_SUBSECTION_CATALOG, ["2.1.1", "2.1.1.1"])
+    assert titles == ["第二章 - 嵌套小节", "第二章 - 小节 - 深层子小节"]
+
+
+@pytest.mark.parametrize("chapter_ids", [
+    ["1", "1.1", "1.2"],
+    ["2", "2.1", "2.1.1", "2.1.1.1"],
+    ["1.2", "2.1.1"],
+])
+def test_leaf_titles_match_section_id_map(biz, chapter_ids):
+    section_id_map = biz._build_section_id_map(CHAPTER_SUBSECTION_CATALOG)
+    titles = biz._filter_leaf_sections(chapter_ids, CHAPTER_SUBSECTION_CATALOG)
+
+    assert titles
+    for title in titles:
+        assert section_id_map.get(title) is not None, title
+
+
+def test_filter_leaf_sections_drops_selected_parents(biz):
+    titles = biz._filter_leaf_sections(["1", "1.1", "2.1", "2.1.1"], CHAPTER_SUBSECTION_CATALOG)
+    assert titles == ["子小节A", "第二章 - 嵌套小节"]
@@ -0,0 +1,72 @@
+"""AI输出增量解析测试：_JsonArrayScanner 与 parse_result_stream"""
+
+import pytest
+
+from ai_services.workflows.base_workflow import AIWorkflow, _JsonArrayScanner
+
+
+def scan(chunks):
+    scanner = _JsonArrayScanner()
+    items = []
+    for chunk in chunks:
+        items.extend(scanner.feed(chunk))
+    return scanner, items
+
+
+def split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+CARDS_TEXT = '[{"q": "a[1]", "a": "x\\"}"}, {"q": "b", "tags": [1, {"n": 2}]}]'
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(CARDS_TEXT)])
+def test_items_complete_across_chunk_boundaries(size):
+    scanner, items = scan(split_every(CARDS_TEXT, size))
+    assert items == ['{"q": "a[1]", "a": "x\\"}"}', '{"q": "b", "tags": [1, {"n": 2}]}']
+    assert scanner.finish()
+
+
+def test_item_is_emitted_as_soon_as_it_closes():
+    scanner = _JsonArrayScanner()
+    assert scanner.feed('[{"q": 1}, {"q"') == ['{"q": 1}']
+    assert scanner.feed(': 2}]') == ['{"q": 2}']
+
+
+def test_leading_code_fence_is_accepted():
+    scanner, items = scan(["```json\n[", '{"q": 1}', "]\n```"])
+    assert items == ['{"q": 1}']
+    assert scanner.finish()
+
+
+def test_object_wrapped_array_falls_back():
+    scanner, items = scan(['{"cards": [{"q": 1}]}'])
+    assert items == []
+    assert not scanner.finish()
+
+
+@pytest.mark.parametrize("text", ['[{"q": 1},]', '[{"q": 1} {"q": 2}]', '[1, 2]', '[{"q": 1}'])
+def test_invalid_or_incomplete_arrays_do_not_finish(text):
+    scanner, _ = scan([text])
+    assert not scanner.finish()
+
+
+def test_trailing_text_after_array_does_not_finish():
+    scanner, items = scan(['[{"q": 1}] 以上是生成的闪卡'])
+    assert items == ['{"q": 1}']
+    assert not scanner.finish()
+
+
+@pytest.fixture
+def workflow():
+    return AIWorkflow(ai_service=object())
+
+
+def test_parse_result_stream_matches_parse_result(workflow):
+    text = "```json\n" + CARDS_TEXT + "\n```"
+    assert workflow.parse_result_stream(split_every(text, 5)) == workflow.parse_result(text)
+
+
+def test_parse_result_stream_falls_back_for_objects(workflow):
+    text = '{"cards": [{"q": 1}]}'
+    assert workflow.parse_result_stream(split_every(text, 4)) == {"cards": [{"q": 1}]}
@@ -0,0 +1,68 @@
+"""流式工作流测试：run_stream 边接收边产出，异常输出回退整体解析，结果写入AI响应缓存"""
+
+import pytest
+
+from ai_services.workflows import base_workflow
+from ai_services.workflows.base_workflow import AIWorkflow
+
+
+class FakeStreamService:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    def chat_stream(self, prompt):
+        self.calls += 1
+        yield from self.chunks
+
+
+class EchoWorkflow(AIWorkflow):
+    def build_prompt(self, params):
+        return params["TEXT"]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(monkeypatch):
+    monkeypatch.setattr(base_workflow, "_ai_result_cache", base_workflow.OrderedDict())
+
+
+def test_items_are_yielded_before_stream_ends():
+    consumed = []
+
+    def chunks():
+        for chunk in ['[{"q": 1},', ' {"q": 2}]']:
+            consumed.append(chunk)
+            yield chunk
+
+    service = FakeStreamService(chunks())
+    stream = EchoWorkflow(ai_service=service).run_stream({"TEXT": "t"})
+    assert next(stream) == {"q": 1}
+    assert consumed == ['[{"q": 1},']
+    assert list(stream) == [{"q": 2}]
+
+
+def test_result_is_cached_and_replayed():
+    service = FakeStreamService(["```json\n[", '{"q": 1}', "]\n```"])
+    workflow = EchoWorkflow(ai_service=service)
+    assert list(workflow.run_stream({"TEXT": "t"})) == [{"q": 1}]
+    assert list(workflow.run_stream({"TEXT": "t"})) == [{"q": 1}]
+    assert service.calls == 1
+
+
+def test_unscannable_array_falls_back_without_duplicates():
+    # 扫描器只处理对象/数组元素，遇到标量元素后交给 parse_result，只补发尚未产出的元素
+    service = FakeStreamService(['[{"q": 1}, ', '2]'])
+    workflow = EchoWorkflow(ai_service=service)
+    assert list(workflow.run_stream({"TEXT": "t"})) == [{"q": 1}, 2]
+    assert list(workflow.run_stream({"TEXT": "t"})) == [{"q": 1}, 2]
+    assert service.calls == 1
+
+
+def test_object_output_raises_without_emitting():
+    service = FakeStreamService(['{"cards": [{"q": 1}]}'])
+    emitted = []
+    with pytest.raises(ValueError):
+        for item in EchoWorkflow(ai_service=service).run_stream({"TEXT": "t"}):
+            emitted.append(item)
+    assert emitted == []
+    assert base_workflow._ai_result_cache == {}
@@ -0,0 +1,61 @@
+"""任务校验测试：进程退出后丢失的后台生成任务超时后标记为失败"""
+
+import pytest
+
+from business import task_manager
+from business.task_manager import TaskManager
+
+
+class FakeDB:
+    """内存中的 task_info 表，rpc 模拟 merge_task_input_data"""
+
+    def __init__(self, task):
+        self.task = task
+
+    def select(self, table, filters=None, **kwargs):
+        return {"success": True, "data": [dict(self.task)], "count": 1}
+
+    def update(self, table, data, filters=None):
+        self.task.update(data)
+        return {"success": True}
+
+    def rpc(self, function_name, params=None):
+        self.task["input_data"] = {**(self.task.get("input_data") or {}), **params["p_patch"]}
+        return {"success": True}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(task_manager.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def manager():
+    task_manager._task_cache.clear()
+    tm = TaskManager()
+    tm.db = FakeDB({"id": "t1", "task_type": "text", "status": "generating_cards", "input_data": {}})
+    yield tm
+    task_manager._task_cache.clear()
+
+
+def test_running_background_task_is_valid(manager, clock):
+    manager.mark_background_started("t1")
+    clock[0] += task_manager._BACKGROUND_GENERATION_TIMEOUT - 1
+    assert manager.validate_task("t1", expected_task_type="text")["valid"]
+    assert manager.db.task["status"] == "generating_cards"
+
+
+def test_stale_background_task_is_marked_failed(manager, clock):
+    manager.mark_background_started("t1")
+    clock[0] += task_manager._BACKGROUND_GENERATION_TIMEOUT + 1
+
+    validation = manager.validate_task("t1", expected_task_type="text")
+    assert not validation["valid"]
+    assert manager.db.task["status"] == "failed"
+
+
+def test_task_without_background_mark_never_expires(manager, clock):
+    clock[0] += 10 * task_manager._BACKGROUND_GENERATION_TIMEOUT
+    assert manager.validate_task("t1")["valid"]
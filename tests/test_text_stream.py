@@ -0,0 +1,81 @@
+"""文本闪卡流式生成测试：客户端提前断开时任务必须进入终态，不能停留在 generating_cards"""
+
+import json
+
+import pytest
+from django.test import RequestFactory
+
+from business import views
+from business.flashcard import FlashcardBusiness
+
+
+class FakeTaskManager:
+    def __init__(self):
+        self.statuses = []
+
+    def validate_task(self, task_id, expected_task_type=None):
+        return {"valid": True, "task": {"id": task_id, "user_id": "user-1", "input_data": {}}}
+
+    def update_status_async(self, task_id, *statuses):
+        self.statuses.extend(statuses)
+
+    def update_status(self, task_id, status):
+        self.statuses.append(status)
+
+
+class FakeWorkflow:
+    def __init__(self):
+        self.closed = False
+
+    def run_stream(self, params):
+        try:
+            for i in range(3):
+                yield {"q": i}
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def biz(monkeypatch):
+    business = FlashcardBusiness(ai_service=object())
+    business.task_mgr = FakeTaskManager()
+    business.workflow = FakeWorkflow()
+    business.saved = []
+    monkeypatch.setattr(business, "_get_workflow", lambda **kwargs: business.workflow)
+    monkeypatch.setattr(business, "_save_generation", lambda **kwargs: business.saved.append(kwargs) or {"success": True})
+    monkeypatch.setattr(views, "_get_flashcard_business", lambda: business)
+    return business
+
+
+def test_stream_completes_and_saves(biz):
+    cards = list(biz.generate_flashcards_from_text_stream("abc", task_id="t1", user_id="user-1"))
+    assert cards == [{"q": 0}, {"q": 1}, {"q": 2}]
+    assert biz.task_mgr.statuses[-1] == "completed"
+    assert biz.saved[0]["user_id"] == "user-1"
+
+
+def test_closing_stream_early_marks_task_failed(biz):
+    stream = biz.generate_flashcards_from_text_stream("abc", task_id="t1")
+    assert next(stream) == {"q": 0}
+    stream.close()
+
+    assert biz.task_mgr.statuses[-1] == "failed"
+    assert biz.workflow.closed
+    assert biz.saved == []
+
+
+def test_client_disconnect_marks_task_failed(biz):
+    request = RequestFactory().post(
+        "/api/flashcards/generate/text/",
+        data=json.dumps({"task_id": "t1", "text": "abc", "stream": True}),
+        content_type="application/json",
+    )
+    response = views.generate_flashcards_from_text(request)
+    content = iter(response.streaming_content)
+    assert json.loads(next(content)) == {"card": {"q": 0}}
+    # Django 在客户端断开后关闭响应，响应关闭时关闭流式内容生成器
+    response.close()
+
+    assert biz.task_mgr.statuses[-1] == "failed"
+    assert biz.workflow.closed
+    assert biz.saved == []
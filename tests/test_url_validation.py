@@ -0,0 +1,85 @@
+"""URL校验测试：按主机解析出的地址判断是否为公网地址，而不是按主机名前缀匹配"""
+
+import socket
+
+import pytest
+
+from business import flashcard
+
+REAL_GETADDRINFO = socket.getaddrinfo
+
+# 测试中不访问 DNS：域名按下表解析，IP 字面量（含十进制等写法）交给系统按数字地址解析
+FAKE_DNS = {
+    "example.com": ["93.184.215.14"],
+    "localhost-news.com": ["93.184.215.15"],
+    "10.example.com": ["93.184.215.16"],
+    "xn--fiqs8s.example": ["93.184.215.17"],
+    "internal.example.com": ["10.0.0.5"],
+    "mixed.example.com": ["93.184.215.18", "192.168.1.10"],
+    "metadata.example.com": ["169.254.169.254"],
+    "v6-loopback.example.com": ["::1"],
+    "localhost": ["127.0.0.1", "::1"],
+}
+
+
+def fake_getaddrinfo(host, port, *args, **kwargs):
+    host = host.encode("idna").decode("ascii") if not host.isascii() else host
+    if host in FAKE_DNS:
+        return [(socket.AF_INET6 if ":" in ip else socket.AF_INET, socket.SOCK_STREAM, 6, "", (ip, port))
+                for ip in FAKE_DNS[host]]
+    try:
+        return REAL_GETADDRINFO(host, port, *args, flags=socket.AI_NUMERICHOST, **kwargs)
+    except socket.gaierror:
+        raise socket.gaierror(socket.EAI_NONAME, "unknown host")
+
+
+@pytest.fixture(autouse=True)
+def fake_dns(monkeypatch):
+    monkeypatch.setattr(flashcard.socket, "getaddrinfo", fake_getaddrinfo)
+
+
+@pytest.mark.parametrize("url", [
+    "https://example.com/article?id=1#top",
+    "HTTP://EXAMPLE.COM:8080/path",
+    "https://localhost-news.com/",
+    "http://10.example.com/page",
+    "https://中国.example/",
+    "http://93.184.215.14/",
+])
+def test_public_urls_are_allowed(url):
+    assert flashcard._is_allowed_url(url)
+
+
+@pytest.mark.parametrize("url", [
+    "http://localhost/",
+    "http://127.0.0.1:8000/admin",
+    "http://2130706433/",
+    "http://0x7f.0.0.1/",
+    "http://[::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "http://[fe80::1]/",
+    "http://10.1.2.3/",
+    "http://172.16.0.1/",
+    "http://192.168.0.1/",
+    "http://100.64.0.1/",
+    "http://0.0.0.0/",
+    "http://internal.example.com/",
+    "http://mixed.example.com/",
+    "http://metadata.example.com/latest/meta-data/",
+    "http://v6-loopback.example.com/",
+])
+def test_private_targets_are_rejected(url):
+    assert not flashcard._is_allowed_url(url)
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/file",
+    "file:///etc/passwd",
+    "example.com",
+    "https://",
+    "https://example.com:99999/",
+    "https://example.com/a b",
+    "https://unknown-host.invalid/",
+])
+def test_malformed_urls_are_rejected(url):
+    assert not flashcard._is_allowed_url(url)
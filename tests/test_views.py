@@ -0,0 +1,230 @@
+"""API 视图测试：请求解析、请求体大小限制，以及 JSON 接口完整走通一次"""
+
+import json
+
+import pytest
+from django.test import RequestFactory
+
+from business import views
+
+
+@pytest.fixture
+def rf():
+    return RequestFactory()
+
+
+class FakeCatalogService:
+    def __init__(self):
+        self.calls = []
+
+    def analyze_catalog_from_topic(self, topic, lang="zh"):
+        self.calls.append((topic, lang))
+        return [{"chapter": "第一章", "sections": []}]
+
+
+@pytest.fixture
+def catalog_service(monkeypatch):
+    service = FakeCatalogService()
+    monkeypatch.setattr(views, "_get_catalog_service", lambda: service)
+    return service
+
+
+@pytest.fixture(autouse=True)
+def clear_rate_limit():
+    views._rate_limit_buckets.clear()
+    yield
+    views._rate_limit_buckets.clear()
+
+
+def post_json(rf, path, body, **extra):
+    data = body if isinstance(body, (bytes, str)) else json.dumps(body)
+    return rf.post(path, data=data, content_type="application/json", **extra)
+
+
+def test_load_json_body_returns_object(rf):
+    request = post_json(rf, "/api/x/", {"topic": "Python", "lang": "en"})
+    assert views._load_json_body(request) == {"topic": "Python", "lang": "en"}
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b"\"text\"", b"{bad json"])
+def test_load_json_body_rejects_non_object(rf, body):
+    request = post_json(rf, "/api/x/", body)
+    with pytest.raises(json.JSONDecodeError):
+        views._load_json_body(request)
+
+
+@pytest.mark.parametrize("value, expected", [(" a ", "a"), (None, ""), (12, ""), (["a"], "")])
+def test_get_str(value, expected):
+    assert views._get_str({"key": value}, "key") == expected
+    assert views._get_str({}, "key") == ""
+
+
+def test_json_response_encodes_utf8():
+    response = views._json_response({"success": True, "error": "中文"}, status=201)
+    assert response.status_code == 201
+    assert response["Content-Type"].startswith("application/json")
+    assert json.loads(response.content) == {"success": True, "error": "中文"}
+
+
+def test_topic_catalog_view_parses_json_body(rf, catalog_service):
+    request = post_json(rf, "/api/catalog/topic/", {"topic": "  Python 基础 ", "lang": "zh"}, REMOTE_ADDR="10.0.0.1")
+    response = views.analyze_catalog_from_topic(request)
+
+    assert response.status_code == 200
+    assert json.loads(response.content) == {"success": True, "catalog": [{"chapter": "第一章", "sections": []}]}
+    assert catalog_service.calls == [("Python 基础", "zh")]
+
+
+@pytest.mark.parametrize("body", [b"{bad json", b"[]"])
+def test_topic_catalog_view_rejects_malformed_body(rf, catalog_service, body):
+    response = views.analyze_catalog_from_topic(post_json(rf, "/api/catalog/topic/", body))
+
+    assert response.status_code == 400
+    assert json.loads(response.content)["error"] == "请求数据格式错误"
+    assert catalog_service.calls == []
+
+
+def test_oversized_body_rejected_before_parsing(rf, catalog_service, monkeypatch):
+    monkeypatch.setattr(views, "_MAX_JSON_BODY_SIZE", 16)
+    response = views.analyze_catalog_from_topic(post_json(rf, "/api/catalog/topic/", {"topic": "x" * 64}))
+
+    assert response.status_code == 413
+    assert catalog_service.calls == []
+
+
+def test_client_ip_ignores_forwarded_for(rf):
+    request = rf.get("/", HTTP_X_FORWARDED_FOR="1.2.3.4", REMOTE_ADDR="10.0.0.9")
+    assert views._client_ip(request) == "10.0.0.9"
+
+    request = rf.get("/", HTTP_FLY_CLIENT_IP="8.8.8.8", HTTP_X_FORWARDED_FOR="1.2.3.4", REMOTE_ADDR="10.0.0.9")
+    assert views._client_ip(request) == "8.8.8.8"
+
+
+def test_token_bucket_allows_burst_then_refills(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(views.time, "monotonic", lambda: now[0])
+
+    waits = [views._take_rate_limit_token("a") for _ in range(views._RATE_LIMIT_CAPACITY)]
+    assert waits == [0] * views._RATE_LIMIT_CAPACITY
+    wait = views._take_rate_limit_token("a")
+    assert wait == pytest.approx(1 / views._RATE_LIMIT_REFILL_PER_SECOND)
+    # 其他客户端不受影响
+    assert views._take_rate_limit_token("b") == 0
+
+    now[0] += 1 / views._RATE_LIMIT_REFILL_PER_SECOND
+    assert views._take_rate_limit_token("a") == 0
+
+
+def test_rate_limited_view_returns_429(rf, catalog_service, monkeypatch):
+    monkeypatch.setattr(views, "_RATE_LIMIT_CAPACITY", 1)
+    monkeypatch.setattr(views, "_RATE_LIMIT_REFILL_PER_SECOND", 1 / 60)
+
+    # 变换 X-Forwarded-For 不会绕过限流
+    first = views.analyze_catalog_from_topic(post_json(rf, "/", {"topic": "a"}, REMOTE_ADDR="10.0.0.2", HTTP_X_FORWARDED_FOR="1.1.1.1"))
+    second = views.analyze_catalog_from_topic(post_json(rf, "/", {"topic": "a"}, REMOTE_ADDR="10.0.0.2", HTTP_X_FORWARDED_FOR="2.2.2.2"))
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert int(second["Retry-After"]) >= 1
+    assert len(catalog_service.calls) == 1
+
+
+class FakeTaskManager:
+    def __init__(self):
+        self.background_started = []
+
+    def validate_task(self, task_id, expected_task_type=None):
+        return {"valid": True, "task": {"id": task_id, "user_id": "user-1", "input_data": {"text": "abc"}}}
+
+    def mark_background_started(self, task_id, task=None):
+        self.background_started.append(task_id)
+        return {"success": True}
+
+
+class FakeFlashcardBusiness:
+    def __init__(self):
+        self.task_mgr = FakeTaskManager()
+        self.calls = []
+        self.card_numbers = []
+
+    def generate_flashcards_from_text(self, text_content, card_number=None, lang="zh", task_id=None, user_id=None):
+        self.calls.append((task_id, user_id))
+        self.card_numbers.append(card_number)
+        return {"success": True, "cards": [{"q": 1}]}
+
+    def generate_flashcards_from_text_section(self, text_content, section_title, card_number=None, lang="zh"):
+        self.card_numbers.append(card_number)
+        return {"success": True, "cards": [{"q": 1}], "section_title": section_title}
+
+    def generate_flashcards_from_text_stream(self, text_content, card_number=None, lang="zh", task_id=None, user_id=None):
+        self.calls.append((task_id, user_id))
+        yield {"q": 1}
+        yield {"q": 2}
+
+
+@pytest.fixture
+def flashcard_business(monkeypatch):
+    biz = FakeFlashcardBusiness()
+    monkeypatch.setattr(views, "_get_flashcard_business", lambda: biz)
+    return biz
+
+
+def test_text_view_passes_task_user_id(rf, flashcard_business):
+    request = post_json(rf, "/api/flashcards/generate/text/", {"task_id": "t1", "text": "abc"})
+    response = views.generate_flashcards_from_text(request)
+
+    assert response.status_code == 200
+    assert json.loads(response.content) == {"success": True, "cards": [{"q": 1}], "count": 1}
+    assert flashcard_business.calls == [("t1", "user-1")]
+
+
+def test_text_view_streams_ndjson(rf, flashcard_business):
+    request = post_json(rf, "/api/flashcards/generate/text/", {"task_id": "t1", "text": "abc", "stream": True})
+    response = views.generate_flashcards_from_text(request)
+
+    assert response["Content-Type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+    assert lines == [{"card": {"q": 1}}, {"card": {"q": 2}}, {"success": True, "count": 2}]
+    assert flashcard_business.calls == [("t1", "user-1")]
+
+
+@pytest.mark.parametrize("value, expected", [("10", 10), (10, 10), (None, None)])
+def test_text_view_accepts_numeric_string_card_number(rf, flashcard_business, value, expected):
+    body = {"task_id": "t1", "text": "abc", "card_number": value}
+    response = views.generate_flashcards_from_text(post_json(rf, "/api/flashcards/generate/text/", body))
+    assert response.status_code == 200
+    assert flashcard_business.card_numbers == [expected]
+
+
+def test_text_section_view_accepts_numeric_string_card_number(rf, flashcard_business):
+    body = {"text": "abc", "section_title": "第一章", "card_number": "5"}
+    response = views.generate_flashcards_from_text_section(post_json(rf, "/api/flashcards/generate/text/section/", body))
+    assert response.status_code == 200
+    assert flashcard_business.card_numbers == [5]
+
+
+@pytest.mark.parametrize("value", ["abc", 0, 51, True, [3]])
+def test_text_views_reject_invalid_card_number(rf, flashcard_business, value):
+    text_body = {"task_id": "t1", "text": "abc", "card_number": value}
+    section_body = {"text": "abc", "section_title": "第一章", "card_number": value}
+    assert views.generate_flashcards_from_text(post_json(rf, "/api/flashcards/generate/text/", text_body)).status_code == 400
+    assert views.generate_flashcards_from_text_section(post_json(rf, "/api/flashcards/generate/text/section/", section_body)).status_code == 400
+    assert flashcard_business.card_numbers == []
+
+
+def test_async_text_view_records_background_start(rf, flashcard_business, monkeypatch):
+    from concurrent.futures import Future
+
+    class ImmediateExecutor:
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+
+    monkeypatch.setattr(views, "_background_executor", ImmediateExecutor())
+    body = {"task_id": "t1", "text": "abc", "async": True}
+    response = views.generate_flashcards_from_text(post_json(rf, "/api/flashcards/generate/text/", body))
+
+    assert response.status_code == 202
+    assert flashcard_business.task_mgr.background_started == ["t1"]
+    assert flashcard_business.calls == [("t1", "user-1")]